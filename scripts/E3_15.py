@@ -26,7 +26,10 @@ Created on Feb 3, 2011
 
 import itertools
 
-from aiama.search import Operator, SearchProblem, State
+from aiama.search import Operator, SearchProblem, State, ZobristTable
+
+# zobrist keys of (link, link it is connected to) pairs
+ZOBRIST = ZobristTable()
 
 """
 chain Problem Definition
@@ -41,19 +44,22 @@ class ChainState(State):
     -1 2 means chain 1 is not connected from left and connected to left link of chain 2 from right
     """
 
-    def __init__(self, links):
+    def __init__(self, links, hashValue=None):
         State.__init__(self)
         self.links = links
         self.nchains = len(links) // 2
+        if hashValue is None:
+            hashValue = ZOBRIST.hash_of(enumerate(links))
+        self.hashValue = hashValue
 
     def __eq__(self, other):
-        return self.links == other.links
+        return self.hashValue == other.hashValue and self.links == other.links
 
     def __repr__(self):
         return repr(self.links)
 
     def __hash__(self):
-        return hash(tuple(self.links))
+        return self.hashValue
 
     def is_legal(self):
         # since our operators always generate legal states, we always return True
@@ -81,7 +87,8 @@ def open_link(state):
         nlinks = list(state.links)
         nlinks[l] = -1
         nlinks[r] = -1
-        nstates.append(ChainState(nlinks))
+        hashValue = ZOBRIST.update(ZOBRIST.update(state.hashValue, l, r, -1), r, l, -1)
+        nstates.append(ChainState(nlinks, hashValue))
     return nstates
 
 
@@ -100,14 +107,58 @@ def close_link(state):
             nlinks = list(state.links)
             nlinks[l] = r
             nlinks[r] = l
-            nstates.append(ChainState(nlinks))
+            hashValue = ZOBRIST.update(ZOBRIST.update(state.hashValue, l, -1, r), r, -1, l)
+            nstates.append(ChainState(nlinks, hashValue))
     return nstates
 
 
+def _walk(links, end, seen):
+    """
+    Walk along connected links entering the first one from end, mark them as seen and return their number
+    """
+    length = 0
+    while True:
+        seen[end // 2] = True
+        length += 1
+        # leave the link from its other end
+        end = links[end ^ 1]
+        if end == -1 or seen[end // 2]:
+            return length
+
+
+def canonical_form(state):
+    """
+    Links are interchangeable and so are the two ends of a link, a state is symmetric to every state with the same
+    number of open chains and closed loops of each length. Canonical form lays chains and then loops out in order
+    of length on consecutive links, right end of each link connected to left end of the next one
+    """
+    links = state.links
+    seen = [False] * state.nchains
+    # walk chains from one of their free ends, links left over are in loops
+    chains = [_walk(links, end, seen) for end in range(state.nchains * 2) if links[end] == -1 and not seen[end // 2]]
+    loops = [_walk(links, 2 * link, seen) for link in range(state.nchains) if not seen[link]]
+
+    nlinks = [-1] * (state.nchains * 2)
+    position = 0
+    for length, isLoop in sorted([(l, False) for l in chains]) + sorted([(l, True) for l in loops]):
+        for i in range(position, position + length - 1):
+            nlinks[2 * i + 1] = 2 * i + 2
+            nlinks[2 * i + 2] = 2 * i + 1
+        if isLoop:
+            last = position + length - 1
+            nlinks[2 * last + 1] = 2 * position
+            nlinks[2 * position] = 2 * last + 1
+        position += length
+    return ChainState(nlinks)
+
+
 def goal_test(state):
-    goal = [23, 2, 1, 4, 3, 6, 5, 8, 7, 10, 9, 12, 11, 14, 13, 16, 15, 18, 17, 20, 19, 22, 21, 0]
-    gstate = ChainState(goal)
-    return  gstate == state
+    """
+    Goal is a single loop of all links, whichever links are connected to each other
+    """
+    if -1 in state.links:
+        return False
+    return _walk(state.links, 0, [False] * state.nchains) == state.nchains
 
 
 if __name__ == '__main__':
@@ -120,4 +171,11 @@ if __name__ == '__main__':
     node = problem.depth_limited_search(5)
     # node = problem.BreadthFirstSearch()
     for n in problem.get_solution_path(node):
-        print(n)
\ No newline at end of file
+        print(n)
+
+    # symmetric states are searched once when repeated states are checked with their canonical forms
+    for canonicalizeFunc in (None, canonical_form):
+        problem = SearchProblem(initialState, operators, goal_test, canonicalizeFunc=canonicalizeFunc)
+        node = problem.breadth_first_search()
+        print('Breadth first search %s canonical forms: %d moves, %s' % (
+            'with' if canonicalizeFunc is not None else 'without', node.depth, problem.stats))
\ No newline at end of file
@@ -44,6 +44,10 @@ Created on Feb 4, 2011
 @author: goker
 """
 
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
 from aiama.search import Operator, SearchProblem, State
 
 
@@ -58,6 +62,8 @@ class ExpressionNode:
         self.left = left
         self.right = right
         self.valueOrOp = valueOrOp
+        # (indices, values, errors) of the last evaluate_vector call, shared by copies of the node
+        self.cache = None
 
     def __repr__(self):
         s = ''
@@ -89,6 +95,37 @@ class ExpressionNode:
             elif self.valueOrOp == 1:
                 return 1
 
+    def evaluate_vector(self, ns):
+        """
+        Evaluate expression for all values in the array ns at once. Returns the values and a mask of the
+        values for which a division by zero was made, which evaluate would not compute
+        """
+        if self.cache is not None and self.cache[0] is ns:
+            return self.cache[1], self.cache[2]
+        if self.left is not None and self.right is not None:
+            leftValues, leftErrors = self.left.evaluate_vector(ns)
+            rightValues, rightErrors = self.right.evaluate_vector(ns)
+            errors = leftErrors | rightErrors
+            # overflows give inf and powers of negative numbers give nan, neither matches an observed value
+            with np.errstate(all='ignore'):
+                if self.valueOrOp == '+':
+                    values = leftValues + rightValues
+                elif self.valueOrOp == '-':
+                    values = leftValues - rightValues
+                elif self.valueOrOp == '*':
+                    values = leftValues * rightValues
+                elif self.valueOrOp == '/':
+                    errors = errors | (rightValues == 0)
+                    values = leftValues / rightValues
+                elif self.valueOrOp == '^':
+                    errors = errors | ((leftValues == 0) & (rightValues < 0))
+                    values = leftValues ** rightValues
+        else:
+            values = ns.astype(np.float64) if self.valueOrOp == 'n' else np.ones(len(ns))
+            errors = np.zeros(len(ns), dtype=bool)
+        self.cache = (ns, values, errors)
+        return values, errors
+
     def get_leaves(self):
         if self.left is not None and self.right is not None:
             return [self.left.get_leaves(), self.right.get_leaves()]
@@ -100,9 +137,11 @@ class ExpressionNode:
         Copy node. Used in generating new states
         """
         if self.left is not None and self.right is not None:
-            return ExpressionNode(self.valueOrOp, self.left.copy(), self.right.copy())
+            node = ExpressionNode(self.valueOrOp, self.left.copy(), self.right.copy())
         else:
-            return ExpressionNode(self.valueOrOp)
+            node = ExpressionNode(self.valueOrOp)
+        node.cache = self.cache
+        return node
 
     def update_first_leaf(self, exp, depthLimit, currentDepth):
         """
@@ -111,17 +150,23 @@ class ExpressionNode:
         if currentDepth > depthLimit:
             return False
         if self.left is not None and self.right is not None:
+            # values of the nodes above the updated leaf change
             if self.left.left is None and self.left.right is None:
                 self.left = exp
+                self.cache = None
                 return True
             if self.right.left is None and self.right.right is None:
                 self.right = exp
+                self.cache = None
                 return True
             lOk = self.left.update_first_leaf(exp, depthLimit, currentDepth + 1)
             if not lOk:
                 rOk = self.right.update_first_leaf(exp, depthLimit, currentDepth + 1)
+                if rOk:
+                    self.cache = None
                 return rOk
             else:
+                self.cache = None
                 return True
         return False
 
@@ -143,6 +188,17 @@ class SequenceFunction:
         except ZeroDivisionError:
             return 1
 
+    def evaluate_vector(self, ns):
+        """
+        Evaluate function for all values in the array ns at once, like evaluate values are 1 where a division by
+        zero is made
+        """
+        values, errors = self.root.evaluate_vector(ns)
+        if errors.any():
+            values = values.copy()
+            values[errors] = 1
+        return values
+
     def get_leaves(self):
         return self.root.get_leaves()
 
@@ -167,12 +223,18 @@ class SequencePredictionState(State):
     def __init__(self, seqFunction):
         State.__init__(self)
         self.sequenceFunction = seqFunction
+        # expressions are not changed after a state is created, build their string and hash once
+        self.expression = repr(seqFunction)
+        self.hashValue = hash(self.expression)
 
     def __repr__(self):
-        return repr(self.sequenceFunction)
+        return self.expression
+
+    def __eq__(self, other):
+        return self.hashValue == other.hashValue and self.expression == other.expression
 
     def __hash__(self):
-        return hash(repr(self.sequenceFunction))
+        return self.hashValue
 
     def is_legal(self):
         return True
@@ -197,6 +259,139 @@ def generate_new_state(state):
     return nstates
 
 
+class ExpressionSynthesizer:
+    """
+    Bottom-up enumeration of the expressions of the grammar by size (number of leaves). Expressions of each size
+    are built by combining all pairs of expressions of smaller sizes kept in tables, with whole tables evaluated
+    at once. Expressions computing the same values on the observed indices as a smaller or earlier one are not
+    kept, they can only make the same values in larger expressions. Sizes are enumerated one root operator per
+    task, tasks can run in a pool of processes
+    """
+
+    def __init__(self, sequence, operators='+-*/^', processes=None, blockSize=2 ** 16):
+        self.observed = np.asarray(sequence, dtype=np.float64)
+        self.ns = np.arange(len(sequence))
+        self.operators = operators
+        self.processes = processes
+        self.blockSize = blockSize
+        # values, division by zero masks and parts of the kept expressions of each size, parts are leaves 1 and n
+        # for size 1 and arrays of operator indices, left sizes, left and right indices for larger sizes
+        self.values = {1: np.stack([np.ones(len(self.ns)), self.ns.astype(np.float64)])}
+        self.errors = {1: np.zeros((2, len(self.ns)), dtype=bool)}
+        self.parts = {1: [1, 'n']}
+        # rows of values and masks of all kept expressions
+        self.keys = _rows(self.values[1], self.errors[1])
+        self.stats = {'combined': 0, 'kept': 2}
+
+    def candidates(self, maxSize=7):
+        """
+        Yield functions matching the observed sequence, smallest first
+        """
+        for size in range(1, maxSize + 1):
+            if size not in self.values:
+                self.__add_size(size)
+            values = np.where(self.errors[size], 1.0, self.values[size])
+            for index in np.nonzero(np.all(values == self.observed, axis=1))[0]:
+                yield SequenceFunction(self.expression(size, int(index)))
+
+    def expression(self, size, index):
+        """
+        Build the expression tree of a kept expression
+        """
+        if size == 1:
+            return ExpressionNode(self.parts[1][index])
+        ops, leftSizes, leftIndices, rightIndices = self.parts[size]
+        leftSize = int(leftSizes[index])
+        return ExpressionNode(self.operators[ops[index]], self.expression(leftSize, int(leftIndices[index])),
+                              self.expression(size - leftSize, int(rightIndices[index])))
+
+    def __add_size(self, size):
+        tables = dict([(k, (self.values[k], self.errors[k])) for k in range(1, size)])
+        tasks = [(tables, size, op, self.blockSize) for op in self.operators]
+        if self.processes is None:
+            results = [_combine(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(self.processes) as executor:
+                results = list(executor.map(_combine, *zip(*tasks)))
+
+        values, errors, leftSizes, leftIndices, rightIndices = [np.concatenate([r[i] for r in results])
+                                                                for i in range(5)]
+        ops = np.concatenate([np.full(len(r[0]), i) for i, r in enumerate(results)])
+        self.stats['combined'] += sum([r[5] for r in results])
+        # keep expressions whose values were not made by an expression kept before
+        rows = _rows(values, errors)
+        unique, first = np.unique(np.concatenate([self.keys, rows]), axis=0, return_index=True)
+        new = np.sort(first[first >= len(self.keys)]) - len(self.keys)
+        self.keys = np.concatenate([self.keys, rows[new]])
+        self.values[size] = values[new]
+        self.errors[size] = errors[new]
+        self.parts[size] = (ops[new], leftSizes[new], leftIndices[new], rightIndices[new])
+        self.stats['kept'] += len(new)
+
+
+def _rows(values, errors):
+    """
+    Values and division by zero masks as rows of integers, values where a division by zero is made do not matter
+    """
+    return np.concatenate([np.where(errors, 0.0, values).view(np.uint64), errors.astype(np.uint64)], axis=1)
+
+
+def _combine(tables, size, op, blockSize):
+    """
+    Combine all pairs of expressions with sizes adding up to size with operator op. Returns values, division by
+    zero masks, left sizes, left and right indices of the distinct results, and the number of pairs combined
+    """
+    m = len(tables[1][0][0])
+    results = [(np.zeros((0, m)), np.zeros((0, m), dtype=bool), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))]
+    combined = 0
+    for leftSize in range(1, size):
+        leftValues, leftErrors = tables[leftSize]
+        rightValues, rightErrors = tables[size - leftSize]
+        rightCount = len(rightValues)
+        if rightCount == 0:
+            continue
+        rv = rightValues[None, :, :]
+        step = max(1, blockSize // rightCount)
+        for start in range(0, len(leftValues), step):
+            lv = leftValues[start:start + step, None, :]
+            errors = leftErrors[start:start + step, None, :] | rightErrors[None, :, :]
+            with np.errstate(all='ignore'):
+                if op == '+':
+                    values = lv + rv
+                elif op == '-':
+                    values = lv - rv
+                elif op == '*':
+                    values = lv * rv
+                elif op == '/':
+                    errors = errors | (rv == 0)
+                    values = lv / rv
+                else:
+                    errors = errors | ((lv == 0) & (rv < 0))
+                    values = lv ** rv
+            values = values.reshape(-1, m)
+            errors = errors.reshape(-1, m)
+            combined += len(values)
+            unique, first = np.unique(_rows(values, errors), axis=0, return_index=True)
+            results.append((values[first], errors[first], np.full(len(first), leftSize),
+                            start + first // rightCount, first % rightCount))
+    return tuple([np.concatenate([r[i] for r in results]) for i in range(5)]) + (combined,)
+
+
+class ObservedSequence:
+    """
+    Observed sequence, expressions are evaluated for all of its indices at once with their subexpressions' values
+    cached in expression nodes
+    """
+
+    def __init__(self, sequence):
+        self.sequence = np.asarray(sequence, dtype=np.float64)
+        self.ns = np.arange(len(sequence))
+
+    def goal_test(self, state):
+        return bool(np.all(state.sequenceFunction.evaluate_vector(self.ns) == self.sequence))
+
+
 def goal_test(state):
     seq = [0, 5, 2, 4, 5, 8]
     for n in range(len(seq)):
@@ -212,14 +407,25 @@ if __name__ == '__main__':
 
     initialState = SequencePredictionState(seqFunc)
     operators = [Operator("Add new expression", generate_new_state)]
-    problem = SearchProblem(initialState, operators, goal_test)
-
-    # solutionNode = problem.BreadthFirstSearch()
-    solutionNode = problem.iterative_deepening_search()
-    # print(solutionNode)
-    solution = problem.get_solution_path(solutionNode)
-    for node in solution:
-        print(node)
+
+    # sequences of part c with small functions. Expressions computing the same values can not be merged here:
+    # the first leaf of each expression is replaced, so they are extended to different expressions
+    for sequence in ([1, 2, 3, 4, 5], [1, 2, 4, 8, 16]):
+        observed = ObservedSequence(sequence)
+        problem = SearchProblem(initialState, operators, observed.goal_test)
+        solutionNode = problem.breadth_first_search()
+        print('%s: %s, %s' % (sequence, solutionNode.state, problem.stats))
+
+    # all part c sequences with bottom-up enumeration, which merges expressions computing the same values since
+    # they are only combined as whole subexpressions. The next member is predicted by the smallest matching function
+    for sequence in ([1, 2, 3, 4, 5], [1, 2, 4, 8, 16], [0.5, 2, 4.5, 8], [1, 3, 7, 15, 31]):
+        synthesizer = ExpressionSynthesizer(sequence)
+        function = next(synthesizer.candidates(), None)
+        if function is None:
+            print('%s: no function found, %s' % (sequence, synthesizer.stats))
+        else:
+            print('%s: %s, next member %s, %s' % (sequence, function, function.evaluate(len(sequence)),
+                                                  synthesizer.stats))
 #
 #    
 #    ln = ExpressionNode(1)
@@ -25,7 +25,7 @@ Created on Feb 7, 2011
 @author: goker
 """
 
-from aiama.search import CSP
+from aiama.search import CSP, AllDifferent, LinearConstraint
 
 
 def check_constraints(state):
@@ -72,8 +72,27 @@ def check_constraints(state):
     return True
 
 
+def global_constraints(letters):
+    """
+    Same constraints stated declaratively: every letter has a different digit and
+    FORTY + TEN + TEN - SIXTY = 0 as a single linear equation
+    """
+    coefficients = dict([(l, 0) for l in letters])
+    for word, multiplier in (('FORTY', 1), ('TEN', 2), ('SIXTY', -1)):
+        for i, l in enumerate(reversed(word)):
+            coefficients[l] = coefficients[l] + multiplier * 10 ** i
+    return [AllDifferent(letters), LinearConstraint(letters, [coefficients[l] for l in letters], '==', 0)]
+
+
 if __name__ == '__main__':
     varsAndDomains = {('Y', 'N', 'T', 'E', 'R', 'O', 'F', 'S', 'I', 'X'): [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]}
     csp = CSP(varsAndDomains, [check_constraints])
     solution = csp.solve()
     print(solution)
+
+    # F and S cannot be 0, so they get their own domain
+    varsAndDomains = {('F', 'S'): [1, 2, 3, 4, 5, 6, 7, 8, 9],
+                      ('Y', 'N', 'T', 'E', 'R', 'O', 'I', 'X'): [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]}
+    csp = CSP(varsAndDomains, global_constraints(('F', 'S', 'Y', 'N', 'T', 'E', 'R', 'O', 'I', 'X')))
+    solution = csp.solve()
+    print(solution)
@@ -20,7 +20,10 @@ MC is used as an abbreviation for missionaries and cannibals problem
 Goker 03.02.2011
 """
 
+import numpy as np
+
 from aiama.search import Operator, SearchProblem, State
+from aiama.search.compiled import compile_problem
 
 
 class MCState(State):
@@ -35,8 +38,12 @@ class MCState(State):
         self.mCount = mCount
         self.cCount = cCount
         self.boatLocation = boatLocation
+        # states are hashed many times while searching, compute the hash once
+        self.hashValue = hash((mCount, cCount, boatLocation))
 
     def __eq__(self, other):
+        if self.hashValue != other.hashValue:
+            return False
         if self.boatLocation == other.boatLocation and self.cCount == other.cCount and self.mCount == other.mCount:
             return True
         return False
@@ -52,7 +59,7 @@ class MCState(State):
         # self.mCount, self.cCount, self.boatLocation)
 
     def __hash__(self):
-        return hash(repr(self.mCount) + repr(self.cCount) + repr(self.boatLocation))
+        return self.hashValue
 
     def is_legal(self):
         cOnRight = 3 - self.cCount
@@ -149,3 +156,11 @@ if __name__ == "__main__":
     solution = MCProblem.get_solution_path(node)
     for n in solution:
         print(n)
+
+    # the whole state space is small, compile it once and answer queries from any state without creating states
+    space = compile_problem(MCProblem)
+    distances = space.all_pairs_distances()
+    print('%d states, %d moves, longest shortest path between two states: %d moves' % (
+        space.stateCount, len(space.targets), distances[distances != np.inf].max()))
+    for state in space.states[:4]:
+        print('From %s: %d moves' % (state, space.breadth_first_search(state).depth))
@@ -19,23 +19,32 @@ Created on Feb 6, 2011
 @author: goker
 """
 
-from aiama.search import Operator, State, SearchProblem
+from aiama.search import Operator, State, SearchProblem, ZobristTable
 import random
+import sys
+
+# zobrist keys of (position, tile) pairs, MOVE_KEYS[p1][p2][t] is the hash change when tile t moves from p1 to p2
+ZOBRIST = ZobristTable()
+MOVE_KEYS = [[[ZOBRIST.key(p1, t) ^ ZOBRIST.key(p1, 0) ^ ZOBRIST.key(p2, t) ^ ZOBRIST.key(p2, 0) for t in range(9)]
+              for p2 in range(9)] for p1 in range(9)]
 
 
 class EightPuzzleState(State):
-    def __init__(self, grid):
+    def __init__(self, grid, hashValue=None):
         State.__init__(self)
         self.grid = grid
+        if hashValue is None:
+            hashValue = ZOBRIST.hash_of(enumerate(grid))
+        self.hashValue = hashValue
 
     def __repr__(self):
         return repr(self.grid)
 
     def __eq__(self, other):
-        return self.grid == other.grid
+        return self.hashValue == other.hashValue and self.grid == other.grid
 
     def __hash__(self):
-        return hash(tuple(self.grid))
+        return self.hashValue
 
     def is_legal(self):
         return True
@@ -46,14 +55,22 @@ Operators
 """
 
 
+def _move_tile(state, fromPos, toPos):
+    """
+    Move the tile at fromPos to the blank at toPos, the hash changes only for these two positions
+    """
+    grid = list(state.grid)
+    tile = grid[fromPos]
+    grid[toPos] = tile
+    grid[fromPos] = 0
+    return EightPuzzleState(grid, state.hashValue ^ MOVE_KEYS[fromPos][toPos][tile])
+
+
 def move_blank_left(state):
     blankPos = state.grid.index(0)
     # if blank is not on the left column
     if blankPos % 3 != 0:
-        nstate = EightPuzzleState(list(state.grid))
-        nstate.grid[blankPos] = nstate.grid[blankPos - 1]
-        nstate.grid[blankPos - 1] = 0
-        return [nstate]
+        return [_move_tile(state, blankPos - 1, blankPos)]
     return []
 
 
@@ -61,10 +78,7 @@ def move_blank_right(state):
     blankPos = state.grid.index(0)
     # if blank is not on the right column
     if (blankPos + 1) % 3 != 0:
-        nstate = EightPuzzleState(list(state.grid))
-        nstate.grid[blankPos] = nstate.grid[blankPos + 1]
-        nstate.grid[blankPos + 1] = 0
-        return [nstate]
+        return [_move_tile(state, blankPos + 1, blankPos)]
     return []
 
 
@@ -72,10 +86,7 @@ def move_blank_up(state):
     blankPos = state.grid.index(0)
     # if blank is not on the first row
     if blankPos // 3 != 0:
-        nstate = EightPuzzleState(list(state.grid))
-        nstate.grid[blankPos] = nstate.grid[blankPos - 3]
-        nstate.grid[blankPos - 3] = 0
-        return [nstate]
+        return [_move_tile(state, blankPos - 3, blankPos)]
     return []
 
 
@@ -83,10 +94,7 @@ def move_blank_down(state):
     blankPos = state.grid.index(0)
     # if blank is not on the last row
     if blankPos // 3 != 2:
-        nstate = EightPuzzleState(list(state.grid))
-        nstate.grid[blankPos] = nstate.grid[blankPos + 3]
-        nstate.grid[blankPos + 3] = 0
-        return [nstate]
+        return [_move_tile(state, blankPos + 3, blankPos)]
     return []
 
 
@@ -119,11 +127,24 @@ def manhattan_distance_heuristic(state):
     return totDistance
 
 
+def is_solvable(grid):
+    """
+    A grid can be solved if the number of tile pairs in the wrong order (ignoring the blank) is even, a move
+    of the blank never changes the parity of this number on a board with an odd number of columns
+    """
+    tiles = [t for t in grid if t != 0]
+    inversions = sum([1 for i in range(len(tiles)) for j in range(i + 1, len(tiles)) if tiles[i] > tiles[j]])
+    return inversions % 2 == 0
+
+
 if __name__ == "__main__":
     initialGrid = list(range(9))
     random.shuffle(initialGrid)
     initialState = EightPuzzleState(initialGrid)
     print('Initial state:', initialState)
+    if not is_solvable(initialGrid):
+        print('Initial state can not be solved.')
+        sys.exit()
 
     operators = [
         Operator("Move Blank Left", move_blank_left),
@@ -16,17 +16,22 @@ Created on Feb 9, 2011
 @author: goker
 """
 
+import queue
+import threading
+import traceback
 from tkinter import *
 
 from EightPuzzle import *
+from EightPuzzleTable import solve
 
 
 class EightPuzzleGUI:
-    def __init__(self, puzzle, cw, ch, master=None):
+    def __init__(self, initialState, cw, ch, master=None):
         self.frame = Frame(master)
         self.canvasWidth = cw
         self.canvasHeight = ch
-        self.puzzle = puzzle
+        self.initialState = initialState
+        self.messages = queue.Queue()
         self.add_button()
         self.add_canvas()
         self.frame.pack()
@@ -36,12 +41,54 @@ class EightPuzzleGUI:
         self.solveButton.pack(side=BOTTOM)
 
     def solve_puzzle(self):
-        # solve puzzle
-        self.solveButton.config(text="Solving...")
+        # solve puzzle in a worker thread, the table of solution lengths is built the first time it is needed
+        self.cancelEvent = threading.Event()
+        self.solveButton.config(text="Cancel", command=self.cancel, state="normal")
         self.solveButton.pack(side=BOTTOM)
-        node = problem.iterative_deepening_a_star_search()
-        solution = problem.get_solution_path(node)
-        self.solveButton.config(text="Next", command=self.__next)
+        threading.Thread(target=self.__solve, daemon=True).start()
+        self.frame.after(50, self.__poll)
+
+    def cancel(self):
+        self.cancelEvent.set()
+        self.solveButton.config(text="Cancelling", state="disabled")
+
+    def __solve(self):
+        """
+        Runs in the worker thread, only puts messages to the queue
+        """
+        try:
+            node = solve(self.initialState, stopFunc=self.cancelEvent.is_set,
+                         progressFunc=lambda depth, reached: self.messages.put(('progress', (depth, reached))))
+            self.messages.put(('done', node))
+        except Exception as exc:
+            traceback.print_exc()
+            self.messages.put(('error', exc))
+
+    def __poll(self):
+        """
+        Wait for the solution without blocking the window
+        """
+        while True:
+            try:
+                message, value = self.messages.get_nowait()
+            except queue.Empty:
+                self.frame.after(50, self.__poll)
+                return
+            if message == 'progress':
+                self.draw_status("Building distance table: %d moves, %d of 181440 states" % value)
+            else:
+                break
+        if message == 'error':
+            self.draw_status("Solving failed: %r" % (value,))
+        elif value is None:
+            self.draw_status("Cancelled" if self.cancelEvent.is_set() else "No solution")
+        if message == 'error' or value is None:
+            # table is built again from the start when solve is clicked again
+            self.solveButton.config(text="Solve", command=self.solve_puzzle, state="normal")
+            return
+        self.draw_status("Solution: %d moves" % value.depth)
+        solution = SearchProblem.get_solution_path(value)
+        self.solveButton.config(text="Next", command=self.__next, state="normal")
         self.solveButton.pack(side=BOTTOM)
         solution.reverse()
         solution.pop()
@@ -58,6 +105,10 @@ class EightPuzzleGUI:
         self.draw_canvas(None)
         self.pcanvas.pack(side=RIGHT)
 
+    def draw_status(self, text):
+        self.pcanvas.delete('status')
+        self.pcanvas.create_text(self.canvasWidth // 2, self.canvasHeight - 10, text=text, tags='status')
+
     def draw_canvas(self, solution):
         self.hors = 20
         self.vers = 20
@@ -82,7 +133,7 @@ class EightPuzzleGUI:
 
         # draw initial state
         if solution is None:
-            self.__drawNumbers(self.puzzle.initialState.grid)
+            self.__drawNumbers(self.initialState.grid)
         else:
             node = solution.pop()
             if node is not None:
@@ -105,22 +156,17 @@ class EightPuzzleGUI:
 def initialize_puzzle():
     initialGrid = list(range(9))
     random.shuffle(initialGrid)
+    # half of the shuffles can not be solved
+    while not is_solvable(initialGrid):
+        random.shuffle(initialGrid)
     #    initialGrid = [0, 4, 3, 8, 7, 5, 1, 2, 6]
-    initialState = EightPuzzleState(initialGrid)
-    operators = [
-        Operator("Move Blank Left", move_blank_left),
-        Operator("Move Blank Right", move_blank_right),
-        Operator("Move Blank Up", move_blank_up),
-        Operator("Move Blank Down", move_blank_down)
-    ]
-    problem = SearchProblem(initialState, operators, eight_puzzle_goal_test, None,
-                                   [misplaced_tiles_heuristic, manhattan_distance_heuristic])
-    return problem
+    # solved from the table of solution lengths, only the initial state is needed
+    return EightPuzzleState(initialGrid)
 
 
 if __name__ == '__main__':
-    problem = initialize_puzzle()
+    initialState = initialize_puzzle()
     root = Tk()
     root.title("8 Puzzle")
-    app = EightPuzzleGUI(problem, 610, 610, root)
+    app = EightPuzzleGUI(initialState, 610, 610, root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,174 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Table of the optimal solution length of every 8 puzzle state.
+The table is built once by breadth first search backwards from the goal, a whole BFS layer at a time with NumPy.
+Grids are permutations of 0..8 indexed by their Lehmer code rank, so the table has 9! entries, one uint8 each.
+Unsolvable grids (the other parity class) keep UNREACHABLE. The table is saved as a .npy file and memory mapped
+the first time it is needed. Solving a state then only follows moves to states one step closer to the goal.
+
+Usage: python EightPuzzleTable.py [tableFile]
+"""
+
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from aiama.search import Operator, SearchTreeNode
+from EightPuzzle import EightPuzzleState, is_solvable, move_blank_down, move_blank_left, move_blank_right, \
+    move_blank_up
+
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'EightPuzzle.distances.npy')
+UNREACHABLE = 255
+GOAL_GRID = [1, 2, 3, 4, 5, 6, 7, 8, 0]
+
+OPERATORS = [
+    Operator("Move Blank Left", move_blank_left),
+    Operator("Move Blank Right", move_blank_right),
+    Operator("Move Blank Up", move_blank_up),
+    Operator("Move Blank Down", move_blank_down)
+]
+
+# factorials of 8..0, weight of each position in the rank
+_WEIGHTS = np.array([math.factorial(8 - i) for i in range(9)], dtype=np.int64)
+# blank moves as (position change, positions the blank can move from)
+_MOVES = [(-1, [p % 3 != 0 for p in range(9)]), (1, [p % 3 != 2 for p in range(9)]),
+          (-3, [p // 3 != 0 for p in range(9)]), (3, [p // 3 != 2 for p in range(9)])]
+
+# tables memory mapped from each file
+_tables = {}
+
+
+def rank(grid):
+    """
+    Lehmer code rank of a grid among the permutations of 0..8
+    """
+    return int(ranks(np.asarray([grid]))[0])
+
+
+def ranks(grids):
+    """
+    Lehmer code ranks of the rows of a 2-D array of grids
+    """
+    result = np.zeros(len(grids), dtype=np.int64)
+    for i in range(8):
+        # number of tiles after position i smaller than the tile on it
+        result += (grids[:, i + 1:] < grids[:, i:i + 1]).sum(axis=1) * _WEIGHTS[i]
+    return result
+
+
+def build_table(fileName=TABLE_FILE, progressFunc=None, stopFunc=None):
+    """
+    Compute the distance of every grid to the goal and save them to fileName.
+    progressFunc is called with the depth and the number of grids reached after each BFS layer. Building stops
+    without saving the table if stopFunc returns True, None is returned then
+    """
+    table = np.full(math.factorial(9), UNREACHABLE, dtype=np.uint8)
+    layer = np.array([GOAL_GRID], dtype=np.int8)
+    table[ranks(layer)] = 0
+    depth = 0
+    reached = 1
+    while len(layer) != 0:
+        depth += 1
+        blanks = np.argmax(layer == 0, axis=1)
+        neighbours = []
+        for change, allowed in _MOVES:
+            movable = np.asarray(allowed)[blanks]
+            grids = layer[movable]
+            rows = np.arange(len(grids))
+            blank = blanks[movable]
+            grids[rows, blank] = grids[rows, blank + change]
+            grids[rows, blank + change] = 0
+            neighbours.append(grids)
+        neighbours = np.concatenate(neighbours)
+        neighbourRanks = ranks(neighbours)
+        new = table[neighbourRanks] == UNREACHABLE
+        # a grid can be reached from several grids of the layer
+        newRanks, first = np.unique(neighbourRanks[new], return_index=True)
+        table[newRanks] = depth
+        layer = neighbours[new][first]
+        reached += len(newRanks)
+        if progressFunc is not None:
+            progressFunc(depth, reached)
+        if stopFunc is not None and stopFunc():
+            return None
+
+    temporaryName = fileName + '.tmp'
+    out = np.lib.format.open_memmap(temporaryName, mode='w+', dtype=np.uint8, shape=table.shape)
+    out[:] = table
+    out.flush()
+    del out
+    os.replace(temporaryName, fileName)
+    return table
+
+
+def distance_table(fileName=TABLE_FILE, progressFunc=None, stopFunc=None):
+    """
+    Return the table memory mapped from fileName, building it first if the file does not exist.
+    progressFunc and stopFunc are passed to build_table, None is returned if building is stopped
+    """
+    table = _tables.get(fileName)
+    if table is None:
+        if not os.path.exists(fileName) and build_table(fileName, progressFunc, stopFunc) is None:
+            return None
+        table = _tables[fileName] = np.load(fileName, mmap_mode='r')
+    return table
+
+
+def distance(grid, fileName=TABLE_FILE):
+    """
+    Optimal solution length of grid, UNREACHABLE if it can not be solved
+    """
+    return int(distance_table(fileName)[rank(grid)])
+
+
+def solve(state, progressFunc=None, stopFunc=None, fileName=TABLE_FILE):
+    """
+    Return the goal node of an optimal solution of an EightPuzzleState, like search methods of SearchProblem do.
+    Returns None if the state can not be solved. progressFunc and stopFunc are used if the table is built,
+    None is also returned if building is stopped
+    """
+    if not is_solvable(state.grid):
+        return None
+    table = distance_table(fileName, progressFunc, stopFunc)
+    if table is None:
+        return None
+    node = SearchTreeNode(state)
+    remaining = int(table[rank(state.grid)])
+    while remaining != 0:
+        for operator in OPERATORS:
+            nstates = operator.apply_operator(node.state)
+            if len(nstates) != 0 and int(table[rank(nstates[0].grid)]) == remaining - 1:
+                node = SearchTreeNode(nstates[0], node, operator, node.depth + 1, node.pathCost + 1)
+                remaining -= 1
+                break
+    return node
+
+
+if __name__ == '__main__':
+    fileName = sys.argv[1] if len(sys.argv) > 1 else TABLE_FILE
+    startTime = time.time()
+    table = build_table(fileName)
+    reachable = table[table != UNREACHABLE]
+    print('%d solvable states, longest solution %d moves, %.3f seconds' % (
+        len(reachable), reachable.max(), time.time() - startTime))
+    print('States at each distance:', np.bincount(reachable).tolist())
+
+    state = EightPuzzleState([8, 6, 7, 2, 5, 4, 3, 0, 1])
+    distance_table(fileName)
+    startTime = time.time()
+    node = solve(state, fileName=fileName)
+    print('Solved %s in %d moves, %.6f seconds' % (state, node.depth, time.time() - startTime))
@@ -10,7 +10,7 @@ Created on Feb 7, 2011
 
 import itertools
 
-from aiama.search import CSP
+from aiama.search import CSP, AllDifferent
 
 
 def check_constraints(state):
@@ -52,8 +52,51 @@ def forward_checking(state, val):
     return removeVals
 
 
+def global_constraints(rows):
+    """
+    Same constraints stated declaratively: columns, column + row and column - row of queens are all different
+    """
+    return [AllDifferent(rows),
+            AllDifferent(rows, dict([(r, i) for i, r in enumerate(rows)])),
+            AllDifferent(rows, dict([(r, -i) for i, r in enumerate(rows)]))]
+
+
+def rotate_board(row, column):
+    """
+    Board symmetry: rotate queen at row, column 90 degrees
+    """
+    rows = 'ABCDEFGH'
+    return rows[column - 1], 8 - rows.index(row)
+
+
+def reflect_board(row, column):
+    """
+    Board symmetry: reflect queen at row, column horizontally
+    """
+    return row, 9 - column
+
+
 if __name__ == '__main__':
     varsAndDomains = {('A', 'B', 'C', 'D', 'E', 'F', 'G', 'H'): [1, 2, 3, 4, 5, 6, 7, 8]}
     csp = CSP(varsAndDomains, [check_constraints], forward_checking)
     node = csp.solve()
     print(node)
+
+    csp = CSP(varsAndDomains, global_constraints(('A', 'B', 'C', 'D', 'E', 'F', 'G', 'H')))
+    node = csp.solve()
+    print(node)
+
+    # all 92 solutions
+    print('Solution count:', csp.count_solutions())
+    for solution in csp.solutions(limit=3, asTuples=True):
+        print(solution)
+
+    # 12 unique solutions by breaking 8 board symmetries, expanded back to 92
+    csp.add_symmetry(rotate_board)
+    csp.add_symmetry(reflect_board)
+    print('Unique solution count:', csp.count_solutions(symmetryBreaking=True))
+    print('Expanded solution count:', csp.count_solutions(symmetryBreaking=True, expand=True))
+
+    # min-conflicts local search
+    node = csp.solve_local(1000, 10)
+    print(node)
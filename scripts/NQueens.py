@@ -0,0 +1,86 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+CSP representation for N-Queens Problem with NumPy arrays
+Variables are rows 0..n-1, every variable holds the column index 0..n-1 of the queen on that row.
+The model is n_queens_csp of aiama.search.arrays. Columns, column + row and column - row of queens are all
+different, each of these is an ArrayAllDifferent constraint keeping occupancy counts in an array, so checking a
+value or updating counts is O(1) and checking all values of a row is a single vectorized call.
+Domains are kept in ArrayDomains, a boolean array with a row for each row of the board. During backtracking the
+keys of a newly assigned row are removed from the other rows with a single vectorized call that is pushed on the
+trail and undone on backtracking, so no domains are copied and boards of 10000 queens are solved by backtracking
+with dynamic variable ordering as well as by min-conflicts local search.
+
+Board is also solved with a genetic algorithm over permutations of columns, the population is scored by
+diagonal_conflicts in one vectorized call.
+
+Usage: python NQueens.py [n ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from aiama.search.arrays import n_queens_csp
+from aiama.search.genetic import GeneticAlgorithm
+
+
+def is_solution(n, columns):
+    """
+    Check a solution given as a list of columns with a single vectorized test
+    """
+    columns = np.asarray(columns)
+    rows = np.arange(n)
+    return len(columns) == n and len(np.unique(columns)) == n and len(np.unique(columns + rows)) == n and \
+        len(np.unique(columns - rows)) == n
+
+
+def diagonal_conflicts(population):
+    """
+    Number of queens sharing a diagonal with a queen on a previous row, for each row of the population.
+    Individuals are permutations of columns, so queens never share a column
+    """
+    rows = np.arange(population.shape[1])
+    conflicts = np.zeros(len(population), dtype=np.int64)
+    for diagonals in (population + rows, population - rows):
+        diagonals = np.sort(diagonals, axis=1)
+        conflicts += (diagonals[:, 1:] == diagonals[:, :-1]).sum(axis=1)
+    return conflicts
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] if len(sys.argv) > 1 else [8, 10, 100, 1000, 10000]
+    for n in sizes:
+        csp = n_queens_csp(n)
+        if n <= 10:
+            startTime = time.time()
+            count = csp.count_solutions()
+            print('n = %d, backtracking: %d solutions, %d nodes, %.3f seconds' % (
+                n, count, csp.stats['nodes'], time.time() - startTime))
+        startTime = time.time()
+        node = csp.solve(dynamicOrdering=True)
+        columns = [node.state.assignments[r] for r in range(n)] if node is not None else []
+        print('n = %d, backtracking with dynamic ordering: solved %s, %d nodes, %d backtracks, %.3f seconds' % (
+            n, is_solution(n, columns), csp.stats['nodes'], csp.stats['backtracks'], time.time() - startTime))
+        startTime = time.time()
+        node = csp.solve_local(maxSteps=100 * n, restarts=10, seed=0)
+        columns = [node.state.assignments[r] for r in range(n)] if node is not None else []
+        print('n = %d, min-conflicts: solved %s, %d steps, %.3f seconds' % (
+            n, is_solution(n, columns), csp.stats['steps'], time.time() - startTime))
+        if n <= 100:
+            startTime = time.time()
+            ga = GeneticAlgorithm(diagonal_conflicts, n, populationSize=200, seed=0)
+            columns, conflicts = ga.run(generations=2000, targetValue=0)
+            print('n = %d, genetic algorithm: solved %s, %d generations, %.3f seconds' % (
+                n, is_solution(n, columns), ga.history[-1]['generation'], time.time() - startTime))
@@ -0,0 +1,234 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+AIAMA Chapter 3: Solving Problems By Searching
+N x N sliding tile puzzle (8, 15 and 24 puzzles)
+The board is packed into a single int, tile at position p is kept in bits p * bits .. (p + 1) * bits - 1.
+4 bits per tile are enough up to 4x4, 5x5 boards need 5 bits per tile. States also keep the blank position,
+the board packed in column order (to read columns as quickly as rows) and their Manhattan distance, which are
+all updated by a few additions when a tile is moved. Moves are read from tables computed once per board size.
+Goal is tiles 1..N*N-1 in order with the blank on the last position, like EightPuzzle.
+
+Usage: python SlidingPuzzle.py [instanceCount]
+"""
+
+import random
+import sys
+import time
+
+from aiama.search import Operator, State, SearchProblem
+
+
+class SlidingPuzzleState(State):
+    __slots__ = ('board', 'columns', 'blank', 'manhattan', 'puzzle')
+
+    def __init__(self, board, columns, blank, manhattan, puzzle):
+        State.__init__(self)
+        self.board = board
+        self.columns = columns
+        self.blank = blank
+        self.manhattan = manhattan
+        self.puzzle = puzzle
+
+    def __repr__(self):
+        return repr(self.puzzle.to_grid(self))
+
+    def __eq__(self, other):
+        return self.board == other.board
+
+    def __hash__(self):
+        return hash(self.board)
+
+    def is_legal(self):
+        return True
+
+
+class SlidingPuzzle:
+    """
+    Move tables and heuristics of the size x size sliding tile puzzle
+    """
+
+    # blank moves in the order of EightPuzzle operators: (name, row change, column change)
+    DIRECTIONS = [("Move Blank Left", 0, -1), ("Move Blank Right", 0, 1), ("Move Blank Up", -1, 0),
+                  ("Move Blank Down", 1, 0)]
+
+    def __init__(self, size=3):
+        self.size = size
+        cells = size * size
+        self.bits = max(4, (cells - 1).bit_length())
+        self.tileMask = (1 << self.bits) - 1
+        self.lineBits = size * self.bits
+        self.lineMask = (1 << self.lineBits) - 1
+        # shift of each position in row order and column order
+        self.shifts = [p * self.bits for p in range(cells)]
+        self.columnShifts = [((p % size) * size + p // size) * self.bits for p in range(cells)]
+        # moves[d][p] is the position the blank moves to from p in direction d, -1 if it can not move
+        self.moves = []
+        for name, dr, dc in self.DIRECTIONS:
+            targets = []
+            for p in range(cells):
+                r, c = p // size + dr, p % size + dc
+                targets.append(r * size + c if 0 <= r < size and 0 <= c < size else -1)
+            self.moves.append(targets)
+        # distances[t][p] is the Manhattan distance of tile t at position p to its goal position
+        self.distances = [[0] * cells] + [[abs(p // size - (t - 1) // size) + abs(p % size - (t - 1) % size)
+                                           for p in range(cells)] for t in range(1, cells)]
+        # linear conflicts of each row and column content found so far
+        self.rowConflicts = [{} for i in range(size)]
+        self.columnConflicts = [{} for i in range(size)]
+        self.goalState = self.make_state(list(range(1, cells)) + [0])
+
+    def make_state(self, grid):
+        """
+        Return the state of a grid given as a list of tiles in row order, 0 is the blank
+        """
+        board = columns = manhattan = 0
+        for p, tile in enumerate(grid):
+            board |= tile << self.shifts[p]
+            columns |= tile << self.columnShifts[p]
+            manhattan += self.distances[tile][p]
+        return SlidingPuzzleState(board, columns, grid.index(0), manhattan, self)
+
+    def to_grid(self, state):
+        return [(state.board >> shift) & self.tileMask for shift in self.shifts]
+
+    def operators(self):
+        return [Operator(name, lambda state, d=d: self.move_blank(state, d))
+                for d, (name, dr, dc) in enumerate(self.DIRECTIONS)]
+
+    def move_blank(self, state, direction):
+        """
+        Slide the tile next to the blank in the given direction into the blank
+        """
+        blank = state.blank
+        target = self.moves[direction][blank]
+        if target < 0:
+            return []
+        tile = (state.board >> self.shifts[target]) & self.tileMask
+        board = state.board + (tile << self.shifts[blank]) - (tile << self.shifts[target])
+        columns = state.columns + (tile << self.columnShifts[blank]) - (tile << self.columnShifts[target])
+        distances = self.distances[tile]
+        manhattan = state.manhattan + distances[blank] - distances[target]
+        return [SlidingPuzzleState(board, columns, target, manhattan, self)]
+
+    def goal_test(self, state):
+        return state.board == self.goalState.board
+
+    def random_state(self, steps, randomGenerator=random):
+        """
+        Return the state reached by a random walk of the blank from the goal, it is always solvable
+        """
+        state = self.goalState
+        previous = None
+        for i in range(steps):
+            moves = [s for d in range(4) for s in self.move_blank(state, d) if s.blank != previous]
+            previous = state.blank
+            state = randomGenerator.choice(moves)
+        return state
+
+    @staticmethod
+    def manhattan_distance_heuristic(state):
+        return state.manhattan
+
+    def linear_conflict_heuristic(self, state):
+        """
+        Manhattan distance plus 2 moves for each tile that has to leave its goal row or column to let another
+        tile of the same line pass
+        """
+        h = state.manhattan
+        for i in range(self.size):
+            row = (state.board >> (i * self.lineBits)) & self.lineMask
+            conflicts = self.rowConflicts[i].get(row)
+            if conflicts is None:
+                conflicts = self.rowConflicts[i][row] = self.__line_conflicts(row, i, True)
+            column = (state.columns >> (i * self.lineBits)) & self.lineMask
+            value = self.columnConflicts[i].get(column)
+            if value is None:
+                value = self.columnConflicts[i][column] = self.__line_conflicts(column, i, False)
+            h += 2 * (conflicts + value)
+        return h
+
+    def __line_conflicts(self, line, index, isRow):
+        """
+        Number of tiles to remove from a line so that the other tiles whose goal is in this line are in goal order
+        """
+        goals = []
+        for k in range(self.size):
+            tile = (line >> (k * self.bits)) & self.tileMask
+            if tile == 0:
+                continue
+            goalRow, goalColumn = divmod(tile - 1, self.size)
+            if isRow and goalRow == index:
+                goals.append(goalColumn)
+            elif not isRow and goalColumn == index:
+                goals.append(goalRow)
+        # tiles that stay are the longest increasing subsequence of goal positions
+        longest = []
+        for k, goal in enumerate(goals):
+            longest.append(1 + max([longest[m] for m in range(k) if goals[m] < goal], default=0))
+        return len(goals) - max(longest, default=0)
+
+
+def _benchmark(problem, search):
+    startTime = time.time()
+    node = search(problem)
+    return node, time.time() - startTime, len(problem.generatedStates)
+
+
+if __name__ == "__main__":
+    import EightPuzzle
+
+    instanceCount = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    randomGenerator = random.Random(0)
+
+    # same 8 puzzle instances solved with EightPuzzle and with packed states
+    puzzle = SlidingPuzzle(3)
+    totals = {}
+    for i in range(instanceCount):
+        grid = puzzle.to_grid(puzzle.random_state(60, randomGenerator))
+        eightPuzzleOperators = [
+            Operator("Move Blank Left", EightPuzzle.move_blank_left),
+            Operator("Move Blank Right", EightPuzzle.move_blank_right),
+            Operator("Move Blank Up", EightPuzzle.move_blank_up),
+            Operator("Move Blank Down", EightPuzzle.move_blank_down)
+        ]
+        problems = {
+            'EightPuzzle manhattan': SearchProblem(EightPuzzle.EightPuzzleState(list(grid)), eightPuzzleOperators,
+                                                   EightPuzzle.eight_puzzle_goal_test, None,
+                                                   [EightPuzzle.manhattan_distance_heuristic]),
+            'SlidingPuzzle manhattan': SearchProblem(puzzle.make_state(grid), puzzle.operators(), puzzle.goal_test,
+                                                     None, [puzzle.manhattan_distance_heuristic]),
+            'SlidingPuzzle linear conflict': SearchProblem(puzzle.make_state(grid), puzzle.operators(),
+                                                           puzzle.goal_test, None, [puzzle.linear_conflict_heuristic])
+        }
+        depths = set()
+        for name, problem in problems.items():
+            node, seconds, generated = _benchmark(problem, SearchProblem.a_star_search)
+            depths.add(node.depth)
+            total = totals.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += generated
+        print('8 puzzle %s: solution length %s' % (grid, sorted(depths)))
+    for name, (seconds, generated) in totals.items():
+        print('%s: %.3f seconds, %d states generated' % (name, seconds, generated))
+
+    # 15 and 24 puzzle instances a few dozen random moves away from the goal
+    for size in (4, 5):
+        puzzle = SlidingPuzzle(size)
+        for steps in (20, 30):
+            initialState = puzzle.random_state(steps, randomGenerator)
+            problem = SearchProblem(initialState, puzzle.operators(), puzzle.goal_test, None,
+                                    [puzzle.linear_conflict_heuristic])
+            node, seconds, generated = _benchmark(problem, SearchProblem.a_star_search)
+            print('%dx%d puzzle: solution length %d, %.3f seconds, %d states generated' % (
+                size, size, node.depth, seconds, generated))
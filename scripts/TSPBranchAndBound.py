@@ -0,0 +1,326 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Exact TSP with depth first branch and bound using Held-Karp 1-tree bounds.
+A 1-tree is a minimum spanning tree of cities 1..n-1 plus the two cheapest edges of city 0, every tour is a
+1-tree so its cost is a lower bound. Adding a penalty pi[i] to every edge of city i does not change which tour
+is shortest (every tour has two edges at each city) but changes the 1-tree. Penalties are improved with
+subgradient steps which raise penalties of cities with more than two 1-tree edges and lower the others,
+the bound is 1-tree cost - 2 * sum(pi).
+Incumbent tour comes from 2-opt/Or-opt iterated local search. At the root, an edge is removed if the bound of any
+1-tree containing it is above the incumbent (reduced cost elimination).
+Search branches on the 1-tree edges of a city with more than two of them. Only the edges fixed by each node
+and its penalties are kept on the stack, one cost matrix is changed and restored while going down and up.
+Memory is O(n^2) for the cost matrix plus the undo lists of the nodes on the current path, an edge is changed
+at most once along a path so together they hold at most n^2 changes. Unvisited children on the stack keep their
+fixes and penalties, O(n) each.
+
+Usage: python TSPBranchAndBound.py [cityCount]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from TravelingSalesmanProblem import TSP
+from TSPLocalSearch import heuristic_tour, tour_node
+from TSPHeldKarp import held_karp
+
+
+class TSPBranchAndBound:
+    """
+    Branch and bound solver for the symmetric TSP
+    """
+
+    def __init__(self, tsp, rootIterations=None, nodeIterations=None, kicks=None):
+        """
+        rootIterations and nodeIterations are the maximum numbers of subgradient steps at the root and at
+        other nodes of the search tree, kicks is the number of iterated local search steps for the initial tour
+        """
+        self.tsp = tsp
+        self.n = tsp.cityCount
+        self.base = np.array(tsp.distances, dtype=np.float64)
+        np.fill_diagonal(self.base, np.inf)
+        self.rootIterations = 50 * self.n if rootIterations is None else rootIterations
+        self.nodeIterations = self.n if nodeIterations is None else nodeIterations
+        self.kicks = 50 * self.n if kicks is None else kicks
+        # forced edges get cost - M so that every 1-tree contains them, M is larger than any tour
+        finite = self.base[np.isfinite(self.base)]
+        self.M = 2.0 * self.n * (float(finite.max()) if len(finite) != 0 else 1.0) + 1.0
+        self.stats = {'nodes': 0, 'pruned': 0, 'eliminatedEdges': 0, 'rootBound': None, 'initialTour': None}
+
+    def solve(self):
+        """
+        Return the shortest tour as a list of cities starting with city 0 and its length
+        """
+        n = self.n
+        if n < 4:
+            tour = list(range(n))
+            return tour, self.__tour_cost(tour)
+        self.bestTour, self.bestCost = heuristic_tour(self.tsp, kicks=self.kicks, seed=0)
+        self.stats['initialTour'] = self.bestCost
+        # costs with fixed edges, forcedDegree is the number of forced edges of each city
+        self.cost = self.base.copy()
+        self.forcedDegree = np.zeros(n, dtype=np.int64)
+        self.forcedCount = 0
+
+        pi = np.zeros(n)
+        bound, pi, tree = self.__ascent(pi, self.rootIterations, 2.0)
+        self.stats['rootBound'] = float(bound)
+        if tree is not None and bound < self.__limit():
+            # edges removed at the root are never restored
+            self.stats['eliminatedEdges'] = self.__eliminate_edges(tree, pi, [])
+
+        # stack holds ('visit', fixes, penalties) and ('undo', changes) entries
+        stack = [('visit', [], pi)]
+        while len(stack) != 0:
+            entry = stack.pop()
+            if entry[0] == 'undo':
+                self.__undo(entry[1])
+                continue
+            fixes, pi = entry[1], entry[2]
+            changes = self.__apply(fixes)
+            stack.append(('undo', changes))
+            if changes is None:
+                self.stats['pruned'] = self.stats['pruned'] + 1
+                continue
+            self.stats['nodes'] = self.stats['nodes'] + 1
+            bound, pi, tree = self.__ascent(pi, self.nodeIterations, 0.5)
+            if tree is None or bound >= self.__limit():
+                self.stats['pruned'] = self.stats['pruned'] + 1
+                continue
+            self.__eliminate_edges(tree, pi, changes)
+            children = self.__branch(tree)
+            for childFixes in reversed(children):
+                stack.append(('visit', childFixes, pi))
+        return self.bestTour, self.bestCost
+
+    def __limit(self):
+        # a node is pruned unless it can contain a tour shorter than the incumbent
+        return self.bestCost - 1e-9 * max(1.0, abs(self.bestCost))
+
+    def __tour_cost(self, tour):
+        return float(sum([self.tsp.distances[tour[i - 1], tour[i]] for i in range(len(tour))]))
+
+    def __one_tree(self, pi):
+        """
+        Return the cost, degrees and edges of the minimum 1-tree for edge costs cost[i, j] + pi[i] + pi[j]
+        """
+        n = self.n
+        w = self.cost + pi[:, None] + pi[None, :]
+        # Prim's algorithm on cities 1..n-1
+        inTree = np.zeros(n, dtype=bool)
+        inTree[0] = True
+        inTree[1] = True
+        key = w[1].copy()
+        parent = np.ones(n, dtype=np.int64)
+        key[inTree] = np.inf
+        treeCost = 0.0
+        edges = []
+        for step in range(n - 2):
+            v = int(np.argmin(key))
+            if key[v] == np.inf:
+                return None
+            treeCost = treeCost + key[v]
+            edges.append((int(parent[v]), v))
+            inTree[v] = True
+            closer = w[v] < key
+            parent[closer] = v
+            np.minimum(key, w[v], out=key)
+            key[inTree] = np.inf
+        # two cheapest edges of city 0
+        first, second = np.argsort(w[0, 1:], kind='stable')[:2] + 1
+        if w[0, second] == np.inf:
+            return None
+        treeCost = treeCost + w[0, first] + w[0, second]
+        edges.append((0, int(first)))
+        edges.append((0, int(second)))
+        degrees = np.zeros(n, dtype=np.int64)
+        for a, b in edges:
+            degrees[a] += 1
+            degrees[b] += 1
+        return treeCost, degrees, edges, w
+
+    def __ascent(self, pi, iterations, stepScale):
+        """
+        Subgradient optimization of penalties starting from pi. Returns the best bound, its penalties and
+        1-tree. A 1-tree that is a tour updates the incumbent
+        """
+        bestBound = -np.inf
+        bestPi = pi
+        bestTree = None
+        pi = pi.copy()
+        sinceImprovement = 0
+        for iteration in range(max(1, iterations)):
+            result = self.__one_tree(pi)
+            if result is None:
+                return np.inf, bestPi, None
+            treeCost, degrees, edges, w = result
+            bound = treeCost + self.M * self.forcedCount - 2.0 * pi.sum()
+            if bound > bestBound + 1e-12:
+                bestBound, bestPi, bestTree = bound, pi.copy(), result
+                sinceImprovement = 0
+            else:
+                sinceImprovement = sinceImprovement + 1
+            if bound >= self.__limit():
+                break
+            subgradient = degrees - 2
+            norm = float((subgradient ** 2).sum())
+            if norm == 0:
+                # 1-tree is a tour
+                tour = self.__tree_tour(edges)
+                cost = self.__tour_cost(tour)
+                if cost < self.bestCost:
+                    self.bestTour, self.bestCost = tour, cost
+                return cost, pi, result
+            if sinceImprovement >= 10:
+                stepScale = stepScale / 2.0
+                sinceImprovement = 0
+                if stepScale < 1e-4:
+                    break
+            step = stepScale * (self.bestCost - bound) / norm
+            pi = pi + step * subgradient
+        return bestBound, bestPi, bestTree
+
+    def __tree_tour(self, edges):
+        neighbours = [[] for i in range(self.n)]
+        for a, b in edges:
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+        tour = [0]
+        previous = -1
+        while len(tour) < self.n:
+            city = tour[-1]
+            nextCity = neighbours[city][0] if neighbours[city][0] != previous else neighbours[city][1]
+            previous = city
+            tour.append(nextCity)
+        return tour
+
+    def __eliminate_edges(self, tree, pi, changes):
+        """
+        Remove edges that can not be in a tour shorter than the incumbent. Adding edge (i, j) to the 1-tree
+        removes the most expensive edge on the tree path between i and j, or the more expensive edge of city 0.
+        Removed edges are recorded in changes. Returns the number of removed edges
+        """
+        treeCost, degrees, edges, w = tree
+        n = self.n
+        bound = treeCost + self.M * self.forcedCount - 2.0 * pi.sum()
+        limit = self.__limit()
+        neighbours = [[] for i in range(n)]
+        for a, b in edges[:-2]:
+            neighbours[a].append(b)
+            neighbours[b].append(a)
+        treeEdges = set([(min(a, b), max(a, b)) for a, b in edges])
+        secondZeroEdge = max([w[0, b] for a, b in edges[-2:]])
+        removed = 0
+        for source in range(1, n):
+            # most expensive edge on the tree path from source to every city
+            maxEdge = np.zeros(n)
+            stack = [(source, -1)]
+            while len(stack) != 0:
+                city, previous = stack.pop()
+                for nextCity in neighbours[city]:
+                    if nextCity != previous:
+                        maxEdge[nextCity] = max(maxEdge[city], w[city, nextCity])
+                        stack.append((nextCity, city))
+            # edges that could be added
+            targets = np.arange(source + 1, n)
+            reducedBounds = bound + w[source, source + 1:] - maxEdge[source + 1:]
+            for target in targets[(reducedBounds >= limit) & np.isfinite(self.cost[source, source + 1:])].tolist():
+                if (source, target) not in treeEdges:
+                    self.__set(source, target, np.inf, changes)
+                    removed = removed + 1
+        for target in range(1, n):
+            if (0, target) in treeEdges or self.cost[0, target] == np.inf:
+                continue
+            if bound + w[0, target] - secondZeroEdge >= limit:
+                self.__set(0, target, np.inf, changes)
+                removed = removed + 1
+        return removed
+
+    def __branch(self, tree):
+        """
+        Choose a city with more than two 1-tree edges and two of its edges e1, e2 that are not fixed.
+        Children: e1 is excluded, e1 is included and e2 excluded, both are included
+        """
+        treeCost, degrees, edges, w = tree
+        city = int(np.argmax(degrees))
+        free = [(a, b) for a, b in edges if city in (a, b) and self.cost[a, b] > -self.M / 2]
+        free.sort(key=lambda e: -w[e[0], e[1]])
+        e1 = free[0]
+        if self.forcedDegree[city] == 1 or len(free) < 2:
+            return [[('exclude', e1)], [('include', e1)]]
+        e2 = free[1]
+        return [[('exclude', e1)], [('include', e1), ('exclude', e2)], [('include', e1), ('include', e2)]]
+
+    def __apply(self, fixes):
+        """
+        Change costs for fixed edges. When a city has two forced edges, its other edges are excluded.
+        Returns the list of changes to undo, or None if fixes can not be applied (changes are undone then)
+        """
+        changes = []
+        for fix, (a, b) in fixes:
+            if fix == 'exclude':
+                if self.cost[a, b] < -self.M / 2:
+                    self.__undo(changes)
+                    return None
+                self.__set(a, b, np.inf, changes)
+                continue
+            if self.cost[a, b] == np.inf or self.forcedDegree[a] == 2 or self.forcedDegree[b] == 2:
+                self.__undo(changes)
+                return None
+            self.__set(a, b, self.base[a, b] - self.M, changes)
+            self.forcedDegree[a] += 1
+            self.forcedDegree[b] += 1
+            self.forcedCount = self.forcedCount + 1
+            changes.append(('forced', a, b))
+            for city in (a, b):
+                if self.forcedDegree[city] == 2:
+                    for other in np.nonzero(np.isfinite(self.cost[city]) & (self.cost[city] > -self.M / 2))[0]:
+                        self.__set(city, int(other), np.inf, changes)
+        return changes
+
+    def __set(self, a, b, value, changes):
+        changes.append(('cost', a, b, self.cost[a, b]))
+        self.cost[a, b] = self.cost[b, a] = value
+
+    def __undo(self, changes):
+        if changes is None:
+            return
+        for change in reversed(changes):
+            if change[0] == 'cost':
+                a, b, value = change[1:]
+                self.cost[a, b] = self.cost[b, a] = value
+            else:
+                a, b = change[1:]
+                self.forcedDegree[a] -= 1
+                self.forcedDegree[b] -= 1
+                self.forcedCount = self.forcedCount - 1
+        del changes[:]
+
+
+if __name__ == '__main__':
+    # compare with dynamic programming on a small instance
+    tsp = TSP(14)
+    solver = TSPBranchAndBound(tsp)
+    tour, cost = solver.solve()
+    print("Branch and bound: %f, Held-Karp: %f, %s" % (cost, held_karp(tsp).pathCost, solver.stats))
+
+    cityCount = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    tsp = TSP(cityCount)
+    startTime = time.time()
+    solver = TSPBranchAndBound(tsp)
+    tour, cost = solver.solve()
+    print(tour_node(tsp, tour))
+    print("%d cities: tour length %f, %.3f seconds, %s" % (cityCount, cost, time.time() - startTime, solver.stats))
@@ -16,65 +16,163 @@ Created on Feb 9, 2011
 @author: goker
 """
 
+import queue
+import sys
+import threading
+import traceback
 from tkinter import *
 
 from TravelingSalesmanProblem import *
+from TSPLocalSearch import heuristic_tour, tour_node
 
 
 class TSPGUI:
+    """
+    Search runs in a worker thread, it reports progress and better tours through a queue that the window polls,
+    so the window is redrawn and can cancel the search while it runs. A tour found by local search is drawn
+    first. A* then finds the shortest path through all cities, the path closed into a tour replaces the drawn tour
+    only if it is shorter
+    """
+
     def __init__(self, tsp, cw, ch, master=None):
         self.frame = Frame(master)
         self.canvasWidth = cw
         self.canvasHeight = ch
         self.tsp = tsp
+        self.problem = None
+        self.messages = queue.Queue()
         self.add_button()
         self.add_canvas()
         self.frame.pack()
 
     def add_button(self):
-        self.solveButton = Button(self.frame, width=4, height=2, text="Solve", command=self.solve_tsp)
+        self.solveButton = Button(self.frame, width=6, height=2, text="Solve", command=self.solve_tsp)
         self.solveButton.pack(side=BOTTOM)
 
     def solve_tsp(self):
         # solve tsp
         initialState = TSPState([], 0, [], self.tsp)
         operators = [Operator("Add new edge", generate_new_states)]
-        problem = SearchProblem(initialState, operators, goal_test, path_cost, [minimum_spanning_tree_cost])
-        # node = problem.UniformCostSearch()
-        node = problem.a_star_search()
-        self.draw_canvas(node)
-        # self.tspcanvas.pack()
+        self.problem = SearchProblem(initialState, operators, goal_test, path_cost, [minimum_spanning_tree_cost],
+                                     progressFunc=self.__progress)
+        self.cancelEvent = threading.Event()
+        self.bestLength = None
+        self.solveButton.config(text="Cancel", command=self.cancel, state="normal")
+        self.draw_status("")
+        threading.Thread(target=self.__solve, daemon=True).start()
+        self.frame.after(100, self.__poll)
+
+    def cancel(self):
+        self.cancelEvent.set()
+        self.problem.cancel()
+        self.solveButton.config(text="Cancelling", state="disabled")
+
+    def __solve(self):
+        """
+        Runs in the worker thread, only puts messages to the queue
+        """
+        try:
+            heuristic_tour(self.tsp, kicks=20 * self.tsp.cityCount, stopFunc=self.cancelEvent.is_set,
+                           progressFunc=lambda tour, length: self.messages.put(('tour', tour_node(self.tsp, tour))))
+            # node = problem.UniformCostSearch()
+            node = None if self.cancelEvent.is_set() else self.problem.a_star_search()
+            self.messages.put(('done', node))
+        except Exception as exc:
+            traceback.print_exc()
+            self.messages.put(('error', exc))
+
+    def __progress(self, stats):
+        """
+        Called by the search in the worker thread
+        """
+        # a cancel made just before the search started is made again, starting the search resets cancelled
+        if self.cancelEvent.is_set():
+            self.problem.cancel()
+        self.messages.put(('progress', stats))
+
+    def __poll(self):
+        """
+        Handle messages of the worker thread, poll again later until the search is done
+        """
+        done = False
+        solved = False
+        while True:
+            try:
+                message, value = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message == 'tour':
+                self.bestLength = value.pathCost
+                self.draw_canvas(value, "Best tour so far")
+            elif message == 'progress':
+                self.draw_status("Expanded nodes: %d, f: %f" % (value['expanded'], value['f']))
+            elif message == 'error':
+                done = True
+                self.draw_status("Search failed: %r" % (value,))
+            else:
+                done = True
+                if value is not None:
+                    solved = True
+                    # path cost of the goal leaves out the edge back to the start city
+                    tour = tour_node(self.tsp, value.state.visitedCities)
+                    if self.bestLength is None or tour.pathCost < self.bestLength:
+                        self.draw_canvas(tour, "A* tour")
+                        status = ""
+                    else:
+                        status = ", A* tour is not shorter"
+                elif self.problem.cancelled:
+                    status = ", cancelled"
+                else:
+                    status = ", no tour found"
+                self.draw_status("Expanded nodes: %d%s" % (self.problem.stats.get('expanded', 0), status))
+        if not done:
+            self.frame.after(100, self.__poll)
+        elif solved:
+            self.solveButton.config(text="Solved", state="disabled")
+        else:
+            # search can be started again after it is cancelled or fails
+            self.solveButton.config(text="Solve", command=self.solve_tsp, state="normal")
 
     def add_canvas(self):
         self.tspcanvas = Canvas(self.frame, width=self.canvasWidth, height=self.canvasHeight)
         self.draw_canvas(None)
         self.tspcanvas.pack(side=RIGHT)
 
-    def draw_canvas(self, solution):
+    def draw_status(self, text):
+        self.tspcanvas.delete('status')
+        self.tspcanvas.create_text(self.canvasWidth // 2, self.canvasHeight - 10, text=text, tags='status')
+
+    def draw_canvas(self, solution, title="Total Path Length"):
         hors = 20
         vers = 20
         w = self.canvasWidth - 2 * hors
         h = self.canvasHeight - 2 * vers
 
-        for x, y in self.tsp.locations:
-            self.tspcanvas.create_oval(hors + w * x - 3, vers + h * y - 3, hors + w * x + 3, vers + h * y + 3)
+        if self.tspcanvas.find_withtag('city') == ():
+            for x, y in self.tsp.locations:
+                self.tspcanvas.create_oval(hors + w * x - 3, vers + h * y - 3, hors + w * x + 3, vers + h * y + 3,
+                                           tags='city')
 
         if solution != None:
+            # only the tour is redrawn
+            self.tspcanvas.delete('tour')
             for c1, c2 in solution.state.edges:
                 self.tspcanvas.create_line(self.tsp.locations[c1][0] * w + hors, self.tsp.locations[c1][1] * h + vers,
-                                           self.tsp.locations[c2][0] * w + hors, self.tsp.locations[c2][1] * h + vers)
-            startCity = solution.state.edges[len(solution.state.edges) - 1][1]
-            endCity = solution.state.edges[0][0]
-            self.tspcanvas.create_line(self.tsp.locations[startCity][0] * w + hors,
-                                       self.tsp.locations[startCity][1] * h + vers,
-                                       self.tsp.locations[endCity][0] * w + hors,
-                                       self.tsp.locations[endCity][1] * h + vers)
-            pathText = "Total Path Length: %f" % (solution.pathCost)
-            self.tspcanvas.create_text(100, 20, text=pathText)
+                                           self.tsp.locations[c2][0] * w + hors, self.tsp.locations[c2][1] * h + vers,
+                                           tags='tour')
+            if len(solution.state.edges) != 0:
+                startCity = solution.state.edges[len(solution.state.edges) - 1][1]
+                endCity = solution.state.edges[0][0]
+                self.tspcanvas.create_line(self.tsp.locations[startCity][0] * w + hors,
+                                           self.tsp.locations[startCity][1] * h + vers,
+                                           self.tsp.locations[endCity][0] * w + hors,
+                                           self.tsp.locations[endCity][1] * h + vers, tags='tour')
+            pathText = "%s: %f" % (title, solution.pathCost)
+            self.tspcanvas.create_text(100, 20, text=pathText, tags='tour')
 
 
 if __name__ == '__main__':
-    tsp = TSP(10)
+    tsp = TSP(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
     root = Tk()
     root.title("TSP")
     app = TSPGUI(tsp, 600, 600, root)
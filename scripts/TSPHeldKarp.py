@@ -0,0 +1,123 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Exact TSP with Held-Karp dynamic programming.
+cost[S, j] is the cost of the cheapest path starting from city 0, visiting every city in set S (of cities
+1..n-1) and ending at city j in S. Sets are bitmasks, cost[S, j] = min over k of cost[S - {j}, k] + d(k, j).
+Table is filled for all sets of the same size at once with NumPy, it has 2^(n-1) * (n-1) entries so it is
+kept in a memory mapped file for larger instances. Time is O(2^n * n^2).
+
+Usage: python TSPHeldKarp.py [cityCount]
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from aiama.search import SearchTreeNode
+from TravelingSalesmanProblem import TSP, TSPState
+
+
+def held_karp(tsp, tableFile=None, maxMemory=2 ** 30, blockSize=2 ** 16):
+    """
+    Find the shortest tour of tsp starting and ending at city 0. Cost table is kept in tableFile if it is
+    given, in a temporary file if it needs more than maxMemory bytes, in memory otherwise.
+    Returns a node like the ones found by search: its state is a TSPState whose edges form the tour (without the
+    edge back to city 0, as drawn by TSPGUI) and its pathCost is the length of the tour including that edge
+    """
+    n = tsp.cityCount
+    distances = np.asarray(tsp.distances, dtype=np.float64)
+    if n == 1:
+        return SearchTreeNode(TSPState([], 0, [], tsp))
+    m = n - 1
+    # d[k, j] is the distance between cities k + 1 and j + 1, table columns are cities 1..n-1
+    d = distances[1:, 1:]
+    shape = (2 ** m, m)
+    temporaryName = None
+    if tableFile is None and shape[0] * shape[1] * 8 > maxMemory:
+        handle, temporaryName = tempfile.mkstemp(suffix='.npy')
+        os.close(handle)
+        tableFile = temporaryName
+    try:
+        if tableFile is None:
+            cost = np.full(shape, np.inf)
+        else:
+            cost = np.lib.format.open_memmap(tableFile, mode='w+', dtype=np.float64, shape=shape)
+            cost[:] = np.inf
+        _fill_table(cost, d, distances[0, 1:], blockSize)
+
+        full = 2 ** m - 1
+        tourCosts = cost[full] + distances[1:, 0]
+        last = int(np.argmin(tourCosts))
+        tourCost = float(tourCosts[last])
+        # walk back through the table to find the cities of the tour in reverse order
+        cities = []
+        mask = full
+        while True:
+            cities.append(last + 1)
+            previousMask = mask & ~(1 << last)
+            if previousMask == 0:
+                break
+            last = int(np.argmin(cost[previousMask] + d[:, last]))
+            mask = previousMask
+        del cost
+    finally:
+        if temporaryName is not None:
+            os.remove(temporaryName)
+
+    cities = [0] + cities[::-1]
+    edges = [(cities[i - 1], cities[i]) for i in range(1, n)]
+    state = TSPState(edges, cities[-1], cities[:-1], tsp)
+    return SearchTreeNode(state, depth=len(edges), pathCost=tourCost)
+
+
+def _fill_table(cost, d, startDistances, blockSize):
+    m = len(startDistances)
+    masks = np.arange(2 ** m, dtype=np.int64)
+    sizes = np.zeros(2 ** m, dtype=np.int64)
+    for j in range(m):
+        sizes += (masks >> j) & 1
+    # sets ordered by size, sets of each size are a slice
+    order = np.argsort(sizes, kind='stable')
+    bounds = np.searchsorted(sizes[order], np.arange(m + 2))
+
+    # paths visiting only city j
+    cost[1 << np.arange(m), np.arange(m)] = startDistances
+    for size in range(2, m + 1):
+        sameSize = order[bounds[size]:bounds[size + 1]]
+        for j in range(m):
+            withJ = sameSize[(sameSize >> j) & 1 == 1]
+            for start in range(0, len(withJ), blockSize):
+                block = withJ[start:start + blockSize]
+                # cost of paths to sets without j extended by the edge from their last city to j
+                cost[block, j] = (cost[block & ~(1 << j)] + d[:, j]).min(axis=1)
+
+
+if __name__ == '__main__':
+    # compare with trying every tour on a small instance
+    tsp = TSP(8)
+    node = held_karp(tsp)
+    print(node)
+    bestCost = min([sum([tsp.distances[t[i - 1], t[i]] for i in range(len(t))])
+                    for t in [(0,) + p for p in itertools.permutations(range(1, tsp.cityCount))]])
+    print("Shortest tour by enumeration: %f" % bestCost)
+
+    cityCount = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    tsp = TSP(cityCount)
+    startTime = time.time()
+    node = held_karp(tsp)
+    print("%d cities: tour length %f, %.3f seconds" % (cityCount, node.pathCost, time.time() - startTime))
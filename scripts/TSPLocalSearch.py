@@ -0,0 +1,450 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Heuristic tours for large TSP instances.
+Initial tour is built with nearest neighbour or greedy edge matching, then improved with 2-opt and Or-opt moves
+(moving a segment of 1 to 3 cities elsewhere in the tour, possibly reversed).
+Only moves adding an edge between a city and one of its k nearest neighbours are tried. Neighbours are found
+with a grid over city locations. Every city has a don't look bit: a city is checked again only if one of its
+tour edges changed since it was last checked without finding an improving move.
+A pass over the tour is then close to linear instead of O(n^2).
+
+Usage: python TSPLocalSearch.py [cityCount | file.tsp ...]
+"""
+
+import math
+import random
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+from aiama.search import SearchTreeNode
+from TravelingSalesmanProblem import TSP, TSPState, load_tsplib
+
+# moves improving tour length less than this are ignored to avoid cycling on rounding errors
+EPSILON = 1e-9
+
+
+class CityGrid:
+    """
+    Cities placed in a square grid over the city locations with about 2 cities per cell. Cities in the ring of
+    cells at a given distance from the cell of a city are found without looking at other cities
+    """
+
+    def __init__(self, tsp, cities=None):
+        cities = list(range(tsp.cityCount)) if cities is None else list(cities)
+        self.locations = locations = tsp.coordinates
+        low = locations.min(axis=0)
+        size = max(float((locations.max(axis=0) - low).max()), 1e-12)
+        self.gridSize = max(1, int(math.sqrt(len(cities) / 2.0)))
+        self.cellSize = size / self.gridSize
+        self.cells = np.minimum(((locations - low) / self.cellSize).astype(np.int64), self.gridSize - 1).tolist()
+        self.grid = {}
+        for i in cities:
+            self.grid.setdefault(tuple(self.cells[i]), []).append(i)
+
+    def ring(self, city, ring):
+        """
+        Return the cities in the cells ring cells away from the cell of city
+        """
+        cx, cy = self.cells[city]
+        found = []
+        for x in range(cx - ring, cx + ring + 1):
+            for y in range(cy - ring, cy + ring + 1):
+                if max(abs(x - cx), abs(y - cy)) == ring:
+                    found.extend(self.grid.get((x, y), []))
+        return found
+
+    def nearest(self, city, k):
+        """
+        Return an array of the k cities of the grid closest to city by euclidean distance, closest first.
+        The grid should have more than k cities
+        """
+        found = []
+        ring = 0
+        while True:
+            found.extend(self.ring(city, ring))
+            # cities outside searched rings are at least ring * cellSize away
+            if len(found) > k:
+                candidates = np.array([c for c in found if c != city], dtype=np.int64)
+                differences = self.locations[candidates] - self.locations[city]
+                lengths = np.sqrt((differences ** 2).sum(axis=1))
+                closest = np.argsort(lengths, kind='stable')[:k]
+                if lengths[closest[-1]] <= ring * self.cellSize or ring > self.gridSize:
+                    return candidates[closest]
+            ring = ring + 1
+
+
+def nearest_neighbours(tsp, k=8):
+    """
+    Return a list containing k nearest cities of each city, closest first. Cities are placed in a CityGrid,
+    cells around a city are searched in rings until no closer city can be found
+    """
+    n = tsp.cityCount
+    if n < 2:
+        return [[] for i in range(n)]
+    k = min(k, n - 1)
+    grid = CityGrid(tsp)
+
+    neighbours = []
+    for i in range(n):
+        # order by tour distance, it may differ from euclidean distance of coordinates (e.g. rounded)
+        cities = grid.nearest(i, k)
+        neighbours.append(cities[np.argsort(tsp.distances[i, cities], kind='stable')].tolist())
+    return neighbours
+
+
+def nearest_neighbour_tour(tsp, neighbours, start=0):
+    """
+    Start from a city and go to the nearest unvisited city. If every candidate neighbour is visited, nearest
+    unvisited city is found from the distance matrix
+    """
+    n = tsp.cityCount
+    visited = np.zeros(n, dtype=bool)
+    tour = [start]
+    visited[start] = True
+    city = start
+    for step in range(n - 1):
+        nextCity = -1
+        for c in neighbours[city]:
+            if not visited[c]:
+                nextCity = c
+                break
+        if nextCity == -1:
+            row = np.where(visited, np.inf, tsp.distances[city])
+            nextCity = int(np.argmin(row))
+        visited[nextCity] = True
+        tour.append(nextCity)
+        city = nextCity
+    return tour
+
+
+def greedy_tour(tsp, neighbours):
+    """
+    Greedy edge matching: candidate edges are added shortest first if both cities have less than two edges and
+    the edge does not close a cycle. Path fragments are then joined the same way with the edges between free
+    ends and their nearest free ends, found in a CityGrid of the free ends, until a single path is left
+    """
+    n = tsp.cityCount
+    if n < 3:
+        return list(range(n))
+    edges = set()
+    for a in range(n):
+        for b in neighbours[a]:
+            edges.add((min(a, b), max(a, b)))
+    edges = sorted(edges, key=lambda e: tsp.distances[e[0], e[1]])
+    degree = [0] * n
+    links = [[] for i in range(n)]
+    parent = list(range(n))
+
+    def find(a):
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    def link(a, b):
+        links[a].append(b)
+        links[b].append(a)
+        degree[a] = degree[a] + 1
+        degree[b] = degree[b] + 1
+        parent[find(a)] = find(b)
+
+    for a, b in edges:
+        if degree[a] < 2 and degree[b] < 2 and find(a) != find(b):
+            link(a, b)
+
+    # single cities are both ends of their fragment. The shortest edge between two fragments is an edge to one of
+    # the two nearest free ends of its cities, so each round joins some fragments
+    ends = [c for c in range(n) if degree[c] < 2]
+    while len(ends) > 2:
+        grid = CityGrid(tsp, ends)
+        endEdges = set()
+        for a in ends:
+            for b in grid.nearest(a, min(8, len(ends) - 1)).tolist():
+                endEdges.add((min(a, b), max(a, b)))
+        for a, b in sorted(endEdges, key=lambda e: tsp.distances[e[0], e[1]]):
+            if degree[a] < 2 and degree[b] < 2 and find(a) != find(b):
+                link(a, b)
+        ends = [c for c in range(n) if degree[c] < 2]
+
+    # walk along links
+    tour = [ends[0]]
+    previous = -1
+    while len(tour) < n:
+        city = tour[-1]
+        nextCity = links[city][0] if links[city][0] != previous else links[city][1]
+        previous = city
+        tour.append(nextCity)
+    return tour
+
+
+def tour_length(tsp, tour):
+    return float(tsp.distances[tour, np.roll(tour, -1)].sum())
+
+
+class TourImprovement:
+    """
+    2-opt and Or-opt local search on a tour with candidate neighbour lists and don't look bits.
+    Tour is kept as a list of cities and the position of each city in it
+    """
+
+    def __init__(self, tsp, tour, neighbours, maxSegment=3):
+        self.tsp = tsp
+        self.d = tsp.distances.item
+        self.tour = list(tour)
+        self.n = len(self.tour)
+        self.position = [0] * self.n
+        for i, c in enumerate(self.tour):
+            self.position[c] = i
+        self.neighbours = neighbours
+        self.maxSegment = maxSegment
+        self.stats = {'twoOptMoves': 0, 'orOptMoves': 0, 'checks': 0}
+
+    def succ(self, city):
+        return self.tour[(self.position[city] + 1) % self.n]
+
+    def pred(self, city):
+        return self.tour[self.position[city] - 1]
+
+    def improve(self, maxChecks=None, cities=None):
+        """
+        Apply improving moves until no city can be improved, returns the tour.
+        If cities are given, only their don't look bits are off at start
+        """
+        if self.n < 5:
+            return self.tour
+        # cities whose don't look bits are off
+        queue = deque(self.tour if cities is None else cities)
+        queued = [False] * self.n
+        for c in queue:
+            queued[c] = True
+        while len(queue) != 0:
+            if maxChecks is not None and self.stats['checks'] >= maxChecks:
+                break
+            a = queue.popleft()
+            queued[a] = False
+            self.stats['checks'] = self.stats['checks'] + 1
+            changed = self.__two_opt(a)
+            if changed is None:
+                changed = self.__or_opt(a)
+            if changed is not None:
+                for c in changed:
+                    if not queued[c]:
+                        queued[c] = True
+                        queue.append(c)
+        return self.tour
+
+    def __reverse(self, first, last):
+        """
+        Reverse the path from city first to city last (following the tour). If the path is longer than half of the
+        tour, the rest of the tour is reversed instead, which gives the same cycle
+        """
+        n = self.n
+        i = self.position[first]
+        j = self.position[last]
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        tour = self.tour
+        position = self.position
+        for step in range(length // 2):
+            a = tour[i]
+            b = tour[j]
+            tour[i] = b
+            position[b] = i
+            tour[j] = a
+            position[a] = j
+            i = i + 1 if i + 1 < n else 0
+            j = j - 1 if j > 0 else n - 1
+
+    def __two_opt(self, a):
+        """
+        Try to replace a tour edge of a and another edge with an edge from a to a near city.
+        Returns the cities whose edges are changed or None
+        """
+        d = self.d
+        for forward in (True, False):
+            b = self.succ(a) if forward else self.pred(a)
+            ab = d(a, b)
+            for c in self.neighbours[a]:
+                ac = d(a, c)
+                if ac >= ab:
+                    break
+                e = self.succ(c) if forward else self.pred(c)
+                if c == b or e == a:
+                    continue
+                gain = ab + d(c, e) - ac - d(b, e)
+                if gain > EPSILON:
+                    # a-b ... c-e becomes a-c ... b-e
+                    if forward:
+                        self.__reverse(b, c)
+                    else:
+                        self.__reverse(c, b)
+                    self.stats['twoOptMoves'] = self.stats['twoOptMoves'] + 1
+                    return (a, b, c, e)
+        return None
+
+    def __or_opt(self, a):
+        """
+        Try to move a segment of 1 to maxSegment cities starting or ending at a between a near city and its
+        successor. Returns the cities whose edges are changed or None
+        """
+        d = self.d
+        n = self.n
+        for length in range(1, self.maxSegment + 1):
+            if length + 3 > n:
+                break
+            for forward in (True, False):
+                # segment s1..s2 in tour order
+                i = self.position[a]
+                if forward:
+                    s1, s2 = a, self.tour[(i + length - 1) % n]
+                else:
+                    s1, s2 = self.tour[(i - length + 1) % n], a
+                p = self.pred(s1)
+                q = self.succ(s2)
+                removeGain = d(p, s1) + d(s2, q) - d(p, q)
+                if removeGain <= EPSILON:
+                    continue
+                start = self.position[s1]
+                for end in (s1, s2):
+                    for c in self.neighbours[end]:
+                        if d(end, c) >= removeGain:
+                            break
+                        if (self.position[c] - start) % n < length:
+                            continue
+                        # insert between c and its successor or predecessor so that end is next to c
+                        for e in (self.succ(c), self.pred(c)):
+                            if (self.position[e] - start) % n < length:
+                                continue
+                            other = s2 if end == s1 else s1
+                            gain = removeGain - (d(c, end) + d(other, e) - d(c, e))
+                            if gain > EPSILON:
+                                self.__move_segment(s1, s2, c, e, end)
+                                self.stats['orOptMoves'] = self.stats['orOptMoves'] + 1
+                                return (p, q, s1, s2, c, e)
+        return None
+
+    def __move_segment(self, s1, s2, c, e, end):
+        """
+        Move segment s1..s2 between neighbouring cities c and e so that end is next to c.
+        The move is made of two or three 2-opt moves, so only reversals of the shorter side of the tour are done
+        """
+        p = self.pred(s1)
+        q = self.succ(s2)
+        # tour is p s1..s2 q..x y..p, segment goes between x and y
+        x, y = (c, e) if e == self.succ(c) else (e, c)
+        other = s2 if end == s1 else s1
+        nextToX = end if x == c else other
+        # p x..q s2..s1 y
+        self.__exchange(p, s1, x, y)
+        if nextToX == s2:
+            # p q..x s2..s1 y
+            self.__exchange(p, x, q, s2)
+        else:
+            # p x..q s1..s2 y, then p q..x s1..s2 y
+            self.__exchange(q, s2, s1, y)
+            self.__exchange(p, x, q, s1)
+
+    def __exchange(self, a, b, c, d):
+        """
+        2-opt move replacing edges a-b and c-d by a-c and b-d, the tour goes a b ... c d in one of its directions
+        """
+        if self.succ(a) == b:
+            self.__reverse(b, c)
+        else:
+            self.__reverse(c, b)
+
+
+def double_bridge(tour, randomGenerator, maxSegment=50):
+    """
+    Double bridge move: cut the tour into A B C D at three random points close to each other and reconnect it as
+    A C B D, a move that 2-opt and Or-opt moves can not undo easily.
+    Returns the new tour and the cities whose edges changed
+    """
+    n = len(tour)
+    length = max(1, min(maxSegment, n // 4))
+    start = randomGenerator.randrange(n)
+    tour = tour[start:] + tour[:start]
+    i = randomGenerator.randint(1, length)
+    j = i + randomGenerator.randint(1, length)
+    k = j + randomGenerator.randint(1, length)
+    newTour = tour[:i] + tour[j:k] + tour[i:j] + tour[k:]
+    return newTour, [tour[0], tour[i - 1], tour[i], tour[j - 1], tour[j], tour[k - 1], tour[k % n], tour[-1]]
+
+
+def heuristic_tour(tsp, construction='greedy', k=8, maxChecks=None, kicks=0, seed=None, progressFunc=None,
+                   stopFunc=None):
+    """
+    Build a tour with 'greedy' or 'nearest' construction and improve it with 2-opt and Or-opt.
+    With kicks > 0, iterated local search: the best tour is changed by a random double bridge move and improved
+    again kicks times, changed tour is kept if it is shorter. progressFunc is called with the tour and its length
+    whenever a shorter tour is found. Kicks stop early when stopFunc returns True.
+    Returns the tour as a list of cities starting from city 0 and its length
+    """
+    if construction not in ('greedy', 'nearest'):
+        raise ValueError("Unknown tour construction %s" % construction)
+    neighbours = nearest_neighbours(tsp, k)
+    tour = greedy_tour(tsp, neighbours) if construction == 'greedy' else nearest_neighbour_tour(tsp, neighbours)
+    improvement = TourImprovement(tsp, tour, neighbours)
+    tour = improvement.improve(maxChecks)
+    length = tour_length(tsp, tour)
+    if progressFunc is not None:
+        progressFunc(list(tour), length)
+    if tsp.cityCount >= 8:
+        randomGenerator = random.Random(seed)
+        for kick in range(kicks):
+            if stopFunc is not None and stopFunc():
+                break
+            newTour, changed = double_bridge(tour, randomGenerator)
+            newTour = TourImprovement(tsp, newTour, neighbours).improve(maxChecks, changed)
+            newLength = tour_length(tsp, newTour)
+            if newLength < length - EPSILON:
+                tour, length = newTour, newLength
+                if progressFunc is not None:
+                    progressFunc(list(tour), length)
+    start = tour.index(0)
+    tour = tour[start:] + tour[:start]
+    return tour, tour_length(tsp, tour)
+
+
+def tour_node(tsp, tour):
+    """
+    Return a search tree node for a tour in the form drawn by TSPGUI, pathCost is the tour length
+    """
+    edges = [(tour[i - 1], tour[i]) for i in range(1, len(tour))]
+    state = TSPState(edges, tour[-1], list(tour[:-1]), tsp)
+    return SearchTreeNode(state, depth=len(edges), pathCost=tour_length(tsp, tour))
+
+
+if __name__ == '__main__':
+    instances = sys.argv[1:] if len(sys.argv) > 1 else ['1000', '5000']
+    for instance in instances:
+        tsp = load_tsplib(instance) if instance.endswith('.tsp') else TSP(int(instance))
+        neighbours = nearest_neighbours(tsp)
+        for construction in ('nearest', 'greedy'):
+            startTime = time.time()
+            if construction == 'nearest':
+                tour = nearest_neighbour_tour(tsp, neighbours)
+            else:
+                tour = greedy_tour(tsp, neighbours)
+            initialLength = tour_length(tsp, tour)
+            improvement = TourImprovement(tsp, tour, neighbours)
+            tour = improvement.improve()
+            print("%d cities, %s tour: %f, improved: %f, %s, %.3f seconds" % (
+                tsp.cityCount, construction, initialLength, tour_length(tsp, tour), improvement.stats,
+                time.time() - startTime))
@@ -27,38 +27,117 @@ Created on Feb 9, 2011
 
 @author: goker
 """
-import itertools
+import os
 import random
+import sys
+from collections import OrderedDict
 
-from aiama.search import State, Operator, SearchProblem
+import numpy as np
+
+from aiama.search import State, Operator, SearchProblem, LocalSearchProblem, CoolingSchedule
+from aiama.search.genetic import GeneticAlgorithm
 
 
 class TSP:
     """
-    Class for representing a euclidean TSP defined by randomly chosen cities in unit square    
-    """
-
-    def __init__(self, cityCount):
-        self.cityCount = cityCount
-        # place each city in a random location
-        self.locations = []
-        randomGenerator = random.Random()
-        for i in range(self.cityCount):
-            self.locations.append((randomGenerator.random(), randomGenerator.random()))
-        # calculate distances between each city
-        self.distances = {}
-        cityCombs = itertools.combinations(range(self.cityCount), 2)
-        for c1, c2 in cityCombs:
-            self.distances[(c1, c2)] = (self.locations[c1][0] - self.locations[c2][0]) ** 2 + (
-                        self.locations[c1][1] - self.locations[c2][1]) ** 2
-            self.distances[(c2, c1)] = self.distances[(c1, c2)]
-        for i in range(self.cityCount):
-            self.distances[(i, i)] = 100
+    Class for representing a euclidean TSP defined by randomly chosen cities in unit square
+    or by city locations read from a TSPLIB file.
+    Distances are kept in a dense NumPy matrix, distances[c1, c2] is the distance between cities c1 and c2
+    """
+
+    def __init__(self, cityCount=None, locations=None, distances=None, name=None):
+        """
+        Place cityCount cities randomly if locations are not given. Distances are euclidean distances between
+        locations if a distance matrix is not given
+        """
+        if locations is None:
+            # place each city in a random location
+            locations = []
+            randomGenerator = random.Random()
+            for i in range(cityCount):
+                locations.append((randomGenerator.random(), randomGenerator.random()))
+        self.coordinates = np.asarray(locations, dtype=np.float64)
+        self.locations = [tuple(l) for l in self.coordinates.tolist()]
+        self.cityCount = len(self.locations)
+        self.name = name
+        self.distances = distance_matrix(self.coordinates) if distances is None else distances
+        # minimum spanning tree costs of sets of cities, least recently used costs are dropped
+        self.mstCache = OrderedDict()
+        self.mstCacheSize = 100000
 
     def __repr__(self):
         return "Cities: %s Distances: %s" % (repr(self.locations), repr(self.distances))
 
 
+def distance_matrix(coordinates, weightType='EXACT', out=None, blockSize=1024):
+    """
+    Return the matrix of distances between every pair of coordinates, computed in blocks of rows.
+    weightType is 'EXACT' (euclidean distance) or one of TSPLIB distance types 'EUC_2D' (euclidean distance
+    rounded to nearest integer), 'CEIL_2D' (rounded up) or 'ATT' (pseudo euclidean).
+    Distances are written to out (e.g. a memory mapped array) if it is given
+    """
+    if weightType not in ('EXACT', 'EUC_2D', 'CEIL_2D', 'ATT'):
+        raise ValueError("Unsupported edge weight type %s" % weightType)
+    n = len(coordinates)
+    distances = np.empty((n, n), dtype=np.float64) if out is None else out
+    for start in range(0, n, blockSize):
+        difference = coordinates[start:start + blockSize, None, :] - coordinates[None, :, :]
+        squared = (difference ** 2).sum(axis=2)
+        if weightType == 'ATT':
+            r = np.sqrt(squared / 10.0)
+            t = np.floor(r + 0.5)
+            block = np.where(t < r, t + 1, t)
+        else:
+            block = np.sqrt(squared)
+            if weightType == 'EUC_2D':
+                block = np.floor(block + 0.5)
+            elif weightType == 'CEIL_2D':
+                block = np.ceil(block)
+        distances[start:start + blockSize] = block
+    return distances
+
+
+def load_tsplib(fileName, cache=True):
+    """
+    Read a TSPLIB .tsp file with node coordinates. Header is read line by line, coordinate section is parsed at
+    once. With cache, the distance matrix is saved next to the file as a .npy file and memory mapped, so it is
+    computed only once for each file
+    """
+    header = {}
+    with open(fileName) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('NODE_COORD_SECTION'):
+                break
+            if ':' in line:
+                key, value = line.split(':', 1)
+                header[key.strip()] = value.strip()
+        else:
+            raise ValueError("No NODE_COORD_SECTION in %s" % fileName)
+        dimension = int(header['DIMENSION'])
+        values = f.read().split()
+    # each line is node number, x, y
+    coordinates = np.array(values[:3 * dimension], dtype=np.float64).reshape(dimension, 3)[:, 1:]
+    weightType = header.get('EDGE_WEIGHT_TYPE', 'EUC_2D')
+
+    if not cache:
+        return TSP(locations=coordinates, distances=distance_matrix(coordinates, weightType),
+                   name=header.get('NAME'))
+    cacheName = os.path.splitext(fileName)[0] + '.' + weightType.lower() + '.npy'
+    if not os.path.exists(cacheName) or os.path.getmtime(cacheName) < os.path.getmtime(fileName):
+        # write to a temporary file so that an interrupted run does not leave a broken cache
+        temporaryName = cacheName + '.tmp'
+        out = np.lib.format.open_memmap(temporaryName, mode='w+', dtype=np.float64, shape=(dimension, dimension))
+        distance_matrix(coordinates, weightType, out)
+        out.flush()
+        del out
+        os.replace(temporaryName, cacheName)
+    distances = np.load(cacheName, mmap_mode='r')
+    if distances.shape != (dimension, dimension):
+        raise ValueError("Cached distance matrix %s does not match %s" % (cacheName, fileName))
+    return TSP(locations=coordinates, distances=distances, name=header.get('NAME'))
+
+
 class TSPState(State):
     def __init__(self, edges, lastCity, visitedCities, tsp):
         State.__init__(self)
@@ -104,36 +183,186 @@ def path_cost(parentState, state):
     # path cost is the distance between last two cities connected
     if len(state.edges) == 0:
         return 0
-    return state.tsp.distances[(state.edges[len(state.edges) - 1][0], state.edges[len(state.edges) - 1][1])]
+    return state.tsp.distances[state.edges[len(state.edges) - 1][0], state.edges[len(state.edges) - 1][1]]
 
 
 def minimum_spanning_tree_cost(state):
-    # construct minimum spanning tree (using Prim's algorithm) for not visited nodes and get its total path cost
-    # find the unvisited cities
-    vertices = list(range(state.tsp.cityCount))
-    [vertices.remove(c) for c in state.visitedCities]
+    """
+    Cost of the minimum spanning tree of unvisited cities and the start and end cities of current path.
+    Cost only depends on this set of cities, costs are kept in an LRU cache of the TSP keyed by a bitmask of
+    the set
+    """
+    tsp = state.tsp
+    mask = (1 << tsp.cityCount) - 1
+    for c in state.visitedCities:
+        mask = mask & ~(1 << c)
     # mst should contain start and end cities of current path
-    vertices.append(state.lastCity)
+    mask = mask | (1 << state.lastCity)
     if len(state.edges) != 0:
-        # add start city
-        vertices.append(state.edges[0][0])
-
-    vnew = [vertices[0]]
-    enew = []
-    while len(vnew) != len(vertices):
-        pedges = []
-        # for every vertice u in vnew, find edges between this u and v (another vertice not in vnew)
-        for u in vnew:
-            for v in vertices:
-                if v not in vnew:
-                    pedges.append((u, v, state.tsp.distances[(u, v)]))
-        pedges.sort(key=lambda i: i[2])
-        vnew.append(pedges[0][1])
-        enew.append(pedges[0])
-    totalCost = 0
-    for u, v, c in enew:
-        totalCost = totalCost + c
-    return totalCost
+        mask = mask | (1 << state.edges[0][0])
+
+    return cached_mst_cost(tsp, mask)
+
+
+def cached_mst_cost(tsp, mask):
+    """
+    Minimum spanning tree cost of the cities in bitmask from the LRU cache of the TSP
+    """
+    cache = tsp.mstCache
+    if mask in cache:
+        cache.move_to_end(mask)
+        return cache[mask]
+    vertices = [c for c in range(tsp.cityCount) if mask >> c & 1]
+    cost = prim_cost(tsp.distances, vertices)
+    cache[mask] = cost
+    if len(cache) > tsp.mstCacheSize:
+        cache.popitem(last=False)
+    return cost
+
+
+def prim_cost(distances, vertices):
+    """
+    Total cost of the minimum spanning tree of vertices with Prim's algorithm in O(V^2).
+    key holds the cheapest edge from the tree to each vertex, it is updated with a vectorized minimum when
+    a vertex is added to the tree
+    """
+    d = distances[np.ix_(vertices, vertices)]
+    inTree = np.zeros(len(vertices), dtype=bool)
+    inTree[0] = True
+    key = np.array(d[0], dtype=np.float64)
+    key[0] = np.inf
+    totalCost = 0.0
+    for i in range(len(vertices) - 1):
+        v = int(np.argmin(key))
+        totalCost = totalCost + key[v]
+        inTree[v] = True
+        np.minimum(key, d[v], out=key)
+        key[inTree] = np.inf
+    return float(totalCost)
+
+
+class TSPBitmaskState(State):
+    """
+    Compact TSP search state: bitmask of visited cities and the last city of the path, path starts at city 0.
+    Partial paths visiting the same cities and ending at the same city are the same state, so graph search keeps
+    only the cheapest of them and there are at most n * 2^n states instead of n! paths.
+    Edges of the path are found from the search tree with bitmask_tour_edges
+    """
+    __slots__ = ('visited', 'lastCity', 'tsp')
+
+    def __init__(self, visited, lastCity, tsp):
+        State.__init__(self)
+        self.visited = visited
+        self.lastCity = lastCity
+        self.tsp = tsp
+
+    def __repr__(self):
+        return "Visited: %s Last city: %d" % (bin(self.visited), self.lastCity)
+
+    def __hash__(self):
+        return hash((self.visited, self.lastCity))
+
+    def __eq__(self, other):
+        return self.visited == other.visited and self.lastCity == other.lastCity
+
+    def is_legal(self):
+        return True
+
+
+def generate_bitmask_states(state):
+    return [TSPBitmaskState(state.visited | (1 << i), i, state.tsp) for i in range(state.tsp.cityCount)
+            if not state.visited >> i & 1]
+
+
+def bitmask_goal_test(state):
+    return state.visited == (1 << state.tsp.cityCount) - 1
+
+
+def bitmask_path_cost(parentState, state):
+    return state.tsp.distances[parentState.lastCity, state.lastCity]
+
+
+def bitmask_mst_cost(state):
+    """
+    Same heuristic as minimum_spanning_tree_cost: MST of unvisited cities, last city and start city 0
+    """
+    mask = ((1 << state.tsp.cityCount) - 1) & ~state.visited | (1 << state.lastCity) | 1
+    return cached_mst_cost(state.tsp, mask)
+
+
+def bitmask_tour_edges(node):
+    """
+    Return edges of the path reaching node
+    """
+    path = SearchProblem.get_solution_path(node)
+    return [(path[i - 1].state.lastCity, path[i].state.lastCity) for i in range(1, len(path))]
+
+
+class TourState(State):
+    """
+    Complete tour visiting every city once for local search, tour is a tuple of cities
+    """
+
+    def __init__(self, tour, tsp):
+        State.__init__(self)
+        self.tour = tour
+        self.tsp = tsp
+
+    def __repr__(self):
+        return repr(self.tour)
+
+    def __hash__(self):
+        return hash(self.tour)
+
+    def __eq__(self, other):
+        return self.tour == other.tour
+
+    def is_legal(self):
+        return True
+
+
+def tour_length(state):
+    tour = state.tour
+    return float(state.tsp.distances[tour, np.roll(tour, -1)].sum())
+
+
+def two_opt_moves(state):
+    # reverse every segment of the tour
+    tour = state.tour
+    return [TourState(tour[:i] + tour[i:j][::-1] + tour[j:], state.tsp)
+            for i in range(1, len(tour) - 1) for j in range(i + 2, len(tour) + 1)]
+
+
+def random_two_opt_move(state, randomGenerator):
+    i, j = sorted(randomGenerator.sample(range(1, len(state.tour) + 1), 2))
+    tour = state.tour
+    return TourState(tour[:i] + tour[i:j][::-1] + tour[j:], state.tsp)
+
+
+class RandomTour:
+    """
+    Random state function for a TSP, generates a random tour starting from city 0
+    """
+
+    def __init__(self, tsp):
+        self.tsp = tsp
+
+    def __call__(self, randomGenerator):
+        cities = list(range(1, self.tsp.cityCount))
+        randomGenerator.shuffle(cities)
+        return TourState(tuple([0] + cities), self.tsp)
+
+
+class TourLength:
+    """
+    Objective function for a genetic algorithm, returns the length of each tour in a 2-D array of tours
+    """
+
+    def __init__(self, tsp):
+        self.distances = tsp.distances
+
+    def __call__(self, tours):
+        return self.distances[tours, np.roll(tours, -1, axis=1)].sum(axis=1)
 
 
 if __name__ == '__main__':
@@ -144,3 +373,33 @@ if __name__ == '__main__':
     # node = problem.UniformCostSearch()
     node = problem.a_star_search()
     print(node)
+
+    # same search over visited city bitmasks, paths to the same state are not searched again
+    initialState = TSPBitmaskState(1, 0, tsp)
+    operators = [Operator("Add new edge", generate_bitmask_states)]
+    problem = SearchProblem(initialState, operators, bitmask_goal_test, bitmask_path_cost, [bitmask_mst_cost])
+    node = problem.a_star_search()
+    print("Bitmask states: %s, Path Cost: %f, %d states generated" % (bitmask_tour_edges(node), node.pathCost,
+                                                                       len(problem.generatedStates)))
+
+    # local search over complete tours
+    problem = LocalSearchProblem(TourState(tuple(range(tsp.cityCount)), tsp), [Operator("2-opt", two_opt_moves)],
+                                 tour_length, randomStateFunc=RandomTour(tsp), randomSuccessorFunc=random_two_opt_move)
+    print('Hill climbing:', problem.hill_climbing())
+    print('First-choice hill climbing:', problem.hill_climbing('first-choice'))
+    print('Simulated annealing:', problem.simulated_annealing(CoolingSchedule.exponential(1.0, 0.999), seed=0))
+    print('Local beam search:', problem.local_beam_search(5, seed=0))
+    print('Random restarts:', problem.random_restart('hill_climbing', 8, processes=4, seed=0))
+
+    # genetic algorithm over tours, objective values are computed in 2 processes
+    ga = GeneticAlgorithm(TourLength(tsp), tsp.cityCount, populationSize=200, seed=0, processes=2)
+    tour, length = ga.run(generations=300)
+    print('Genetic algorithm: %s, length %f' % (tour.tolist(), length))
+    print('Last generation:', ga.history[-1])
+
+    # instances read from TSPLIB files given as arguments, e.g. python TravelingSalesmanProblem.py att48.tsp
+    for fileName in sys.argv[1:]:
+        tsp = load_tsplib(fileName)
+        ga = GeneticAlgorithm(TourLength(tsp), tsp.cityCount, populationSize=500, seed=0)
+        tour, length = ga.run(generations=1000)
+        print('%s: %d cities, genetic algorithm tour length %f' % (tsp.name, tsp.cityCount, length))
@@ -1,3 +1,4 @@
 
 from .search import *
-from .csp import *
\ No newline at end of file
+from .csp import *
+from .local import *
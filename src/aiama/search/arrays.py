@@ -0,0 +1,278 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+AIAMA Chapter 3: Solving Problems By Searching
+Domains and constraints of CSPs over integer variables and values kept in NumPy arrays.
+ArrayDomains keeps the domains of a backtracking search in a boolean array, a removal is a single vectorized call
+that is pushed on the trail of the search and undone when search backtracks. ArrayAllDifferent keeps occupancy
+counts of values for local search and removes the values of a newly assigned variable from every other domain
+with a single vectorized call. n_queens_csp is the N-queens model built from them.
+This module needs NumPy, it is not imported by aiama.search:
+
+from aiama.search.arrays import n_queens_csp
+csp = n_queens_csp(1000)
+node = csp.solve(dynamicOrdering=True)
+"""
+
+import numpy as np
+
+from .csp import CSP, Constraint, Domains
+
+
+class ArrayDomains(Domains):
+    """
+    Domains of variables 0..n-1 with non-negative integer values, kept in a boolean array with a row for each
+    variable and a column for each value. Values are kept in the order they first appear in the domains.
+    Changes are pushed on the trail as arrays of positions in the flattened array, domain sizes are kept in an
+    array so the smallest domain is found with a single argmin. The array takes a byte for each variable and
+    value, the trail takes four bytes for each value removed below the current node
+    """
+
+    def __init__(self, domains, variables=None):
+        Domains.__init__(self, {}, [])
+        self.variables = list(domains.keys()) if variables is None else list(variables)
+        # variables usually share domain lists, values of a list are only read once
+        values = []
+        seen = set()
+        previous = None
+        for v in self.variables:
+            if domains[v] is not previous and domains[v] != previous:
+                previous = domains[v]
+                for d in previous:
+                    if d not in seen:
+                        seen.add(d)
+                        values.append(d)
+        self.values = np.array(values, dtype=np.int64)
+        # column of each value, -1 for values not in any domain
+        self.columns = np.full(int(self.values.max()) + 1 if len(values) != 0 else 0, -1, dtype=np.int64)
+        self.columns[self.values] = np.arange(len(values))
+        variableCount = max(self.variables) + 1 if len(self.variables) != 0 else 0
+        self.allowed = np.zeros((variableCount, len(values)), dtype=bool)
+        previous = None
+        for v in self.variables:
+            if domains[v] is not previous and domains[v] != previous:
+                previous = domains[v]
+                columns = self.columns[np.asarray(previous, dtype=np.int64)]
+            self.allowed[v, columns] = True
+        self.sizes = self.allowed.sum(axis=1)
+        # flattened view of allowed, trail keeps positions in it
+        self.flatAllowed = self.allowed.reshape(-1)
+        self.positionType = np.int32 if self.allowed.size < 2 ** 31 else np.int64
+        # unassigned variables, in search order
+        self.free = np.zeros(variableCount, dtype=bool)
+        self.free[self.variables] = True
+        self.order = np.array(self.variables, dtype=np.int64)
+
+    def __getitem__(self, variable):
+        return self.values[self.allowed[variable]].tolist()
+
+    def __iter__(self):
+        return iter(self.variables)
+
+    def size(self, variable):
+        return int(self.sizes[variable])
+
+    def value(self, variable, index):
+        return int(self.values[np.flatnonzero(self.allowed[variable])[index]])
+
+    def undo_change(self, change):
+        if change[0] is not None:
+            Domains.undo_change(self, change)
+            return
+        # array changes are (None, positions, variable, assigned), variable is None if positions are in several rows
+        positions, variable, assigned = change[1:]
+        self.flatAllowed[positions] = True
+        if variable is None:
+            self.sizes += np.bincount(positions // len(self.values), minlength=len(self.sizes))
+        else:
+            self.sizes[variable] += len(positions)
+            if assigned:
+                self.free[variable] = True
+
+    def __positions(self, variables, columns):
+        return (variables * len(self.values) + columns).astype(self.positionType)
+
+    def assign(self, variable, value):
+        columns = np.flatnonzero(self.allowed[variable])
+        columns = columns[self.values[columns] != value]
+        self.allowed[variable, columns] = False
+        self.sizes[variable] -= len(columns)
+        self.free[variable] = False
+        self.trail.append((None, self.__positions(variable, columns), variable, True))
+
+    def remove(self, variable, values):
+        values = np.asarray(list(values), dtype=np.int64)
+        values = values[(values >= 0) & (values < len(self.columns))]
+        columns = np.unique(self.columns[values])
+        columns = columns[columns >= 0]
+        columns = columns[self.allowed[variable, columns]]
+        if len(columns) == 0:
+            return None
+        self.allowed[variable, columns] = False
+        self.sizes[variable] -= len(columns)
+        self.trail.append((None, self.__positions(variable, columns), variable, False))
+        return int(self.sizes[variable])
+
+    def remove_pairs(self, variables, values):
+        """
+        Remove values[i] from the domain of variables[i] with a single vectorized call, pairs should be different.
+        Returns the array of pruned variables and a wiped out variable or None
+        """
+        variables = np.asarray(variables, dtype=np.int64)
+        values = np.asarray(values, dtype=np.int64)
+        # values that are not in any domain have no column
+        columns = np.full(len(values), -1, dtype=np.int64)
+        inRange = (values >= 0) & (values < len(self.columns))
+        columns[inRange] = self.columns[values[inRange]]
+        removed = columns >= 0
+        removed[removed] = self.allowed[variables[removed], columns[removed]]
+        variables = variables[removed]
+        columns = columns[removed]
+        if len(variables) == 0:
+            return variables, None
+        self.allowed[variables, columns] = False
+        self.sizes -= np.bincount(variables, minlength=len(self.sizes))
+        self.trail.append((None, self.__positions(variables, columns), None, False))
+        wipedOut = variables[self.sizes[variables] == 0]
+        return variables, int(wipedOut[0]) if len(wipedOut) != 0 else None
+
+    def smallest(self):
+        if len(self.order) == 0:
+            return None
+        free = self.free[self.order]
+        best = int(np.argmin(np.where(free, self.sizes[self.order], np.iinfo(self.sizes.dtype).max)))
+        return int(self.order[best]) if free[best] else None
+
+    def to_dict(self, mark=None):
+        allowed = self.allowed
+        if mark is not None:
+            allowed = allowed.copy()
+            flatAllowed = allowed.reshape(-1)
+            for change in self.trail[mark:]:
+                if change[0] is None:
+                    flatAllowed[change[1]] = True
+        return dict([(v, self.values[allowed[v]].tolist()) for v in self.variables])
+
+
+class ArrayAllDifferent(Constraint):
+    """
+    All different constraint on integer variables 0..n-1 with integer values 0..m-1.
+    Variable i is represented by value + offsets[i]
+    """
+
+    # values are only removed because of assigned variables
+    propagatesDomains = False
+
+    def __init__(self, variableCount, valueCount, offsets=None):
+        Constraint.__init__(self, range(variableCount))
+        self.offsets = np.zeros(variableCount, dtype=np.int64) if offsets is None else \
+            np.asarray(offsets, dtype=np.int64)
+        # shift keys so that they can be used as array indices
+        self.offsets = self.offsets - self.offsets.min()
+        self.valueCount = valueCount
+        self.keyCount = valueCount + int(self.offsets.max())
+
+    def __assigned_keys(self, assignments):
+        variables = np.fromiter(assignments.keys(), dtype=np.int64, count=len(assignments))
+        values = np.fromiter(assignments.values(), dtype=np.int64, count=len(assignments))
+        return variables, values + self.offsets[variables]
+
+    def __removals(self, keys, excluded):
+        """
+        Values of the given keys for every variable except the excluded ones, as an array of variables and an
+        array of values. Only values in 0..m-1 are returned
+        """
+        removed = keys[None, :] - self.offsets[:, None]
+        inRange = (removed >= 0) & (removed < self.valueCount)
+        inRange[excluded] = False
+        variables, positions = np.nonzero(inRange)
+        return variables, removed[variables, positions]
+
+    def is_satisfied(self, assignments, domains):
+        variables, keys = self.__assigned_keys(assignments)
+        return len(np.unique(keys)) == len(keys)
+
+    def propagate(self, assignments, domains):
+        variables, keys = self.__assigned_keys(assignments)
+        if len(np.unique(keys)) != len(keys):
+            return None
+        if len(keys) == 0:
+            return {}
+        return self.__removals(keys, variables)
+
+    def propagate_changes(self, assignments, domains, changedVars):
+        # values of the newly assigned variables were taken from domains pruned by the other assignments, so only
+        # their keys can clash and only they remove values. Domains of the other assigned variables only hold
+        # their own values, whose keys are different, so they do not have to be excluded
+        variables = np.array([v for v in changedVars if v in assignments], dtype=np.int64)
+        if len(variables) == 0:
+            return {}
+        keys = np.array([assignments[v] for v in variables.tolist()], dtype=np.int64) + self.offsets[variables]
+        if len(np.unique(keys)) != len(keys):
+            return None
+        return self.__removals(keys, variables)
+
+    def init_conflicts(self, assignments, domains):
+        counts = np.zeros(self.keyCount, dtype=np.int64)
+        positions = np.full(len(self.offsets), -1, dtype=np.int64)
+        # variables having each key, to find the variables whose conflicts change when a variable moves
+        holders = [set() for k in range(self.keyCount)]
+        variables, keys = self.__assigned_keys(assignments)
+        np.add.at(counts, keys, 1)
+        positions[variables] = keys
+        for v, k in zip(variables.tolist(), keys.tolist()):
+            holders[k].add(v)
+        return counts, positions, holders
+
+    def count_conflicts(self, counters, variable, value, assignments):
+        counts, positions, holders = counters
+        key = value + self.offsets[variable]
+        conflicts = counts[key]
+        if positions[variable] == key:
+            conflicts = conflicts - 1
+        return int(conflicts)
+
+    def value_conflicts(self, counters, variable, values, assignments):
+        counts, positions, holders = counters
+        keys = np.asarray(values, dtype=np.int64) + self.offsets[variable]
+        conflicts = counts[keys]
+        conflicts[keys == positions[variable]] -= 1
+        return conflicts.tolist()
+
+    def update_conflicts(self, counters, variable, oldValue, newValue, assignments):
+        counts, positions, holders = counters
+        newKey = int(newValue + self.offsets[variable])
+        counts[newKey] += 1
+        positions[variable] = newKey
+        holders[newKey].add(variable)
+        changed = list(holders[newKey])
+        if oldValue is not None:
+            oldKey = int(oldValue + self.offsets[variable])
+            counts[oldKey] -= 1
+            holders[oldKey].discard(variable)
+            changed.extend(holders[oldKey])
+        changed.append(variable)
+        return changed
+
+
+def n_queens_csp(n):
+    """
+    Return the CSP for n queens, rows are variables and columns are values. Columns, column + row and
+    column - row of queens are all different, domains are kept in ArrayDomains.
+    Rows and columns are ordered from the middle of the board out, with dynamic variable ordering backtracking
+    then finds a solution with few backtracks
+    """
+    rows = np.arange(n)
+    constraints = [ArrayAllDifferent(n, n), ArrayAllDifferent(n, n, rows), ArrayAllDifferent(n, n, -rows)]
+    middleOut = sorted(range(n), key=lambda i: abs(2 * i - (n - 1)))
+    return CSP({tuple(middleOut): middleOut}, constraints, domainsClass=ArrayDomains)
@@ -0,0 +1,360 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+AIAMA Chapter 3: Solving Problems By Searching
+Benchmark instances and solver configurations for CSPs.
+Instances are generated from a seed, so the same seed gives the same instance on every run.
+Results are written as JSON, e.g.
+
+python -m aiama.search.benchmark --instances queens colouring --output results.json
+"""
+
+import argparse
+import functools
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from .csp import CSP, Constraint, AllDifferent, LinearConstraint
+
+
+class ForbiddenPairs(Constraint):
+    """
+    Binary constraint given by the value pairs that two variables can not take together
+    """
+
+    def __init__(self, variables, pairs):
+        Constraint.__init__(self, variables)
+        self.pairs = frozenset(pairs)
+
+    def is_satisfied(self, assignments, domains):
+        x, y = self.variables
+        if x in assignments and y in assignments:
+            return (assignments[x], assignments[y]) not in self.pairs
+        return True
+
+    def propagate(self, assignments, domains):
+        if not self.is_satisfied(assignments, domains):
+            return None
+        x, y = self.variables
+        xDomain = self.get_domain(x, assignments, domains)
+        yDomain = self.get_domain(y, assignments, domains)
+        removeVals = {}
+        # remove values without a supporting value in the other domain
+        if x not in assignments:
+            removeVals[x] = [a for a in xDomain if all([(a, b) in self.pairs for b in yDomain])]
+        if y not in assignments:
+            removeVals[y] = [b for b in yDomain if all([(a, b) in self.pairs for a in xDomain])]
+        return removeVals
+
+
+def _rotate_queen(n, row, column):
+    return column, n - 1 - row
+
+
+def _reflect_queen(n, row, column):
+    return row, n - 1 - column
+
+
+def queens(n=8, seed=0):
+    """
+    N-queens with a variable for the column of the queen on each row and three AllDifferent constraints.
+    Rotating the board by 90 degrees and reflecting it are declared as symmetries, they generate the 8 symmetries
+    of the board. Seed is not used, there is a single instance for each n
+    """
+    rows = tuple(range(n))
+    constraints = [AllDifferent(rows),
+                   AllDifferent(rows, dict([(r, r) for r in rows])),
+                   AllDifferent(rows, dict([(r, -r) for r in rows]))]
+    csp = CSP({rows: tuple(range(n))}, constraints)
+    csp.add_symmetry(functools.partial(_rotate_queen, n))
+    csp.add_symmetry(functools.partial(_reflect_queen, n))
+    return csp
+
+
+def array_queens(n=8, seed=0):
+    """
+    N-queens model of aiama.search.arrays, domains are kept in a boolean array and the three all different
+    constraints remove values with vectorized calls. It has the symmetries of queens and needs NumPy.
+    Seed is not used, there is a single instance for each n
+    """
+    from .arrays import n_queens_csp
+    csp = n_queens_csp(n)
+    csp.add_symmetry(functools.partial(_rotate_queen, n))
+    csp.add_symmetry(functools.partial(_reflect_queen, n))
+    return csp
+
+
+def random_binary(variables=20, values=8, density=0.3, tightness=0.3, seed=0):
+    """
+    Random binary CSP of model B: exactly density * variables * (variables - 1) / 2 randomly chosen
+    variable pairs are constrained, each constraint forbids exactly tightness * values * values value pairs
+    """
+    randomGenerator = random.Random(seed)
+    varList = tuple(range(variables))
+    domain = tuple(range(values))
+    allPairs = [(x, y) for x in varList for y in varList if x < y]
+    allValuePairs = [(a, b) for a in domain for b in domain]
+    constraints = []
+    for scope in randomGenerator.sample(allPairs, int(round(density * len(allPairs)))):
+        forbidden = randomGenerator.sample(allValuePairs, int(round(tightness * len(allValuePairs))))
+        constraints.append(ForbiddenPairs(scope, forbidden))
+    return CSP({varList: domain}, constraints)
+
+
+def cryptarithm(words=('SEND', 'MORE'), result='MONEY', seed=0):
+    """
+    Cryptarithm words[0] + words[1] + ... = result. Every letter is a different digit, first letters are not 0,
+    the sum is a single linear equation. Seed is not used
+    """
+    letters = []
+    for w in list(words) + [result]:
+        for l in w:
+            if l not in letters:
+                letters.append(l)
+    coefficients = dict([(l, 0) for l in letters])
+    for w in words:
+        for i, l in enumerate(reversed(w)):
+            coefficients[l] = coefficients[l] + 10 ** i
+    for i, l in enumerate(reversed(result)):
+        coefficients[l] = coefficients[l] - 10 ** i
+    firstLetters = set([w[0] for w in list(words) + [result]])
+    varsAndDomains = {}
+    for l in letters:
+        varsAndDomains[(l,)] = tuple(range(1 if l in firstLetters else 0, 10))
+    constraints = [AllDifferent(letters), LinearConstraint(letters, [coefficients[l] for l in letters], '==', 0)]
+    return CSP(varsAndDomains, constraints)
+
+
+def colouring(vertices=20, edges=40, colours=4, seed=0):
+    """
+    Colouring a random graph with given numbers of vertices and edges, neighbours have different colours
+    """
+    randomGenerator = random.Random(seed)
+    varList = tuple(range(vertices))
+    allEdges = [(x, y) for x in varList for y in varList if x < y]
+    constraints = [AllDifferent(e) for e in randomGenerator.sample(allEdges, min(edges, len(allEdges)))]
+    return CSP({varList: tuple(range(colours))}, constraints)
+
+
+def sudoku(holes=45, seed=0):
+    """
+    Sudoku made by shuffling the rows, columns and digits of a solved grid and clearing holes random cells.
+    Puzzle always has a solution, it may have more than one
+    """
+    randomGenerator = random.Random(seed)
+
+    def shuffled_lines():
+        bands = [0, 1, 2]
+        randomGenerator.shuffle(bands)
+        lines = []
+        for b in bands:
+            inBand = [0, 1, 2]
+            randomGenerator.shuffle(inBand)
+            lines.extend([3 * b + i for i in inBand])
+        return lines
+
+    rows = shuffled_lines()
+    columns = shuffled_lines()
+    digits = list(range(1, 10))
+    randomGenerator.shuffle(digits)
+    cells = [(r, c) for r in range(9) for c in range(9)]
+    grid = dict([((r, c), digits[(3 * (rows[r] % 3) + rows[r] // 3 + columns[c]) % 9]) for r, c in cells])
+    cleared = set(randomGenerator.sample(cells, holes))
+
+    varsAndDomains = {}
+    for cell in cells:
+        varsAndDomains[(cell,)] = tuple(range(1, 10)) if cell in cleared else (grid[cell],)
+    constraints = []
+    for i in range(9):
+        constraints.append(AllDifferent([(i, c) for c in range(9)]))
+        constraints.append(AllDifferent([(r, i) for r in range(9)]))
+        constraints.append(AllDifferent([(3 * (i // 3) + r, 3 * (i % 3) + c) for r in range(3) for c in range(3)]))
+    return CSP(varsAndDomains, constraints)
+
+
+# instance generators and the parameters used by default
+GENERATORS = {'queens': queens, 'array_queens': array_queens, 'random': random_binary, 'cryptarithm': cryptarithm,
+              'colouring': colouring, 'sudoku': sudoku}
+
+# an instance may be followed by the list of configurations run on it, every configuration is run otherwise
+INSTANCES = [('queens', {'n': 8}),
+             ('queens', {'n': 10}),
+             ('array_queens', {'n': 8}),
+             ('array_queens', {'n': 1000}, ['dynamic']),
+             ('array_queens', {'n': 10000}, ['dynamic']),
+             ('random', {'variables': 20, 'values': 8, 'density': 0.3, 'tightness': 0.3}),
+             ('random', {'variables': 30, 'values': 6, 'density': 0.2, 'tightness': 0.35}),
+             ('cryptarithm', {'words': ('SEND', 'MORE'), 'result': 'MONEY'}),
+             ('cryptarithm', {'words': ('FORTY', 'TEN', 'TEN'), 'result': 'SIXTY'}),
+             ('colouring', {'vertices': 20, 'edges': 40, 'colours': 4}),
+             ('colouring', {'vertices': 40, 'edges': 60, 'colours': 3}),
+             ('sudoku', {'holes': 45}),
+             ('sudoku', {'holes': 55})]
+
+
+def solve_first(csp, seed, **kwargs):
+    for a in csp.solutions(limit=1, **kwargs):
+        return 1
+    return 0
+
+
+def solve_backtracking(csp, seed):
+    return solve_first(csp, seed)
+
+
+def solve_dynamic(csp, seed):
+    return solve_first(csp, seed, dynamicOrdering=True)
+
+
+def solve_backjumping(csp, seed):
+    return solve_first(csp, seed, backjumping=True)
+
+
+def solve_nogoods(csp, seed):
+    return solve_first(csp, seed, backjumping=True, maxNogoods=1000)
+
+
+def count_all(csp, seed):
+    return csp.count_solutions(limit=COUNT_LIMIT)
+
+
+def count_symmetry_broken(csp, seed):
+    csp.detect_symmetries()
+    return csp.count_solutions(limit=COUNT_LIMIT, symmetryBreaking=True)
+
+
+def has_symmetries(csp):
+    """
+    Detect symmetries of csp, return True if it has detected or declared symmetries
+    """
+    return csp.detect_symmetries() or len(csp.symmetries) != 0
+
+
+def solve_local(csp, seed):
+    return 0 if csp.solve_local(maxSteps=10000, restarts=10, seed=seed) is None else 1
+
+
+def solve_decomposed(csp, seed):
+    return 0 if csp.solve_decomposed() is None else 1
+
+
+# at most this many solutions are counted
+COUNT_LIMIT = 1000
+
+# solver configurations, each one returns the number of solutions found for a CSP and keeps its stats in csp.stats
+CONFIGURATIONS = {'backtracking': solve_backtracking,
+                  'dynamic': solve_dynamic,
+                  'backjumping': solve_backjumping,
+                  'nogoods': solve_nogoods,
+                  'count': count_all,
+                  'symmetry': count_symmetry_broken,
+                  'local': solve_local,
+                  'decomposed': solve_decomposed}
+
+
+def run(instance, parameters, configuration, seed=0, repeat=1, memory=True):
+    """
+    Generate an instance with seed and solve it repeat times with a configuration.
+    Time is the fastest of the repeats, peak memory is measured by tracemalloc in a separate run
+    since tracing slows down search. Returns a dictionary of results
+    """
+    solver = CONFIGURATIONS[configuration]
+    times = []
+    for r in range(repeat):
+        csp = GENERATORS[instance](seed=seed, **parameters)
+        start = time.perf_counter()
+        solutions = solver(csp, seed)
+        times.append(time.perf_counter() - start)
+
+    peakMemory = None
+    if memory:
+        csp = GENERATORS[instance](seed=seed, **parameters)
+        tracemalloc.start()
+        solver(csp, seed)
+        peakMemory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'instance': instance, 'parameters': parameters, 'seed': seed, 'configuration': configuration,
+            'solutions': solutions, 'time': min(times), 'peakMemory': peakMemory, 'stats': result_stats(csp.stats)}
+
+
+def result_stats(stats):
+    """
+    Stats of a result with the same keys for every configuration: nodes and backtracks are None for solvers
+    that do not count them, other counts of the solver are in extra
+    """
+    extra = dict(stats)
+    return {'nodes': extra.pop('nodes', None), 'backtracks': extra.pop('backtracks', None), 'extra': extra}
+
+
+def run_all(instances=None, configurations=None, seeds=(0,), repeat=1, memory=True, progress=None):
+    """
+    Run every configuration on every instance with every seed, instances is a list of (generator name,
+    parameters) tuples, a tuple may have the list of configurations run on the instance as a third item.
+    progress is called with each result if given. Returns a list of results
+    """
+    instances = INSTANCES if instances is None else instances
+    configurations = sorted(CONFIGURATIONS.keys()) if configurations is None else configurations
+    results = []
+    for entry in instances:
+        instance, parameters = entry[:2]
+        for seed in seeds:
+            for configuration in configurations:
+                if len(entry) > 2 and configuration not in entry[2]:
+                    continue
+                # symmetry breaking would only repeat count on instances without symmetries
+                if configuration == 'symmetry' and not has_symmetries(GENERATORS[instance](seed=seed, **parameters)):
+                    continue
+                result = run(instance, parameters, configuration, seed, repeat, memory)
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run CSP benchmarks and write results as JSON')
+    parser.add_argument('--instances', nargs='*', choices=sorted(GENERATORS.keys()),
+                        help='instance generators to run, all by default')
+    parser.add_argument('--configurations', nargs='*', choices=sorted(CONFIGURATIONS.keys()),
+                        help='solver configurations to run, all by default')
+    parser.add_argument('--seeds', nargs='*', type=int, default=[0])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak memory')
+    parser.add_argument('--output', help='output file, standard output by default')
+    options = parser.parse_args(args)
+
+    instances = [i for i in INSTANCES if options.instances is None or i[0] in options.instances]
+
+    def progress(result):
+        sys.stderr.write("%s %s %s: %d solutions, %.3f s\n" % (result['instance'], result['parameters'],
+                                                               result['configuration'], result['solutions'],
+                                                               result['time']))
+
+    results = run_all(instances, options.configurations, options.seeds, options.repeat, not options.no_memory,
+                      progress)
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    if options.output is None:
+        json.dump(report, sys.stdout, indent=1)
+        sys.stdout.write("\n")
+    else:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,279 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+AIAMA Chapter 3: Solving Problems By Searching
+Compiled state spaces. The states reachable from the initial state of a small SearchProblem are enumerated once
+and numbered, transitions are kept as a graph in compressed sparse row (CSR) form: successors of state i are
+targets[offsets[i]:offsets[i + 1]], with the cost and operator of each edge in the same positions of costs and
+operatorIds. Searches then only use integer arrays, no states are created and no operators are applied.
+This module needs NumPy, it is not imported by aiama.search:
+
+from aiama.search.compiled import compile_problem
+space = compile_problem(problem)
+node = space.breadth_first_search()
+"""
+
+import heapq
+
+import numpy as np
+
+from .search import SearchTreeNode
+
+
+def compile_problem(problem, maxStates=None):
+    """
+    Enumerate the states reachable from the initial state of problem with breadth first search and return the
+    CompiledStateSpace. Edge costs and heuristic values are computed as SearchProblem does: pathCostFunc of
+    the two states (1 without one) and maximum of heuristicFunctions. Raises ValueError if there are more
+    than maxStates states
+    """
+    states = [problem.initialState]
+    ids = {problem.initialState: 0}
+    offsets = [0]
+    targets = []
+    costs = []
+    operatorIds = []
+    i = 0
+    while i < len(states):
+        state = states[i]
+        for operatorId, operator in enumerate(problem.operators):
+            for nstate in operator.apply_operator(state):
+                if not nstate.is_legal():
+                    continue
+                j = ids.get(nstate)
+                if j is None:
+                    if maxStates is not None and len(states) == maxStates:
+                        raise ValueError("State space has more than %d states" % maxStates)
+                    j = ids[nstate] = len(states)
+                    states.append(nstate)
+                targets.append(j)
+                costs.append(1 if problem.pathCostFunc is None else problem.pathCostFunc(state, nstate))
+                operatorIds.append(operatorId)
+        offsets.append(len(targets))
+        i += 1
+
+    goals = np.array([bool(problem.goalTestFunc(s)) for s in states])
+    heuristics = None
+    if problem.heuristicFunctions is not None:
+        heuristics = np.array([max([h(s) for h in problem.heuristicFunctions]) for s in states], dtype=np.float64)
+    return CompiledStateSpace(np.array(offsets, dtype=np.int64), np.array(targets, dtype=np.int64),
+                              np.array(costs, dtype=np.float64), np.array(operatorIds, dtype=np.int32),
+                              [operator.name for operator in problem.operators], goals, heuristics, states)
+
+
+class CompiledStateSpace:
+    """
+    State space of a search problem as a graph of integer state ids, state 0 is the initial state
+    """
+
+    def __init__(self, offsets, targets, costs, operatorIds, operatorNames, goals, heuristics=None, states=None):
+        self.offsets = offsets
+        self.targets = targets
+        self.costs = costs
+        self.operatorIds = operatorIds
+        self.operatorNames = operatorNames
+        self.goals = goals
+        self.heuristics = heuristics
+        # states of each id, None if the space was loaded without them
+        self.states = states
+        self.ids = None if states is None else dict([(s, i) for i, s in enumerate(states)])
+        self.stateCount = len(offsets) - 1
+        # source of each edge, to walk back along the edges found by searches
+        self.sources = np.repeat(np.arange(self.stateCount), np.diff(offsets))
+        self.unitCosts = bool(np.all(costs == 1))
+        # python lists of the arrays, faster than arrays for searches visiting one state at a time
+        self.__lists = None
+
+    def state_id(self, state):
+        """
+        Return the id of a state, an int is taken as an id
+        """
+        if isinstance(state, (int, np.integer)):
+            return int(state)
+        if self.ids is None:
+            raise ValueError("States were not saved with the compiled state space, use state ids")
+        return self.ids[state]
+
+    def breadth_first_search(self, start=0):
+        """
+        Find the goal state with the fewest edges from start (a state or a state id). Whole BFS layers are
+        expanded at once with array operations. Returns the goal node like SearchProblem, None if no goal is
+        reachable
+        """
+        start = self.state_id(start)
+        parentEdges = self.__breadth_first_layers([start], self.goals)
+        reached = np.nonzero(self.goals & (parentEdges != -1))[0]
+        if len(reached) == 0:
+            return None
+        return self.__node(parentEdges, int(reached[0]))
+
+    def uniform_cost_search(self, start=0):
+        """
+        Dijkstra's algorithm from start to the cheapest goal state, breadth first search if all edges cost 1
+        """
+        if self.unitCosts:
+            return self.breadth_first_search(start)
+        return self.__best_first_search(self.state_id(start), None)
+
+    def a_star_search(self, start=0):
+        """
+        A* from start with the heuristic values computed when the problem was compiled
+        """
+        if self.heuristics is None:
+            raise AttributeError("Heuristic function(s) should be provided to use informed search methods")
+        return self.__best_first_search(self.state_id(start), self.__as_lists()[4])
+
+    def distances(self, start=0):
+        """
+        Return the array of cheapest path costs from start to every state, inf for unreachable states
+        """
+        start = self.state_id(start)
+        if self.unitCosts:
+            return self.__unit_distances(start)
+        return self.__dijkstra(start)
+
+    def all_pairs_distances(self):
+        """
+        Return the stateCount x stateCount matrix of cheapest path costs between all pairs of states, only for
+        small state spaces
+        """
+        return np.stack([self.distances(i) for i in range(self.stateCount)])
+
+    def save(self, fileName, saveStates=False):
+        """
+        Save the compiled state space to a .npz file. States are pickled into it if saveStates is True
+        """
+        arrays = {'offsets': self.offsets, 'targets': self.targets, 'costs': self.costs,
+                  'operatorIds': self.operatorIds, 'operatorNames': np.array(self.operatorNames), 'goals': self.goals}
+        if self.heuristics is not None:
+            arrays['heuristics'] = self.heuristics
+        if saveStates and self.states is not None:
+            states = np.empty(len(self.states), dtype=object)
+            states[:] = self.states
+            arrays['states'] = states
+        np.savez_compressed(fileName, **arrays)
+
+    @staticmethod
+    def load(fileName):
+        """
+        Load a compiled state space saved with save, states are only unpickled if they were saved
+        """
+        with np.load(fileName, allow_pickle=True) as data:
+            return CompiledStateSpace(data['offsets'], data['targets'], data['costs'], data['operatorIds'],
+                                      data['operatorNames'].tolist(), data['goals'],
+                                      data['heuristics'] if 'heuristics' in data else None,
+                                      data['states'].tolist() if 'states' in data else None)
+
+    def __breadth_first_layers(self, sources, stopMask=None):
+        """
+        Breadth first search from sources, stopping after the first layer containing a state of stopMask.
+        Returns the edge each state was first reached by, -2 for sources and -1 for states not reached
+        """
+        parentEdges = np.full(self.stateCount, -1, dtype=np.int64)
+        layer = np.asarray(sources, dtype=np.int64)
+        parentEdges[layer] = -2
+        while len(layer) != 0:
+            if stopMask is not None and stopMask[layer].any():
+                break
+            edges = self.__edges_of(layer)
+            nexts = self.targets[edges]
+            new = parentEdges[nexts] == -1
+            nexts, first = np.unique(nexts[new], return_index=True)
+            parentEdges[nexts] = edges[new][first]
+            layer = nexts
+        return parentEdges
+
+    def __edges_of(self, layer):
+        """
+        Indices of the edges leaving the states of layer, ranges offsets[i]:offsets[i + 1] concatenated
+        """
+        starts = self.offsets[layer]
+        counts = self.offsets[layer + 1] - starts
+        return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+    def __unit_distances(self, start):
+        distances = np.full(self.stateCount, np.inf)
+        layer = np.array([start], dtype=np.int64)
+        distances[start] = 0
+        depth = 0
+        while len(layer) != 0:
+            depth += 1
+            nexts = np.unique(self.targets[self.__edges_of(layer)])
+            layer = nexts[distances[nexts] == np.inf]
+            distances[layer] = depth
+        return distances
+
+    def __as_lists(self):
+        if self.__lists is None:
+            self.__lists = (self.offsets.tolist(), self.targets.tolist(), self.costs.tolist(), self.goals.tolist(),
+                            None if self.heuristics is None else self.heuristics.tolist())
+        return self.__lists
+
+    def __dijkstra(self, start):
+        offsets, targets, costs, goals, heuristics = self.__as_lists()
+        distances = [float('inf')] * self.stateCount
+        distances[start] = 0.0
+        queue = [(0.0, start)]
+        while queue:
+            g, i = heapq.heappop(queue)
+            if g > distances[i]:
+                continue
+            for e in range(offsets[i], offsets[i + 1]):
+                ng = g + costs[e]
+                j = targets[e]
+                if ng < distances[j]:
+                    distances[j] = ng
+                    heapq.heappush(queue, (ng, j))
+        return np.array(distances)
+
+    def __best_first_search(self, start, heuristics):
+        """
+        Dijkstra's algorithm without heuristics, A* with them. States are reopened when reached with a cheaper
+        path so inconsistent heuristics still give optimal paths
+        """
+        offsets, targets, costs, goals, h = self.__as_lists()
+        pathCosts = {start: 0.0}
+        parentEdges = {start: -2}
+        queue = [(0.0 if heuristics is None else heuristics[start], 0.0, start)]
+        while queue:
+            f, g, i = heapq.heappop(queue)
+            if g > pathCosts[i]:
+                continue
+            if goals[i]:
+                return self.__node(parentEdges, i)
+            for e in range(offsets[i], offsets[i + 1]):
+                ng = g + costs[e]
+                j = targets[e]
+                if ng < pathCosts.get(j, float('inf')):
+                    pathCosts[j] = ng
+                    parentEdges[j] = e
+                    heapq.heappush(queue, (ng if heuristics is None else ng + heuristics[j], ng, j))
+        return None
+
+    def __node(self, parentEdges, goal):
+        """
+        Build the search tree nodes of the path from the start to goal, return the goal node
+        """
+        edges = []
+        i = goal
+        while parentEdges[i] != -2:
+            e = int(parentEdges[i])
+            edges.append(e)
+            i = int(self.sources[e])
+        node = SearchTreeNode(self.states[i] if self.states is not None else i)
+        for e in reversed(edges):
+            j = int(self.targets[e])
+            node = SearchTreeNode(self.states[j] if self.states is not None else j, node,
+                                  self.operatorNames[self.operatorIds[e]], node.depth + 1,
+                                  node.pathCost + float(self.costs[e]))
+        return node
@@ -19,8 +19,15 @@ Created on Feb 6, 2011
 """
 
 import copy
+import os
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-from .search import State, SearchProblem, Operator
+from .search import State, SearchProblem, Operator, SearchTreeNode, ZobristTable
+
+# zobrist keys of (variable, value) assignments
+_ZOBRIST = ZobristTable()
 
 
 class CSPState(State):
@@ -50,15 +57,20 @@ class CSPState(State):
         for vg in self.variables:
             for v in vg:
                 self.varList.append(v)
+        # hash of the assignments, computed when the state is first hashed (many states are only made to check
+        # constraints) or updated with one more assignment by assign_value_to_next_variable
+        self.hashValue = None
 
     def __repr__(self):
         return repr(self.assignments)
 
     def __hash__(self):
-        return hash(tuple(self.assignments.values()))
+        if self.hashValue is None:
+            self.hashValue = _ZOBRIST.hash_of(self.assignments.items())
+        return self.hashValue
 
     def __eq__(self, other):
-        return self.assignments == other.assignments
+        return hash(self) == hash(other) and self.assignments == other.assignments
 
     def assign_value_to_next_variable(self):
         # we have assigned value to all variables, there are no new states
@@ -71,15 +83,25 @@ class CSPState(State):
             nstate = CSPState(self.variables, copy.deepcopy(self.domains), nextVar, copy.deepcopy(self.assignments),
                               self.constraints, self.forwardCheckingFunction)
             nstate.assignments[self.nextVariable] = d
+            # domain of an assigned variable only holds its value, as in BacktrackingSearch
+            nstate.domains[self.nextVariable] = [d]
+            nstate.hashValue = _ZOBRIST.update(hash(self), self.nextVariable, None, d)
 
             if self.forwardCheckingFunction is not None:
                 # forward checking
                 # get values to remove from unassigned variables
                 removeVals = self.forwardCheckingFunction(self, d)
-                # remove values from each variable's domain
+                # remove values from each variable's domain, domain lists may be shared so they are replaced
                 for unassignedVar in removeVals.keys():
-                    [nstate.domains[unassignedVar].remove(v) for v in removeVals[unassignedVar] if
-                     v in nstate.domains[unassignedVar]]
+                    nstate.domains[unassignedVar] = [v for v in nstate.domains[unassignedVar] if
+                                                     v not in removeVals[unassignedVar]]
+
+            # propagate global constraints, drop the state if some variable has no values left
+            changedVars = set([self.nextVariable])
+            if self.forwardCheckingFunction is not None:
+                changedVars.update(removeVals.keys())
+            if not propagate_constraints(nstate.assignments, nstate.domains, nstate.constraints, changedVars):
+                continue
 
             nstates.append(nstate)
         return nstates
@@ -104,23 +126,56 @@ class CSP:
     General Definition of a CSP
     """
 
-    def __init__(self, varsAndDomains, constraints, forwardCheckingFunc=None):
+    def __init__(self, varsAndDomains, constraints, forwardCheckingFunc=None, domainsClass=None):
         """
         Initialize CSP
         varsAndDomains is a dictionary of variables tuples and corresponding domain tuples
         constraints is a list of functions checking constraints on CSPState instances
         e.g. varsAndDomains {('A','B'):(0,1,2,3)}
+        domainsClass is the Domains class keeping the domains during backtracking search, Domains by default
         """
         self.varsAndDomains = varsAndDomains
         self.variables = list(varsAndDomains.keys())
         self.domains = {}
+        for varsT in self.variables:
+            # domain lists are never modified in place, variables of a tuple share one list
+            values = list(self.varsAndDomains[varsT])
+            for v in varsT:
+                self.domains[v] = values
+        self.varList = []
         for varsT in self.variables:
             for v in varsT:
-                self.domains[v] = list(self.varsAndDomains[varsT])
+                self.varList.append(v)
         self.constraints = constraints
         self.forwardCheckingFunc = forwardCheckingFunc
+        self.domainsClass = Domains if domainsClass is None else domainsClass
+        # symmetries are functions mapping a (variable, value) pair to another one
+        self.symmetries = []
+        self.interchangeableValues = None
+        self.stats = {}
 
-    def solve(self):
+    def solve(self, backjumping=False, maxNogoods=0, symmetryBreaking=False, dynamicOrdering=False):
+        """
+        Search for a solution with depth first search, returns the node that reached the solution or None.
+        With backjumping, nogood learning (maxNogoods > 0) or dynamicOrdering (the variable with the fewest
+        values left is assigned next) search is done by BacktrackingSearch, its statistics are kept in stats.
+        With symmetryBreaking, symmetry breaking constraints are added for declared symmetries
+        """
+        if symmetryBreaking:
+            csp = self.__symmetry_broken()
+            node = csp.solve(backjumping, maxNogoods, dynamicOrdering=dynamicOrdering)
+            # search of the new CSP replaces its stats
+            self.stats = csp.stats
+            return node
+        if backjumping or maxNogoods > 0 or dynamicOrdering:
+            search = BacktrackingSearch(self, backjumping=backjumping, maxNogoods=maxNogoods,
+                                        dynamicOrdering=dynamicOrdering)
+            self.stats = search.stats
+            for a in search.solutions():
+                state = CSPState(self.variables, self.domains, None, dict(a), self.constraints,
+                                 self.forwardCheckingFunc)
+                return SearchTreeNode(state, depth=len(a), pathCost=len(a))
+            return None
         initialState = CSPState(self.variables, self.domains, self.variables[0][0], {}, self.constraints,
                                 self.forwardCheckingFunc)
         operators = [Operator("Assign Value", self.__assign_value_to_variable)]
@@ -128,6 +183,389 @@ class CSP:
         node = problem.depth_first_search()
         return node
 
+    def solutions(self, limit=None, asTuples=False, backjumping=False, maxNogoods=0, symmetryBreaking=False,
+                  expand=False, dynamicOrdering=False):
+        """
+        Generator yielding solutions one by one as they are found, without keeping them.
+        Each solution is an assignments dictionary, or a tuple of values in variable order if asTuples is True.
+        At most limit solutions are generated.
+        With symmetryBreaking, only one solution from each set of symmetric solutions is searched for, if expand
+        is also True every symmetric solution is generated from it
+        """
+        search = BacktrackingSearch(self.__symmetry_broken() if symmetryBreaking else self, backjumping=backjumping,
+                                    maxNogoods=maxNogoods, dynamicOrdering=dynamicOrdering)
+        self.stats = search.stats
+        count = 0
+        if limit is not None and limit <= 0:
+            return
+        for a in search.solutions():
+            for solution in (self.symmetric_solutions(a) if symmetryBreaking and expand else [a]):
+                if asTuples:
+                    yield tuple([solution[v] for v in self.varList])
+                else:
+                    yield dict(solution)
+                count = count + 1
+                if limit is not None and count >= limit:
+                    return
+
+    def count_solutions(self, limit=None, backjumping=False, maxNogoods=0, symmetryBreaking=False, expand=False,
+                        dynamicOrdering=False):
+        """
+        Return the number of solutions (at most limit), solutions are not copied or stored.
+        With symmetryBreaking, only one solution from each set of symmetric solutions is counted unless expand is
+        True
+        """
+        search = BacktrackingSearch(self.__symmetry_broken() if symmetryBreaking else self, backjumping=backjumping,
+                                    maxNogoods=maxNogoods, dynamicOrdering=dynamicOrdering)
+        self.stats = search.stats
+        count = 0
+        if limit is not None and limit <= 0:
+            return count
+        for a in search.solutions():
+            if symmetryBreaking and expand:
+                count = count + sum([1 for solution in self.symmetric_solutions(a)])
+            else:
+                count = count + 1
+            if limit is not None and count >= limit:
+                return limit
+        return count
+
+    def add_symmetry(self, func):
+        """
+        Declare a symmetry of the CSP. func maps a (variable, value) pair to a (variable, value) pair such that
+        mapping every pair of a solution gives another solution
+        """
+        self.symmetries.append(func)
+
+    def add_variable_symmetry(self, permutation):
+        """
+        Declare that permuting variables with the permutation dictionary maps solutions to solutions
+        """
+        self.add_symmetry(VariableSymmetry(permutation))
+
+    def add_value_symmetry(self, permutation):
+        """
+        Declare that permuting values with the permutation dictionary maps solutions to solutions
+        """
+        self.add_symmetry(ValueSymmetry(permutation))
+
+    def detect_symmetries(self):
+        """
+        Detect common symmetries. Currently finds interchangeable values: if every variable has the same domain
+        and every constraint is an AllDifferent constraint without offsets (e.g. graph colouring), values can be
+        permuted freely. Returns True if a symmetry is found
+        """
+        if self.forwardCheckingFunc is not None or len(self.varList) == 0:
+            return False
+        values = self.domains[self.varList[0]]
+        if any([set(self.domains[v]) != set(values) for v in self.varList]):
+            return False
+        if not all([isinstance(c, AllDifferent) and c.offsets is None for c in self.constraints]):
+            return False
+        self.interchangeableValues = list(values)
+        return True
+
+    def symmetry_breaking_constraints(self, maxGroupSize=1000):
+        """
+        Return constraints that keep only the lexicographically smallest solution (in variable order, values are
+        ordered as in their domains) of each set of symmetric solutions.
+        Lex-leader constraints are built for every element of the group generated by declared symmetries, or only
+        for the declared symmetries if the group is larger than maxGroupSize.
+        Interchangeable values are broken with a value precedence constraint
+        """
+        constraints = []
+        if len(self.symmetries) != 0:
+            generators = self.__symmetry_maps()
+            group = symmetry_group(generators, maxGroupSize)
+            constraints.append(LexLeader(self.varList, self.domains, generators if group is None else group))
+        if self.interchangeableValues is not None:
+            constraints.append(ValuePrecedence(self.varList, self.interchangeableValues))
+        return constraints
+
+    def symmetric_solutions(self, solution):
+        """
+        Return every solution symmetric to solution if it is the lexicographically smallest one of them,
+        an empty list otherwise. Each solution is generated once from solutions found with symmetry breaking
+        """
+        generators = self.__symmetry_maps()
+        if self.interchangeableValues is not None:
+            values = self.interchangeableValues
+            for i in range(len(values) - 1):
+                swap = ValueSymmetry({values[i]: values[i + 1], values[i + 1]: values[i]})
+                generators.append(dict([(p, swap(*p)) for p in self.__pairs()]))
+        start = tuple([solution[v] for v in self.varList])
+        orbit = set([start])
+        pending = [start]
+        while len(pending) != 0:
+            values = pending.pop()
+            for g in generators:
+                image = dict([g[(v, d)] for v, d in zip(self.varList, values)])
+                imageValues = tuple([image[v] for v in self.varList])
+                if imageValues not in orbit:
+                    orbit.add(imageValues)
+                    pending.append(imageValues)
+
+        def lex_key(values):
+            return tuple([self.domains[v].index(d) for v, d in zip(self.varList, values)])
+
+        if lex_key(start) != min([lex_key(values) for values in orbit]):
+            return []
+        return [dict(zip(self.varList, values)) for values in sorted(orbit, key=lex_key)]
+
+    def __pairs(self):
+        return [(v, d) for v in self.varList for d in self.domains[v]]
+
+    def __symmetry_maps(self):
+        """
+        Return declared symmetries as dictionaries over (variable, value) pairs
+        """
+        return [dict([(p, tuple(func(*p))) for p in self.__pairs()]) for func in self.symmetries]
+
+    def __symmetry_broken(self):
+        """
+        Return the same CSP with symmetry breaking constraints
+        """
+        csp = CSP(self.varsAndDomains, list(self.constraints) + self.symmetry_breaking_constraints(),
+                  self.forwardCheckingFunc, self.domainsClass)
+        csp.stats = self.stats
+        return csp
+
+    def constraint_graph(self):
+        """
+        Return a dictionary containing the neighbours of each variable in the constraint graph.
+        Scope of constraint functions and forward checking function is not known, they connect every variable
+        """
+        graph = dict([(v, set()) for v in self.varList])
+        for c in self.constraints:
+            scope = c.variables if isinstance(c, Constraint) else self.varList
+            for v in scope:
+                graph[v].update(scope)
+        if self.forwardCheckingFunc is not None:
+            for v in self.varList:
+                graph[v].update(self.varList)
+        for v in self.varList:
+            graph[v].discard(v)
+        return graph
+
+    def components(self):
+        """
+        Return connected components of the constraint graph as lists of variables
+        """
+        graph = self.constraint_graph()
+        componentOf = {}
+        components = []
+        for v in self.varList:
+            if v in componentOf:
+                continue
+            componentOf[v] = len(components)
+            component = [v]
+            stack = [v]
+            while len(stack) != 0:
+                for n in graph[stack.pop()]:
+                    if n not in componentOf:
+                        componentOf[n] = len(components)
+                        component.append(n)
+                        stack.append(n)
+            components.append(component)
+        # keep variable order in components
+        return [[v for v in self.varList if componentOf[v] == i] for i in range(len(components))]
+
+    def subproblem(self, variables):
+        """
+        Return the CSP over given variables containing the constraints whose scope is in variables
+        """
+        varSet = set(variables)
+        if varSet.issuperset(self.varList):
+            return self
+        varsAndDomains = dict([((v,), tuple(self.domains[v])) for v in self.varList if v in varSet])
+        constraints = [c for c in self.constraints if isinstance(c, Constraint) and varSet.issuperset(c.variables)]
+        return CSP(varsAndDomains, constraints, domainsClass=self.domainsClass)
+
+    def solve_decomposed(self, parallel=False, maxCutset=8, processes=None):
+        """
+        Split the constraint graph into connected components and solve each of them independently.
+        Components with only binary constraints are solved with the tree CSP algorithm if they are trees, or with
+        cutset conditioning if removing at most maxCutset variables leaves a tree. Other components are solved
+        with backtracking search. With parallel, components are solved by a pool of processes.
+        Returns the combined assignments dictionary or None
+        """
+        subproblems = [self.subproblem(c) for c in self.components()]
+        if parallel and len(subproblems) > 1:
+            with ProcessPoolExecutor(processes) as executor:
+                results = list(executor.map(_solve_component, subproblems, [maxCutset] * len(subproblems)))
+        else:
+            results = [_solve_component(csp, maxCutset) for csp in subproblems]
+
+        self.stats = {'components': len(subproblems), 'trees': 0, 'cutsets': 0, 'searches': 0}
+        solution = {}
+        for assignments, method in results:
+            self.stats[method] = self.stats[method] + 1
+            if assignments is None:
+                return None
+            solution.update(assignments)
+        return solution
+
+    def solve_local(self, maxSteps=10000, restarts=10, tabuTenure=0, randomWalk=0.0, seed=None):
+        """
+        Min-conflicts local search. Starts from a complete assignment and repeatedly moves a randomly chosen
+        conflicted variable to the value with the fewest conflicts.
+        A variable can not go back to the value it left for tabuTenure steps (unless that value has no conflicts),
+        with probability randomWalk a random value is chosen instead of the best one.
+        If no solution is found in maxSteps, search restarts from a new assignment.
+        Constraint instances keep incremental conflict counters, constraint functions are checked on the
+        whole state. Returns a node containing the solution state or None
+        """
+        randomGenerator = random.Random(seed)
+        constraints = [c if isinstance(c, Constraint) else FunctionConstraint(c, self.varList)
+                       for c in self.constraints]
+        varConstraints = dict([(v, []) for v in self.varList])
+        for i, c in enumerate(constraints):
+            for v in c.variables:
+                varConstraints[v].append(i)
+        self.stats = {'steps': 0, 'restarts': 0}
+
+        def conflicts_of(variable, value):
+            return sum([constraints[i].count_conflicts(counters[i], variable, value, assignments)
+                        for i in varConstraints[variable]])
+
+        def assign(variable, value):
+            oldValue = assignments.get(variable)
+            assignments[variable] = value
+            changedVars = set([variable])
+            for i in varConstraints[variable]:
+                changedVars.update(constraints[i].update_conflicts(counters[i], variable, oldValue, value,
+                                                                   assignments))
+            return changedVars
+
+        for restart in range(restarts):
+            if restart != 0:
+                self.stats['restarts'] = self.stats['restarts'] + 1
+            assignments = {}
+            counters = [c.init_conflicts(assignments, self.domains) for c in constraints]
+            # build initial assignment greedily, try a few random values for each variable and take the first one
+            # without conflicts (or the best one)
+            for v in self.varList:
+                domain = self.domains[v]
+                best = None
+                for t in range(min(len(domain), 20)):
+                    d = randomGenerator.choice(domain)
+                    c = conflicts_of(v, d)
+                    if best is None or c < best[0]:
+                        best = (c, d)
+                    if c == 0:
+                        break
+                assign(v, best[1])
+
+            # conflicted variables are kept in a list for constant time random choice
+            conflicted = []
+            conflictedIndex = {}
+            for v in self.varList:
+                if conflicts_of(v, assignments[v]) > 0:
+                    conflictedIndex[v] = len(conflicted)
+                    conflicted.append(v)
+
+            tabu = {}
+            for step in range(maxSteps):
+                if len(conflicted) == 0:
+                    state = CSPState(self.variables, self.domains, None, assignments, self.constraints,
+                                     self.forwardCheckingFunc)
+                    return SearchTreeNode(state)
+                self.stats['steps'] = self.stats['steps'] + 1
+
+                v = conflicted[randomGenerator.randrange(len(conflicted))]
+                domain = self.domains[v]
+                if randomWalk > 0 and randomGenerator.random() < randomWalk:
+                    value = randomGenerator.choice(domain)
+                else:
+                    totals = [0] * len(domain)
+                    for i in varConstraints[v]:
+                        counts = constraints[i].value_conflicts(counters[i], v, domain, assignments)
+                        totals = [a + b for a, b in zip(totals, counts)]
+                    allowed = [j for j in range(len(domain))
+                               if totals[j] == 0 or tabu.get((v, domain[j]), -1) < step]
+                    if len(allowed) == 0:
+                        continue
+                    best = min([totals[j] for j in allowed])
+                    value = domain[randomGenerator.choice([j for j in allowed if totals[j] == best])]
+
+                oldValue = assignments[v]
+                if value == oldValue:
+                    continue
+                if tabuTenure > 0:
+                    tabu[(v, oldValue)] = step + tabuTenure
+                for u in assign(v, value):
+                    isConflicted = conflicts_of(u, assignments[u]) > 0
+                    if isConflicted and u not in conflictedIndex:
+                        conflictedIndex[u] = len(conflicted)
+                        conflicted.append(u)
+                    elif not isConflicted and u in conflictedIndex:
+                        # move the last variable to the removed variable's place
+                        last = conflicted.pop()
+                        index = conflictedIndex.pop(u)
+                        if last != u:
+                            conflicted[index] = last
+                            conflictedIndex[last] = index
+
+            if len(conflicted) == 0:
+                state = CSPState(self.variables, self.domains, None, assignments, self.constraints,
+                                 self.forwardCheckingFunc)
+                return SearchTreeNode(state)
+        return None
+
+    def solve_parallel(self, mode='first', processes=None, maxNodes=10000):
+        """
+        Solve CSP with a pool of processes. Top levels of the search tree are split into subproblems by
+        assigning the first few variables, subproblems are searched in parallel. A subproblem that is not finished
+        after expanding maxNodes nodes is split again into its unsearched subtrees.
+        mode is 'first' (returns the first solution found as an assignments dictionary or None),
+        'all' (returns a list of all solutions) or 'count' (returns the number of solutions).
+        Constraint and forward checking functions should be picklable (e.g. defined at module level)
+        """
+        if mode not in ('first', 'all', 'count'):
+            raise ValueError("Unknown mode %s" % mode)
+        if processes is None:
+            processes = os.cpu_count()
+        self.stats = {'nodes': 0, 'backtracks': 0, 'subproblems': 0}
+
+        # assign more variables until there are a few subproblems for each process
+        subproblems = [({}, dict(self.domains))]
+        depth = 0
+        while 0 < len(subproblems) < 4 * processes and depth < len(self.varList):
+            depth = depth + 1
+            splitted = []
+            for assignments, domains in subproblems:
+                search = BacktrackingSearch(self, assignments, domains, maxDepth=depth)
+                for a in search.solutions():
+                    splitted.append((dict(a), search.solution_domains()))
+            subproblems = splitted
+
+        solutions = []
+        count = 0
+        with ProcessPoolExecutor(processes, initializer=_set_worker_csp, initargs=(self,)) as executor:
+            pending = set([executor.submit(_search_subproblem, a, d, mode, maxNodes) for a, d in subproblems])
+            while len(pending) != 0:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, foundCount, stats, frontier = future.result()
+                    self.stats['subproblems'] = self.stats['subproblems'] + 1
+                    self.stats['nodes'] = self.stats['nodes'] + stats['nodes']
+                    self.stats['backtracks'] = self.stats['backtracks'] + stats['backtracks']
+                    count = count + foundCount
+                    solutions.extend(found)
+                    if mode == 'first' and len(solutions) != 0:
+                        for f in pending:
+                            f.cancel()
+                        return solutions[0]
+                    # subproblem is too large, search its unsearched subtrees in parallel
+                    for a, d in frontier:
+                        pending.add(executor.submit(_search_subproblem, a, d, mode, maxNodes))
+
+        if mode == 'first':
+            return None
+        elif mode == 'all':
+            return solutions
+        return count
+
     @staticmethod
     def __assign_value_to_variable(state):
         return state.assign_value_to_next_variable()
@@ -136,3 +574,1242 @@ class CSP:
     def __goal_test(state):
         return state.is_goal_state()
 
+
+# old value of a key that was not in the dictionary, the key is deleted when the change is undone
+_MISSING = object()
+
+
+class Domains:
+    """
+    Domains of the variables during backtracking search. Domains are changed in place and every change is pushed
+    on a trail, search undoes the changes made below a node when it returns to the node instead of copying the
+    domains at every node. Domain lists are replaced by new lists, never modified in place, so a list read from
+    Domains keeps its values. Variables are in search order, ties of smallest are broken by this order
+    """
+
+    def __init__(self, domains, variables=None):
+        """
+        domains is a dictionary of domain lists, it is changed in place
+        """
+        self.domains = domains
+        self.order = list(domains.keys()) if variables is None else list(variables)
+        self.assigned = {}
+        self.trail = []
+
+    def __getitem__(self, variable):
+        return self.domains[variable]
+
+    def __iter__(self):
+        return iter(self.domains)
+
+    def size(self, variable):
+        return len(self.domains[variable])
+
+    def value(self, variable, index):
+        """
+        Return the value at index in the domain of variable
+        """
+        return self.domains[variable][index]
+
+    def mark(self):
+        """
+        Return the position of the trail, undo(mark) restores the domains to this point
+        """
+        return len(self.trail)
+
+    def undo(self, mark):
+        while len(self.trail) > mark:
+            self.undo_change(self.trail.pop())
+
+    def undo_change(self, change):
+        mapping, key, value = change
+        if value is _MISSING:
+            del mapping[key]
+        else:
+            mapping[key] = value
+
+    def change(self, mapping, key, value):
+        """
+        Set mapping[key] to value, the old value is restored when the change is undone.
+        Used for the domains and for dictionaries changed together with them, e.g. reasons of pruning
+        """
+        self.trail.append((mapping, key, mapping.get(key, _MISSING)))
+        mapping[key] = value
+
+    def assign(self, variable, value):
+        """
+        Reduce the domain of variable to value and mark it assigned
+        """
+        self.change(self.assigned, variable, value)
+        self.change(self.domains, variable, [value])
+
+    def remove(self, variable, values):
+        """
+        Remove values from the domain of variable, returns the number of values left or None if no value is removed
+        """
+        domain = self.domains[variable]
+        if len(values) == 1:
+            # a single value is removed with list methods instead of a loop over the domain
+            value = next(iter(values))
+            if value not in domain:
+                return None
+            newDomain = list(domain)
+            newDomain.remove(value)
+        else:
+            values = set(values)
+            newDomain = [d for d in domain if d not in values]
+            if len(newDomain) == len(domain):
+                return None
+        self.change(self.domains, variable, newDomain)
+        return len(newDomain)
+
+    def remove_pairs(self, variables, values):
+        """
+        Remove values[i] from the domain of variables[i] for each i, pairs should be different.
+        Returns the pruned variables (a variable may be repeated) and a variable whose domain is wiped out or None
+        """
+        removeVals = {}
+        for v, d in zip(variables, values):
+            removeVals.setdefault(v, []).append(d)
+        pruned = []
+        for v, vals in removeVals.items():
+            size = self.remove(v, vals)
+            if size is None:
+                continue
+            pruned.append(v)
+            if size == 0:
+                return pruned, v
+        return pruned, None
+
+    def smallest(self):
+        """
+        Return the unassigned variable with the fewest values left, None if every variable is assigned
+        """
+        return min([v for v in self.order if v not in self.assigned], key=self.size, default=None)
+
+    def to_dict(self, mark=None):
+        """
+        Return a dictionary of the domain lists when the trail was at mark, current domains if mark is None
+        """
+        domains = dict(self.domains)
+        if mark is not None:
+            for mapping, key, value in reversed(self.trail[mark:]):
+                if mapping is self.domains:
+                    domains[key] = value
+        return domains
+
+
+class BacktrackingSearch:
+    """
+    Depth first search over assignments of a CSP. Variables are assigned in the order they are given in CSP,
+    or with dynamicOrdering the unassigned variable with the fewest values left is assigned next.
+    A single assignments dictionary and a single Domains instance (of the domainsClass of the CSP) are updated
+    during search, changes of the domains made below a node are undone from the trail when search returns to it.
+    Variables assigned by the assignments given to constructor stay assigned.
+    With backjumping, search jumps back to the deepest variable in the conflict set of a failed variable
+    (conflict-directed backjumping) instead of the previous variable. With maxNogoods > 0, the assignments
+    that caused a failure are recorded as nogoods and assignments containing a nogood are pruned immediately,
+    least recently used nogoods are forgotten when there are more than maxNogoods.
+    """
+
+    def __init__(self, csp, assignments=None, domains=None, maxDepth=None, maxNodes=None, backjumping=False,
+                 maxNogoods=0, dynamicOrdering=False):
+        """
+        maxDepth is the number of variables to assign, solutions yields partial assignments if it is smaller
+        than variable count. Search stops after expanding maxNodes nodes
+        """
+        self.csp = csp
+        self.assignments = dict(assignments) if assignments is not None else {}
+        # variables in the order they are assigned, given assignments first. With dynamicOrdering, the variable
+        # assigned at each depth is moved to its position when it is chosen
+        self.varList = [v for v in csp.varList if v in self.assignments] + \
+                       [v for v in csp.varList if v not in self.assignments]
+        self.varIndex = dict([(v, i) for i, v in enumerate(self.varList)])
+        self.dynamicOrdering = dynamicOrdering
+        self.domains = csp.domainsClass(dict(domains) if domains is not None else dict(csp.domains), self.varList)
+        for v, d in self.assignments.items():
+            self.domains.assign(v, d)
+        self.maxDepth = len(self.varList) if maxDepth is None else maxDepth
+        self.maxNodes = maxNodes
+        self.backjumping = backjumping
+        self.maxNogoods = maxNogoods
+        # conflict sets are needed both for backjumping and for learning nogoods
+        self.trackConflicts = backjumping or maxNogoods > 0
+        # variables that caused pruning of each domain, changed on the trail of domains
+        self.reasons = {} if self.trackConflicts else None
+        # nogoods are frozensets of (variable, value) pairs, indexed by their last pair in variable order
+        self.nogoods = OrderedDict()
+        self.nogoodIndex = {}
+        self.functionConstraints = [c for c in csp.constraints if not isinstance(c, Constraint)]
+        self.watchers = constraint_watchers(csp.constraints)
+        self.pruneWatchers = constraint_watchers(csp.constraints, pruning=True)
+        # state passed to constraint and forward checking functions
+        self.state = CSPState(csp.variables, self.domains, None, self.assignments, csp.constraints,
+                              csp.forwardCheckingFunc)
+        self.stats = {'nodes': 0, 'backtracks': 0, 'jumps': 0, 'nogoodHits': 0}
+        # each frame holds index of the variable, trail mark of the domains before it is assigned, index of the
+        # next value to try in its domain and conflict set of the variable. Undoing the changes to the mark gives
+        # back the domain of the variable, so its values are not kept in the frame
+        self.stack = []
+        self.exhausted = False
+
+    def solutions(self):
+        """
+        Generator yielding the assignments dictionary every time maxDepth variables are assigned.
+        The same dictionary is updated and yielded each time, copy it to keep a solution
+        """
+        start = len([v for v in self.varList if v in self.assignments])
+        if self.__check() is not None:
+            self.exhausted = True
+            return
+        if start >= self.maxDepth:
+            self.exhausted = True
+            yield self.assignments
+            return
+
+        self.stack = [self.__frame(start)]
+        while len(self.stack) != 0:
+            frame = self.stack[-1]
+            index, mark, pos, conflicts = frame
+            variable = self.varList[index]
+            # changes made by the previous value of the variable are undone
+            self.domains.undo(mark)
+            if pos == self.domains.size(variable):
+                # every value is tried, backtrack
+                self.__backtrack()
+                continue
+            if self.maxNodes is not None and self.stats['nodes'] >= self.maxNodes:
+                return
+            frame[2] = pos + 1
+            self.stats['nodes'] = self.stats['nodes'] + 1
+            culprits = self.__assign(variable, self.domains.value(variable, pos))
+            if culprits is not None:
+                if self.trackConflicts:
+                    conflicts.update(culprits)
+                    conflicts.discard(variable)
+                continue
+            if index + 1 == self.maxDepth:
+                yield self.assignments
+                # there are solutions below every previous variable, they can not be jumped over
+                if self.trackConflicts:
+                    conflicts.update(self.varList[:index])
+                continue
+            self.stack.append(self.__frame(index + 1))
+        self.exhausted = True
+
+    def solution_domains(self):
+        """
+        Return a dictionary of the domains after the assignments yielded last by solutions
+        """
+        return self.domains.to_dict()
+
+    def frontier(self):
+        """
+        Return the unsearched part of the search tree as a list of (assignments, domains) subproblems
+        """
+        subproblems = []
+        for index, mark, pos, conflicts in self.stack:
+            variable = self.varList[index]
+            sdomains = self.domains.to_dict(mark)
+            remaining = sdomains[variable][pos:]
+            if len(remaining) == 0:
+                continue
+            assignments = dict([(v, self.assignments[v]) for v in self.varList[:index]])
+            sdomains[variable] = remaining
+            subproblems.append((assignments, sdomains))
+        return subproblems
+
+    def __frame(self, index):
+        if self.dynamicOrdering:
+            # minimum remaining values, variables before index are assigned
+            variable = self.domains.smallest()
+            best = self.varIndex[variable]
+            self.varList[best] = self.varList[index]
+            self.varList[index] = variable
+            self.varIndex[self.varList[best]] = best
+            self.varIndex[variable] = index
+        variable = self.varList[index]
+        conflicts = None
+        if self.trackConflicts:
+            # values removed from the domain of the variable are conflicts of it
+            conflicts = set(self.reasons.get(variable, ()))
+        return [index, self.domains.mark(), 0, conflicts]
+
+    def __backtrack(self):
+        """
+        Pop the variable whose values are all tried. Jumps back to the deepest variable in its conflict set
+        with backjumping, otherwise to the previous variable
+        """
+        index, mark, pos, conflicts = self.stack.pop()
+        self.assignments.pop(self.varList[index], None)
+        self.stats['backtracks'] = self.stats['backtracks'] + 1
+        if not self.trackConflicts:
+            return
+
+        # assignments of the conflicting variables can not be extended to a solution
+        if self.maxNogoods > 0 and 0 < len(conflicts) < index:
+            self.__add_nogood(conflicts)
+
+        if self.backjumping:
+            target = max([self.varIndex[v] for v in conflicts]) if len(conflicts) != 0 else -1
+            jumped = False
+            while len(self.stack) != 0 and self.stack[-1][0] > target:
+                self.assignments.pop(self.varList[self.stack.pop()[0]], None)
+                jumped = True
+            if jumped:
+                self.stats['jumps'] = self.stats['jumps'] + 1
+            if len(self.stack) == 0 or self.stack[-1][0] != target:
+                # conflicting variables are all assigned before search started, there is no solution
+                for frame in self.stack:
+                    self.assignments.pop(self.varList[frame[0]], None)
+                self.stack = []
+                return
+        if len(self.stack) != 0:
+            parent = self.stack[-1]
+            parent[3].update(conflicts)
+            parent[3].discard(self.varList[parent[0]])
+
+    def __add_nogood(self, variables):
+        nogood = frozenset([(v, self.assignments[v]) for v in variables])
+        if nogood in self.nogoods:
+            return
+        last = max(variables, key=lambda v: self.varIndex[v])
+        key = (last, self.assignments[last])
+        self.nogoods[nogood] = key
+        self.nogoodIndex.setdefault(key, set()).add(nogood)
+        if len(self.nogoods) > self.maxNogoods:
+            oldNogood, oldKey = self.nogoods.popitem(last=False)
+            self.nogoodIndex[oldKey].discard(oldNogood)
+            if len(self.nogoodIndex[oldKey]) == 0:
+                del self.nogoodIndex[oldKey]
+
+    def __assign(self, variable, value):
+        """
+        Assign value to variable and propagate, domains are changed on their trail.
+        Returns None if assignment is legal, otherwise the variables causing the failure
+        """
+        # forward checking function is called before variable is assigned
+        self.assignments.pop(variable, None)
+        self.state.nextVariable = variable
+        changedVars = set([variable])
+        if self.csp.forwardCheckingFunc is not None:
+            removeVals = self.csp.forwardCheckingFunc(self.state, value)
+            changedVars.update(removeVals.keys())
+            for unassignedVar, vals in removeVals.items():
+                if len(vals) != 0 and self.domains.remove(unassignedVar, vals) is not None and self.trackConflicts:
+                    self.domains.change(self.reasons, unassignedVar,
+                                        self.reasons.get(unassignedVar, frozenset()) | frozenset([variable]))
+        self.domains.assign(variable, value)
+        self.assignments[variable] = value
+
+        if self.maxNogoods > 0:
+            for nogood in self.nogoodIndex.get((variable, value), ()):
+                if all([v in self.assignments and self.assignments[v] == d for v, d in nogood]):
+                    self.stats['nogoodHits'] = self.stats['nogoodHits'] + 1
+                    self.nogoods.move_to_end(nogood)
+                    return set([v for v, d in nogood])
+
+        return self.__check(changedVars)
+
+    def __check(self, changedVars=None):
+        """
+        Check constraints and propagate starting from the constraints on changedVars (every constraint if None),
+        returns None if assignments are legal or variables causing the failure
+        """
+        for constraint in self.functionConstraints:
+            if not constraint(self.state):
+                # scope of constraint functions is not known, any assigned variable may be the cause
+                return set(self.assignments)
+        return _propagate(self.assignments, self.domains, self.csp.constraints, self.reasons, changedVars,
+                          self.watchers, self.pruneWatchers)
+
+
+def _solve_component(csp, maxCutset):
+    """
+    Solve a connected CSP with the tree CSP algorithm, cutset conditioning or backtracking search.
+    Returns assignments dictionary (or None) and the name of the method used
+    """
+    binary = csp.forwardCheckingFunc is None and \
+        all([isinstance(c, Constraint) and len(set(c.variables)) <= 2 for c in csp.constraints])
+    if binary:
+        graph = csp.constraint_graph()
+        cutset = cycle_cutset(graph)
+        if len(cutset) == 0:
+            return tree_csp_solve(csp.varList, csp.domains, csp.constraints), 'trees'
+        if len(cutset) <= maxCutset:
+            return cutset_conditioning_solve(csp, cutset), 'cutsets'
+    for a in BacktrackingSearch(csp).solutions():
+        return dict(a), 'searches'
+    return None, 'searches'
+
+
+def cycle_cutset(graph):
+    """
+    Find a set of variables whose removal leaves a forest, greedily removes the variable with most neighbours
+    """
+    graph = dict([(v, set(ns)) for v, ns in graph.items()])
+    cutset = []
+
+    def remove(v):
+        for n in graph.pop(v):
+            graph[n].discard(v)
+
+    while True:
+        # variables with at most one neighbour are not on any cycle
+        leaves = [v for v in graph if len(graph[v]) <= 1]
+        while len(leaves) != 0:
+            v = leaves.pop()
+            if v not in graph:
+                continue
+            neighbours = list(graph[v])
+            remove(v)
+            leaves.extend([n for n in neighbours if len(graph[n]) <= 1])
+        if len(graph) == 0:
+            return cutset
+        v = max(graph, key=lambda i: len(graph[i]))
+        cutset.append(v)
+        remove(v)
+
+
+def _consistent(constraints, assignments):
+    for c in constraints:
+        if not c.is_satisfied(assignments, {}):
+            return False
+    return True
+
+
+def tree_csp_solve(variables, domains, constraints):
+    """
+    Solve a CSP whose constraint graph is a forest and whose constraints are binary (or unary) in linear time.
+    Arcs are made consistent from leaves to root and values are assigned from root to leaves.
+    Returns an assignments dictionary or None
+    """
+    domains = dict([(v, list(domains[v])) for v in variables])
+    pairConstraints = {}
+    for c in constraints:
+        scope = tuple(set(c.variables))
+        if len(scope) == 1:
+            v = scope[0]
+            domains[v] = [d for d in domains[v] if c.is_satisfied({v: d}, domains)]
+        else:
+            pairConstraints.setdefault(scope, []).append(c)
+            pairConstraints.setdefault((scope[1], scope[0]), []).append(c)
+    neighbours = dict([(v, []) for v in variables])
+    for u, v in pairConstraints:
+        neighbours[u].append(v)
+
+    # order variables so that every variable comes after its parent
+    order = []
+    parents = {}
+    for root in variables:
+        if root in parents:
+            continue
+        parents[root] = None
+        order.append(root)
+        i = len(order) - 1
+        while i < len(order):
+            for n in neighbours[order[i]]:
+                if n not in parents:
+                    parents[n] = order[i]
+                    order.append(n)
+            i = i + 1
+
+    # remove parent values that have no consistent value in child
+    for v in reversed(order):
+        p = parents[v]
+        if p is None:
+            continue
+        cs = pairConstraints[(p, v)]
+        domains[p] = [a for a in domains[p] if any([_consistent(cs, {p: a, v: b}) for b in domains[v]])]
+        if len(domains[p]) == 0:
+            return None
+
+    assignments = {}
+    for v in order:
+        p = parents[v]
+        if p is None:
+            if len(domains[v]) == 0:
+                return None
+            assignments[v] = domains[v][0]
+            continue
+        cs = pairConstraints[(p, v)]
+        for b in domains[v]:
+            if _consistent(cs, {p: assignments[p], v: b}):
+                assignments[v] = b
+                break
+        else:
+            return None
+    return assignments
+
+
+def cutset_conditioning_solve(csp, cutset):
+    """
+    Solve a binary CSP by trying every consistent assignment of the cutset variables and solving the remaining
+    forest with the tree CSP algorithm. Returns an assignments dictionary or None
+    """
+    cutsetSet = set(cutset)
+    rest = [v for v in csp.varList if v not in cutsetSet]
+    crossing = [c for c in csp.constraints if not cutsetSet.isdisjoint(c.variables) and
+                not cutsetSet.issuperset(c.variables)]
+    restConstraints = [c for c in csp.constraints if cutsetSet.isdisjoint(c.variables)]
+    for a in BacktrackingSearch(csp.subproblem([v for v in csp.varList if v in cutsetSet])).solutions():
+        # remove values of remaining variables that are not consistent with the cutset assignment
+        assignments = dict(a)
+        domains = {}
+        for v in rest:
+            cs = [c for c in crossing if v in c.variables]
+            domains[v] = []
+            for d in csp.domains[v]:
+                assignments[v] = d
+                if _consistent(cs, assignments):
+                    domains[v].append(d)
+            del assignments[v]
+            if len(domains[v]) == 0:
+                break
+        else:
+            solution = tree_csp_solve(rest, domains, restConstraints)
+            if solution is not None:
+                solution.update(assignments)
+                return solution
+    return None
+
+
+# csp searched by the worker processes of CSP.solve_parallel
+_workerCSP = None
+
+
+def _set_worker_csp(csp):
+    global _workerCSP
+    _workerCSP = csp
+
+
+def _search_subproblem(assignments, domains, mode, maxNodes):
+    """
+    Search a subproblem of CSP.solve_parallel, return solutions found, solution count, search statistics and
+    unsearched subproblems if search is stopped after maxNodes nodes
+    """
+    search = BacktrackingSearch(_workerCSP, assignments, domains, maxNodes=maxNodes)
+    solutions = []
+    count = 0
+    for a in search.solutions():
+        count = count + 1
+        if mode != 'count':
+            solutions.append(dict(a))
+        if mode == 'first':
+            return solutions, count, search.stats, []
+    return solutions, count, search.stats, search.frontier()
+
+
+def propagate_constraints(assignments, domains, constraints, changedVars=None):
+    """
+    Prune domains of unassigned variables using the constraints that are Constraint instances
+    (plain constraint functions are skipped) until no constraint can prune any more values.
+    If changedVars is given, propagation starts from the constraints on these variables, otherwise from every
+    constraint. Domains should then already be propagated for the assignments of the other variables.
+    Domains dictionary is updated with new lists, lists in it are never modified in place.
+    Returns False if the domain of an unassigned variable is wiped out, True otherwise
+    """
+    return _propagate(assignments, domains, constraints, changedVars=changedVars) is None
+
+
+def constraint_watchers(constraints, pruning=False):
+    """
+    Return a dictionary containing the Constraint instances on each variable.
+    With pruning, only the constraints that are propagated again when a domain in their scope is pruned
+    """
+    watchers = {}
+    for c in constraints:
+        if isinstance(c, Constraint) and (not pruning or c.propagatesDomains):
+            for v in set(c.variables):
+                watchers.setdefault(v, []).append(c)
+    return watchers
+
+
+def _propagate(assignments, domains, constraints, reasons=None, changedVars=None, watchers=None, pruneWatchers=None):
+    """
+    Propagate constraints, returns None on success and the set of variables that caused the failure otherwise.
+    domains is a Domains instance or a dictionary of domain lists, which is changed through a Domains instance.
+    If reasons dictionary is given, the variables that caused the pruning of each domain are added to it.
+    watchers and pruneWatchers are the dictionaries returned by constraint_watchers, they are built if not given
+    """
+    if not isinstance(domains, Domains):
+        domains = Domains(domains)
+    # only the domains of changed variables can be wiped out if the others are already propagated
+    for v in (domains if changedVars is None else changedVars):
+        if v not in assignments and domains.size(v) == 0:
+            return set(reasons.get(v, ())) if reasons is not None else set()
+
+    def explain(constraint):
+        # assigned variables and the reasons of the pruned domains in the scope of the constraint
+        culprits = set()
+        for u in constraint.variables:
+            if u in assignments:
+                culprits.add(u)
+            else:
+                culprits.update(reasons.get(u, ()))
+        return culprits
+
+    if watchers is None:
+        watchers = constraint_watchers(constraints)
+    if pruneWatchers is None:
+        pruneWatchers = constraint_watchers(constraints, pruning=True)
+    # variables assigned or pruned since each pending constraint was last propagated, None if the constraints
+    # have to be propagated from scratch
+    changes = None
+    if changedVars is None:
+        pending = [c for c in constraints if isinstance(c, Constraint)]
+    else:
+        pending = []
+        changes = {}
+        for v in changedVars:
+            for c in watchers.get(v, ()):
+                if c not in changes:
+                    pending.append(c)
+                    changes[c] = set()
+                changes[c].add(v)
+    pendingSet = set(pending)
+    while len(pending) != 0:
+        constraint = pending.pop()
+        pendingSet.discard(constraint)
+        if changes is None:
+            removeVals = constraint.propagate(assignments, domains)
+        else:
+            removeVals = constraint.propagate_changes(assignments, domains, changes.pop(constraint))
+        if removeVals is None:
+            return explain(constraint) if reasons is not None else set()
+        if isinstance(removeVals, tuple):
+            pruned, wipedOut = domains.remove_pairs(*removeVals)
+        else:
+            pruned = []
+            wipedOut = None
+            for v, vals in removeVals.items():
+                if len(vals) == 0:
+                    continue
+                size = domains.remove(v, vals)
+                if size is None:
+                    continue
+                pruned.append(v)
+                if size == 0:
+                    wipedOut = v
+                    break
+        if reasons is not None and len(pruned) != 0:
+            culprits = frozenset(explain(constraint))
+            for v in set(pruned):
+                domains.change(reasons, v, reasons.get(v, frozenset()) | culprits)
+        if wipedOut is not None:
+            return set(reasons[wipedOut]) if reasons is not None else set()
+        if len(pruneWatchers) == 0:
+            continue
+        # constraints sharing a variable with the pruned ones may prune more values now
+        for v in set(pruned):
+            for c in pruneWatchers.get(v, ()):
+                if c is constraint:
+                    continue
+                if c not in pendingSet:
+                    pending.append(c)
+                    pendingSet.add(c)
+                if changes is not None:
+                    changes.setdefault(c, set()).add(v)
+    return None
+
+
+class Constraint:
+    """
+    Base class for constraints over a known set of variables.
+    Constraint instances can be given in the constraints list of a CSP just like constraint functions,
+    in addition their propagate method is used to prune the domains of unassigned variables.
+    """
+
+    # False if propagate only depends on the assigned variables, the constraint is then not propagated again when
+    # a domain in its scope is pruned
+    propagatesDomains = True
+
+    def __init__(self, variables):
+        self.variables = tuple(variables)
+
+    def __call__(self, state):
+        return self.is_satisfied(state.assignments, state.domains)
+
+    def __repr__(self):
+        return "%s%s" % (self.__class__.__name__, repr(self.variables))
+
+    @staticmethod
+    def get_domain(variable, assignments, domains):
+        """
+        Return the assigned value in a list for assigned variables, domain of the variable otherwise
+        """
+        if variable in assignments:
+            return [assignments[variable]]
+        return domains[variable]
+
+    def is_satisfied(self, assignments, domains):
+        """
+        Return False if the constraint is violated by assignments, True otherwise.
+        Override this function in subclasses
+        """
+        return True
+
+    def propagate(self, assignments, domains):
+        """
+        Return a dictionary of values to remove for each unassigned variable in the scope of the constraint
+        or None if the constraint can not be satisfied. Values to remove can also be given as a tuple of a sequence
+        of variables and a sequence of values, they are removed with Domains.remove_pairs.
+        Override this function in subclasses
+        """
+        return {} if self.is_satisfied(assignments, domains) else None
+
+    def propagate_changes(self, assignments, domains, changedVars):
+        """
+        Same as propagate when domains were already propagated before the variables in changedVars were assigned
+        or pruned. Override this function in subclasses that can propagate only the changes
+        """
+        return self.propagate(assignments, domains)
+
+    def init_conflicts(self, assignments, domains):
+        """
+        Return the counters used for finding conflicts incrementally in local search.
+        Assignments may be partial, variables are assigned one by one with update_conflicts afterwards
+        """
+        return domains
+
+    def count_conflicts(self, counters, variable, value, assignments):
+        """
+        Return the number of violations involving variable if it takes value and others keep their values
+        """
+        assigned = variable in assignments
+        oldValue = assignments.get(variable)
+        assignments[variable] = value
+        conflicts = 0 if self.is_satisfied(assignments, counters) else 1
+        if assigned:
+            assignments[variable] = oldValue
+        else:
+            del assignments[variable]
+        return conflicts
+
+    def value_conflicts(self, counters, variable, values, assignments):
+        """
+        Return a list containing number of conflicts for each value of variable
+        """
+        return [self.count_conflicts(counters, variable, d, assignments) for d in values]
+
+    def update_conflicts(self, counters, variable, oldValue, newValue, assignments):
+        """
+        Update counters after variable is changed from oldValue (None if it was unassigned) to newValue.
+        Returns the variables whose number of conflicts may have changed
+        """
+        return self.variables
+
+
+class FunctionConstraint(Constraint):
+    """
+    Constraint function with a declared scope. Function is called with a CSPState like other constraint functions
+    """
+
+    def __init__(self, func, variables):
+        Constraint.__init__(self, variables)
+        self.func = func
+
+    def __repr__(self):
+        return "%s%s" % (getattr(self.func, '__name__', repr(self.func)), repr(self.variables))
+
+    def is_satisfied(self, assignments, domains):
+        state = CSPState([self.variables], domains, None, assignments, [self.func], None)
+        return self.func(state)
+
+
+class AllDifferent(Constraint):
+    """
+    All variables take different values.
+    If offsets are given, variable v is represented by value + offsets[v] instead of its value,
+    e.g. for N-queens queen columns, columns + row and columns - row are all different.
+    Propagation is either 'matching' (Regin's algorithm, removes every value that does not belong to a
+    maximum matching between variables and values) or 'bounds' (Hall intervals, needs integer values)
+    """
+
+    def __init__(self, variables, offsets=None, propagation='matching'):
+        Constraint.__init__(self, variables)
+        if propagation not in ('matching', 'bounds'):
+            raise ValueError("Unknown propagation type %s" % propagation)
+        self.offsets = offsets
+        self.propagation = propagation
+
+    def key(self, variable, value):
+        """
+        Return the value that has to be different for each variable
+        """
+        if self.offsets is None:
+            return value
+        return value + self.offsets[variable]
+
+    def is_satisfied(self, assignments, domains):
+        seen = set()
+        for v in self.variables:
+            if v in assignments:
+                k = self.key(v, assignments[v])
+                if k in seen:
+                    return False
+                seen.add(k)
+        return True
+
+    def propagate(self, assignments, domains):
+        if not self.is_satisfied(assignments, domains):
+            return None
+        if self.propagation == 'bounds':
+            return self.__propagate_bounds(assignments, domains)
+        return self.__propagate_matching(assignments, domains)
+
+    def init_conflicts(self, assignments, domains):
+        # number of variables and the variables having each key
+        counts = {}
+        buckets = {}
+        for v in self.variables:
+            if v in assignments:
+                k = self.key(v, assignments[v])
+                counts[k] = counts.get(k, 0) + 1
+                buckets.setdefault(k, set()).add(v)
+        return counts, buckets
+
+    def count_conflicts(self, counters, variable, value, assignments):
+        counts, buckets = counters
+        k = self.key(variable, value)
+        conflicts = counts.get(k, 0)
+        if variable in assignments and self.key(variable, assignments[variable]) == k:
+            conflicts = conflicts - 1
+        return conflicts
+
+    def update_conflicts(self, counters, variable, oldValue, newValue, assignments):
+        counts, buckets = counters
+        changedVars = set()
+        if oldValue is not None:
+            k = self.key(variable, oldValue)
+            counts[k] = counts[k] - 1
+            buckets[k].discard(variable)
+            changedVars.update(buckets[k])
+        k = self.key(variable, newValue)
+        counts[k] = counts.get(k, 0) + 1
+        buckets.setdefault(k, set()).add(variable)
+        changedVars.update(buckets[k])
+        return changedVars
+
+    def __propagate_matching(self, assignments, domains):
+        # bipartite graph between variables and keys
+        edges = {}
+        for v in self.variables:
+            edges[v] = {}
+            for d in self.get_domain(v, assignments, domains):
+                edges[v].setdefault(self.key(v, d), []).append(d)
+
+        # find a maximum matching with augmenting paths
+        varMatch = {}
+        keyMatch = {}
+        for v in self.variables:
+            if not self.__augment(v, edges, varMatch, keyMatch):
+                return None
+
+        # orient matching edges from variables to keys, other edges from keys to variables
+        # an edge is in some maximum matching if it is in the matching, if it is on an alternating path that
+        # starts from a free key or if its variable and key are in the same strongly connected component
+        keyToVars = {}
+        for v in self.variables:
+            for k in edges[v]:
+                if varMatch[v] != k:
+                    keyToVars.setdefault(k, []).append(v)
+        graph = {}
+        for v in self.variables:
+            graph[('var', v)] = [('key', varMatch[v])]
+        for k, vs in keyToVars.items():
+            graph[('key', k)] = [('var', v) for v in vs]
+            graph.setdefault(('key', k), [])
+        for k in keyMatch:
+            graph.setdefault(('key', k), [])
+
+        reachable = set()
+        stack = [('key', k) for k in keyToVars if k not in keyMatch]
+        reachable.update(stack)
+        while len(stack) != 0:
+            node = stack.pop()
+            for n in graph[node]:
+                if n not in reachable:
+                    reachable.add(n)
+                    stack.append(n)
+
+        components = strongly_connected_components(graph)
+
+        removeVals = {}
+        for v in self.variables:
+            if v in assignments:
+                continue
+            for k, vals in edges[v].items():
+                if varMatch[v] == k or ('key', k) in reachable or \
+                        components[('key', k)] == components[('var', v)]:
+                    continue
+                removeVals.setdefault(v, []).extend(vals)
+        return removeVals
+
+    @staticmethod
+    def __augment(variable, edges, varMatch, keyMatch):
+        """
+        Find an augmenting path starting from unmatched variable and update matching along it
+        """
+        # iterative depth first search over alternating paths
+        visited = set()
+        parents = {}
+        stack = [variable]
+        while len(stack) != 0:
+            v = stack.pop()
+            for k in edges[v]:
+                if k in visited:
+                    continue
+                visited.add(k)
+                parents[k] = v
+                if k not in keyMatch:
+                    # free key found, flip the matching along the path
+                    while True:
+                        pv = parents[k]
+                        prevk = varMatch.get(pv)
+                        varMatch[pv] = k
+                        keyMatch[k] = pv
+                        if pv == variable:
+                            return True
+                        k = prevk
+                stack.append(keyMatch[k])
+        return False
+
+    def __propagate_bounds(self, assignments, domains):
+        # key bounds of each variable
+        keys = {}
+        for v in self.variables:
+            keys[v] = sorted(set(self.key(v, d) for d in self.get_domain(v, assignments, domains)))
+            if len(keys[v]) == 0:
+                return None
+        lows = {v: keys[v][0] for v in self.variables}
+        highs = {v: keys[v][-1] for v in self.variables}
+
+        changed = True
+        while changed:
+            changed = False
+            byHigh = sorted(self.variables, key=lambda i: highs[i])
+            for a in sorted(set(lows.values())):
+                count = 0
+                for v in byHigh:
+                    if lows[v] < a:
+                        continue
+                    count = count + 1
+                    b = highs[v]
+                    if count > b - a + 1:
+                        return None
+                    if count == b - a + 1:
+                        # [a, b] is a Hall interval, other variables can not take keys in it
+                        for u in self.variables:
+                            if a <= lows[u] and highs[u] <= b:
+                                continue
+                            ks = keys[u]
+                            if a <= lows[u] <= b:
+                                ks = [k for k in ks if k > b]
+                            if a <= highs[u] <= b:
+                                ks = [k for k in ks if k < a]
+                            if len(ks) == 0:
+                                return None
+                            if len(ks) != len(keys[u]):
+                                keys[u] = ks
+                                lows[u] = ks[0]
+                                highs[u] = ks[-1]
+                                changed = True
+                if changed:
+                    break
+
+        removeVals = {}
+        for v in self.variables:
+            if v in assignments:
+                continue
+            vals = [d for d in domains[v] if not lows[v] <= self.key(v, d) <= highs[v]]
+            if len(vals) != 0:
+                removeVals[v] = vals
+        return removeVals
+
+
+class LinearConstraint(Constraint):
+    """
+    Linear equation or inequality sum(coefficients[i] * variables[i]) relation constant
+    where relation is one of '==', '<=', '>='.
+    Propagation removes values outside the bounds implied by the other variables' bounds
+    """
+
+    def __init__(self, variables, coefficients, relation='==', constant=0):
+        Constraint.__init__(self, variables)
+        if relation not in ('==', '<=', '>='):
+            raise ValueError("Unknown relation %s" % relation)
+        if len(coefficients) != len(self.variables):
+            raise ValueError("There should be a coefficient for each variable")
+        self.coefficients = tuple(coefficients)
+        self.coefficientOf = {}
+        for v, c in zip(self.variables, self.coefficients):
+            self.coefficientOf[v] = self.coefficientOf.get(v, 0) + c
+        self.relation = relation
+        self.constant = constant
+
+    def __repr__(self):
+        terms = " + ".join(["%s*%s" % (c, v) for v, c in zip(self.variables, self.coefficients)])
+        return "%s %s %s" % (terms, self.relation, self.constant)
+
+    def __bounds(self, domains):
+        """
+        Return the smallest and largest value of the sum given the domains
+        """
+        low = 0
+        high = 0
+        for v, c in zip(self.variables, self.coefficients):
+            terms = (c * min(domains[v]), c * max(domains[v]))
+            low = low + min(terms)
+            high = high + max(terms)
+        return low, high
+
+    def __is_possible(self, low, high):
+        if self.relation == '==':
+            return low <= self.constant <= high
+        elif self.relation == '<=':
+            return low <= self.constant
+        return high >= self.constant
+
+    def is_satisfied(self, assignments, domains):
+        scopeDomains = {}
+        for v in self.variables:
+            scopeDomains[v] = self.get_domain(v, assignments, domains)
+            if len(scopeDomains[v]) == 0:
+                return False
+        return self.__is_possible(*self.__bounds(scopeDomains))
+
+    def init_conflicts(self, assignments, domains):
+        # sum of assigned terms and number of unassigned variables
+        total = 0
+        unassigned = 0
+        for v, c in zip(self.variables, self.coefficients):
+            if v in assignments:
+                total = total + c * assignments[v]
+            else:
+                unassigned = unassigned + 1
+        return [total, unassigned, domains]
+
+    def count_conflicts(self, counters, variable, value, assignments):
+        total, unassigned, domains = counters
+        if unassigned > 1 or (unassigned == 1 and variable in assignments):
+            return Constraint.count_conflicts(self, domains, variable, value, assignments)
+        c = self.coefficientOf[variable]
+        if variable in assignments:
+            total = total - c * assignments[variable]
+        total = total + c * value
+        return 0 if self.__is_possible(total, total) else 1
+
+    def update_conflicts(self, counters, variable, oldValue, newValue, assignments):
+        c = self.coefficientOf[variable]
+        if oldValue is None:
+            counters[1] = counters[1] - 1
+        else:
+            counters[0] = counters[0] - c * oldValue
+        counters[0] = counters[0] + c * newValue
+        return self.variables
+
+    def propagate(self, assignments, domains):
+        scopeDomains = {}
+        for v in self.variables:
+            scopeDomains[v] = self.get_domain(v, assignments, domains)
+            if len(scopeDomains[v]) == 0:
+                return None
+
+        changed = True
+        while changed:
+            changed = False
+            low, high = self.__bounds(scopeDomains)
+            if not self.__is_possible(low, high):
+                return None
+            for v, c in zip(self.variables, self.coefficients):
+                if v in assignments or c == 0:
+                    continue
+                terms = (c * min(scopeDomains[v]), c * max(scopeDomains[v]))
+                # bounds of the sum without this variable
+                restLow = low - min(terms)
+                restHigh = high - max(terms)
+                vals = [d for d in scopeDomains[v]
+                        if (self.relation != '>=' and restLow + c * d > self.constant) or
+                        (self.relation != '<=' and restHigh + c * d < self.constant)]
+                if len(vals) != 0:
+                    scopeDomains[v] = [d for d in scopeDomains[v] if d not in vals]
+                    if len(scopeDomains[v]) == 0:
+                        return None
+                    changed = True
+                    low, high = self.__bounds(scopeDomains)
+
+        removeVals = {}
+        for v in self.variables:
+            if v not in assignments and len(scopeDomains[v]) != len(domains[v]):
+                removeVals[v] = [d for d in domains[v] if d not in scopeDomains[v]]
+        return removeVals
+
+
+def strongly_connected_components(graph):
+    """
+    Tarjan's algorithm. Graph is a dictionary of nodes and lists of their successors.
+    Returns a dictionary containing component index of each node
+    """
+    index = {}
+    lowlink = {}
+    components = {}
+    onStack = set()
+    stack = []
+    counter = 0
+    componentCount = 0
+    for root in graph:
+        if root in index:
+            continue
+        # iterative depth first search, work holds (node, iterator over successors)
+        index[root] = lowlink[root] = counter
+        counter = counter + 1
+        stack.append(root)
+        onStack.add(root)
+        work = [(root, iter(graph[root]))]
+        while len(work) != 0:
+            node, successors = work[-1]
+            pushed = False
+            for n in successors:
+                if n not in index:
+                    index[n] = lowlink[n] = counter
+                    counter = counter + 1
+                    stack.append(n)
+                    onStack.add(n)
+                    work.append((n, iter(graph[n])))
+                    pushed = True
+                    break
+                elif n in onStack:
+                    lowlink[node] = min(lowlink[node], index[n])
+            if pushed:
+                continue
+            work.pop()
+            if len(work) != 0:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index[node]:
+                while True:
+                    n = stack.pop()
+                    onStack.discard(n)
+                    components[n] = componentCount
+                    if n == node:
+                        break
+                componentCount = componentCount + 1
+    return components
+
+
+class VariableSymmetry:
+    """
+    Symmetry permuting variables, permutation is a dictionary mapping variables to variables
+    """
+
+    def __init__(self, permutation):
+        self.permutation = permutation
+
+    def __call__(self, variable, value):
+        return self.permutation.get(variable, variable), value
+
+
+class ValueSymmetry:
+    """
+    Symmetry permuting values, permutation is a dictionary mapping values to values
+    """
+
+    def __init__(self, permutation):
+        self.permutation = permutation
+
+    def __call__(self, variable, value):
+        return variable, self.permutation.get(value, value)
+
+
+def symmetry_group(generators, maxGroupSize=1000):
+    """
+    Return every element except identity of the group generated by symmetries given as dictionaries over
+    (variable, value) pairs, or None if the group has more than maxGroupSize elements
+    """
+    identity = dict([(p, p) for p in generators[0]]) if len(generators) != 0 else {}
+    pairs = list(identity)
+    seen = set([tuple([identity[p] for p in pairs])])
+    group = [identity]
+    i = 0
+    while i < len(group):
+        for g in generators:
+            # composition, first group[i] then g
+            h = dict([(p, g[group[i][p]]) for p in pairs])
+            key = tuple([h[p] for p in pairs])
+            if key not in seen:
+                seen.add(key)
+                group.append(h)
+                if len(group) > maxGroupSize:
+                    return None
+        i = i + 1
+    return group[1:]
+
+
+class LexLeader(Constraint):
+    """
+    For each symmetry, the assignment should be lexicographically smaller than or equal to its image.
+    Variables are compared in the given order, values are compared by their position in domains.
+    Symmetries are dictionaries mapping (variable, value) pairs to (variable, value) pairs
+    """
+
+    def __init__(self, variables, domains, symmetries):
+        Constraint.__init__(self, variables)
+        self.symmetries = symmetries
+        self.valueIndex = dict([(v, dict([(d, i) for i, d in enumerate(domains[v])])) for v in self.variables])
+
+    def is_satisfied(self, assignments, domains):
+        for g in self.symmetries:
+            image = dict([g[(v, assignments[v])] for v in self.variables if v in assignments])
+            for v in self.variables:
+                # assignment is compared up to the first variable whose value is not known
+                if v not in assignments or v not in image:
+                    break
+                a = self.valueIndex[v][assignments[v]]
+                b = self.valueIndex[v][image[v]]
+                if a < b:
+                    break
+                if a > b:
+                    return False
+        return True
+
+
+class ValuePrecedence(Constraint):
+    """
+    Breaks symmetry of interchangeable values: going through variables in order, the first occurrence of values[i]
+    comes before the first occurrence of values[i + 1]
+    """
+
+    def __init__(self, variables, values):
+        Constraint.__init__(self, variables)
+        self.values = list(values)
+
+    def __used_values(self, assignments):
+        """
+        Return values used by the assigned variables at the start of variables and the first unassigned variable.
+        Returns None if the constraint is violated
+        """
+        used = set()
+        for v in self.variables:
+            if v not in assignments:
+                return used, v
+            value = assignments[v]
+            if value not in used:
+                if len(used) >= len(self.values) or value != self.values[len(used)]:
+                    return None
+                used.add(value)
+        return used, None
+
+    def is_satisfied(self, assignments, domains):
+        return self.__used_values(assignments) is not None
+
+    def propagate(self, assignments, domains):
+        result = self.__used_values(assignments)
+        if result is None:
+            return None
+        used, nextVar = result
+        if nextVar is None or len(used) >= len(self.values):
+            return {}
+        # next variable can take a used value or the first unused one
+        newValue = self.values[len(used)]
+        return {nextVar: [d for d in domains[nextVar] if d not in used and d != newValue]}
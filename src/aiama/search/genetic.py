@@ -0,0 +1,192 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+AIAMA Chapter 4: Informed Search Methods
+Genetic algorithm over permutation or integer vector encodings. The population is a single 2-D NumPy array
+with an individual on each row, selection, crossover and mutation are done for the whole population at once.
+This module needs NumPy, it is not imported by aiama.search:
+
+from aiama.search.genetic import GeneticAlgorithm
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+class GeneticAlgorithm:
+    """
+    Genetic algorithm minimizing an objective function.
+    objectiveFunc is called with a 2-D array of individuals and returns an array with the value of each row
+    """
+
+    def __init__(self, objectiveFunc, length, encoding='permutation', low=0, high=None, populationSize=100,
+                 crossoverRate=0.9, mutationRate=0.2, tournamentSize=3, elitism=1, seed=None, processes=None):
+        """
+        Individuals are vectors of given length. With 'permutation' encoding each individual is a permutation of
+        0..length-1, parents are combined with order crossover and mutated by swapping two genes. With 'integer'
+        encoding genes are integers in [low, high), parents are combined with two point crossover and mutated by
+        setting a random gene to a random value.
+        Parents are chosen by tournament selection, elitism best individuals are copied to the next generation.
+        With processes other than None, objective values are computed in a pool of processes, each process gets
+        a block of rows. objectiveFunc should then be picklable
+        """
+        if encoding not in ('permutation', 'integer'):
+            raise ValueError("Unknown encoding %s" % encoding)
+        if encoding == 'integer' and high is None:
+            raise ValueError("Upper bound of genes should be given for integer encoding")
+        self.objectiveFunc = objectiveFunc
+        self.length = length
+        self.encoding = encoding
+        self.low = low
+        self.high = high
+        self.populationSize = populationSize
+        self.crossoverRate = crossoverRate
+        self.mutationRate = mutationRate
+        self.tournamentSize = tournamentSize
+        self.elitism = elitism
+        self.randomGenerator = np.random.default_rng(seed)
+        self.processes = processes
+        self.executor = None
+        # statistics of each generation
+        self.history = []
+
+    def run(self, generations=100, targetValue=None, population=None, progressFunc=None):
+        """
+        Evolve the population (a random one if not given) for the given number of generations, or until an
+        individual with value at most targetValue is found. progressFunc is called with the statistics of each
+        generation. Returns the best individual and its value
+        """
+        self.history = []
+        if population is None:
+            population = self.random_population()
+        try:
+            if self.processes is not None:
+                self.executor = ProcessPoolExecutor(self.processes)
+            values = self.evaluate(population)
+            for generation in range(generations + 1):
+                self.__record(generation, population, values, progressFunc)
+                if generation == generations or (targetValue is not None and values.min() <= targetValue):
+                    break
+                population = self.next_generation(population, values)
+                values = self.evaluate(population)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+        self.population = population
+        self.values = values
+        best = np.argmin(values)
+        return population[best].copy(), values[best]
+
+    def random_population(self):
+        if self.encoding == 'permutation':
+            return np.argsort(self.randomGenerator.random((self.populationSize, self.length)), axis=1)
+        return self.randomGenerator.integers(self.low, self.high, (self.populationSize, self.length))
+
+    def evaluate(self, population):
+        """
+        Return objective values of individuals
+        """
+        if self.executor is None:
+            return np.asarray(self.objectiveFunc(population))
+        blocks = np.array_split(population, self.processes)
+        return np.concatenate([np.asarray(v) for v in self.executor.map(self.objectiveFunc, blocks)])
+
+    def next_generation(self, population, values):
+        size = len(population)
+        elite = population[np.argsort(values)[:self.elitism]]
+        childCount = size - len(elite)
+        pairCount = (childCount + 1) // 2
+        first = population[self.select(values, pairCount)]
+        second = population[self.select(values, pairCount)]
+
+        # pairs that are not crossed over are copied
+        crossed = self.randomGenerator.random(pairCount) < self.crossoverRate
+        children = np.concatenate([first, second])
+        if crossed.any():
+            a, b = first[crossed], second[crossed]
+            crossover = self.order_crossover if self.encoding == 'permutation' else self.two_point_crossover
+            children[:pairCount][crossed] = crossover(a, b)
+            children[pairCount:][crossed] = crossover(b, a)
+        children = children[:childCount]
+        self.mutate(children)
+        return np.concatenate([elite, children])
+
+    def select(self, values, count):
+        """
+        Tournament selection, returns indices of count individuals each of which is the best of
+        tournamentSize random individuals
+        """
+        candidates = self.randomGenerator.integers(0, len(values), (count, self.tournamentSize))
+        return candidates[np.arange(count), np.argmin(values[candidates], axis=1)]
+
+    def __cut_points(self, count):
+        """
+        Return a mask of the genes between two random cut points for count individuals and the second points
+        """
+        points = np.sort(self.randomGenerator.integers(0, self.length + 1, (count, 2)), axis=1)
+        positions = np.arange(self.length)
+        return (positions >= points[:, :1]) & (positions < points[:, 1:]), points[:, 1]
+
+    def two_point_crossover(self, first, second):
+        """
+        Child takes the genes between two random cut points from the first parent, others from the second
+        """
+        segment, end = self.__cut_points(len(first))
+        return np.where(segment, first, second)
+
+    def order_crossover(self, first, second):
+        """
+        Order crossover of permutations: child takes the genes between two random cut points from the first
+        parent, other positions are filled starting after the second cut point with the remaining genes in the
+        order they appear in the second parent (starting after the second cut point)
+        """
+        count, n = first.shape
+        segment, end = self.__cut_points(count)
+        rows = np.arange(count)[:, None]
+        # genes taken from the first parent
+        taken = np.zeros((count, n), dtype=bool)
+        taken[rows, first] = segment
+        # positions and second parent's genes rotated to start after the second cut point
+        rotated = (end[:, None] + np.arange(n)) % n
+        secondRotated = second[rows, rotated]
+        freeGenes = ~taken[rows, secondRotated]
+        freePositions = ~segment[rows, rotated]
+        # every row has the same number of free positions and free genes, flattened masks keep row order
+        children = first.copy()
+        positionRows = np.broadcast_to(rows, (count, n))
+        children[positionRows[freePositions], rotated[freePositions]] = secondRotated[freeGenes]
+        return children
+
+    def mutate(self, population):
+        """
+        Mutate each individual with probability mutationRate in place
+        """
+        mutated = np.nonzero(self.randomGenerator.random(len(population)) < self.mutationRate)[0]
+        if len(mutated) == 0:
+            return
+        if self.encoding == 'permutation':
+            i = self.randomGenerator.integers(0, self.length, len(mutated))
+            j = self.randomGenerator.integers(0, self.length, len(mutated))
+            population[mutated, i], population[mutated, j] = population[mutated, j], population[mutated, i]
+        else:
+            i = self.randomGenerator.integers(0, self.length, len(mutated))
+            population[mutated, i] = self.randomGenerator.integers(self.low, self.high, len(mutated))
+
+    def __record(self, generation, population, values, progressFunc):
+        stats = {'generation': generation, 'best': float(values.min()), 'mean': float(values.mean()),
+                 'std': float(values.std()), 'distinct': len(np.unique(population, axis=0))}
+        self.history.append(stats)
+        if progressFunc is not None:
+            progressFunc(stats)
@@ -0,0 +1,360 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+AIAMA Chapter 4: Informed Search Methods
+Local search for optimization problems: hill climbing, simulated annealing, local beam search
+and random restarts. States and operators are the same as in search problems, an objective function
+gives the value of each state which is minimized.
+"""
+
+import copy
+import functools
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .search import SearchTreeNode
+
+__all__ = ['LocalSearchProblem', 'CoolingSchedule']
+
+
+class LocalSearchProblem:
+    """
+    Class defining an optimization problem with its initial state, operators and objective function.
+    Only the current state(s) are kept in memory, paths to states are not
+    """
+
+    def __init__(self, initialState, operators, objectiveFunc, goalTestFunc=None, randomStateFunc=None,
+                 randomSuccessorFunc=None, progressFunc=None):
+        """
+        Operators generate neighbour states of a state as in search problems, objectiveFunc returns the value of
+        a state to be minimized (negate it to maximize). Search stops early if goalTestFunc is given and returns
+        True for a state.
+        randomStateFunc returns a random state using the random generator passed to it, it is needed for
+        random restarts and local beam search.
+        randomSuccessorFunc returns a random neighbour of a state using the random generator passed to it,
+        if not given a random one is chosen from all neighbours. It is used by first-choice hill climbing and
+        simulated annealing, so that all neighbours are not generated for large neighbourhoods.
+        progressFunc is called with elapsed seconds, step, value and state whenever a better state is found
+        """
+        self.initialState = initialState
+        self.operators = operators
+        self.objectiveFunc = objectiveFunc
+        self.goalTestFunc = goalTestFunc
+        self.randomStateFunc = randomStateFunc
+        self.randomSuccessorFunc = randomSuccessorFunc
+        self.progressFunc = progressFunc
+        self.stats = {}
+        # (elapsed seconds, step, value) of each best so far state
+        self.history = []
+
+    def hill_climbing(self, variant='steepest', maxSteps=10000, maxSideways=0, maxTries=100, seed=None,
+                      initialState=None):
+        """
+        Hill climbing from initialState (or the initial state of the problem).
+        variant is 'steepest' (move to the best neighbour), 'first-choice' (move to the first randomly generated
+        neighbour better than the current state, at most maxTries neighbours are tried) or 'stochastic' (move to
+        a random neighbour among the better ones). At most maxSideways consecutive moves to neighbours with the
+        same value are allowed to get off shoulders.
+        Returns a node containing the best state found, its pathCost is the value of the state
+        """
+        if variant not in ('steepest', 'first-choice', 'stochastic'):
+            raise ValueError("Unknown hill climbing variant %s" % variant)
+        randomGenerator = random.Random(seed)
+        state = self.initialState if initialState is None else initialState
+        self.__reset()
+        value = self.__start(state)
+        sideways = 0
+        step = 0
+        while step < maxSteps and not self.__is_goal(state):
+            if variant == 'first-choice':
+                candidates = []
+                for t in range(maxTries):
+                    n = self.__random_successor(state, randomGenerator)
+                    if n is None:
+                        break
+                    v = self.__value(n)
+                    if v < value:
+                        candidates = [(v, n)]
+                        break
+                    if v == value and len(candidates) == 0:
+                        candidates = [(v, n)]
+            else:
+                successors = [(self.__value(n), n) for n in self.__successors(state)]
+                if len(successors) == 0:
+                    break
+                best = min([v for v, n in successors])
+                if variant == 'steepest' or best == value:
+                    candidates = [(v, n) for v, n in successors if v == best]
+                else:
+                    candidates = [(v, n) for v, n in successors if v < value]
+
+            if len(candidates) == 0:
+                break
+            nextValue, nextState = randomGenerator.choice(candidates)
+            if nextValue > value:
+                break
+            if nextValue == value:
+                sideways = sideways + 1
+                if sideways > maxSideways:
+                    break
+            else:
+                sideways = 0
+            step = step + 1
+            state, value = nextState, nextValue
+            self.__update(step, state, value)
+        return self.__result(step)
+
+    def simulated_annealing(self, schedule=None, maxSteps=100000, seed=None, initialState=None):
+        """
+        Simulated annealing from initialState (or the initial state of the problem).
+        At each step a random neighbour is chosen, it is accepted if it is better than the current state or
+        with probability e^(-delta / T) otherwise where T = schedule(step). Search stops when temperature is 0
+        or after maxSteps steps. Returns a node containing the best state found, its pathCost is its value
+        """
+        schedule = CoolingSchedule.exponential() if schedule is None else schedule
+        randomGenerator = random.Random(seed)
+        state = self.initialState if initialState is None else initialState
+        self.__reset()
+        value = self.__start(state)
+        step = 0
+        while step < maxSteps and not self.__is_goal(state):
+            temperature = schedule(step)
+            if temperature <= 0:
+                break
+            step = step + 1
+            nextState = self.__random_successor(state, randomGenerator)
+            if nextState is None:
+                break
+            nextValue = self.__value(nextState)
+            delta = nextValue - value
+            if delta <= 0 or randomGenerator.random() < math.exp(-delta / temperature):
+                state, value = nextState, nextValue
+                self.__update(step, state, value)
+        return self.__result(step)
+
+    def local_beam_search(self, k=10, maxSteps=1000, stochastic=False, seed=None):
+        """
+        Local beam search with k states starting from random states. At each step the k best neighbours of all
+        states are kept, with stochastic, k neighbours are chosen randomly with probability decreasing with their
+        value. Stops when the best state does not get better. Returns a node containing the best state found
+        """
+        if self.randomStateFunc is None:
+            raise AttributeError("Random state function should be provided to use local beam search")
+        randomGenerator = random.Random(seed)
+        self.__reset()
+        states = [self.randomStateFunc(randomGenerator) for i in range(k)]
+        beam = [(self.__value(s), s) for s in states]
+        beam.sort(key=lambda i: i[0])
+        self.__start(beam[0][1], beam[0][0])
+        step = 0
+        while step < maxSteps and not any([self.__is_goal(s) for v, s in beam]):
+            step = step + 1
+            successors = {}
+            for v, s in beam:
+                for n in self.__successors(s):
+                    if n not in successors:
+                        successors[n] = self.__value(n)
+            if len(successors) == 0:
+                break
+            pool = [(v, n) for n, v in successors.items()]
+            if stochastic:
+                lowest = min([v for v, n in pool])
+                weights = [1.0 / (1.0 + v - lowest) for v, n in pool]
+                beam = [pool[i] for i in _weighted_sample(weights, k, randomGenerator)]
+            else:
+                pool.sort(key=lambda i: i[0])
+                beam = pool[:k]
+            beam.sort(key=lambda i: i[0])
+            if beam[0][0] >= self.bestValue:
+                break
+            self.__update(step, beam[0][1], beam[0][0])
+        # a goal state is returned even if another state in the beam has a better value
+        for v, s in beam:
+            if self.__is_goal(s):
+                self.bestState, self.bestValue = s, v
+        return self.__result(step)
+
+    def random_restart(self, method='hill_climbing', restarts=10, processes=None, seed=None, **kwargs):
+        """
+        Run hill_climbing or simulated_annealing (with given keyword arguments) from restarts random initial
+        states and return the node containing the best state. Stops early if a goal state is found.
+        progressFunc is only called when a restart finds a state better than the previous restarts.
+        With processes other than None, restarts run in parallel in a pool of processes, objective and operator
+        functions should then be picklable (defined at module level)
+        """
+        if self.randomStateFunc is None:
+            raise AttributeError("Random state function should be provided to use random restarts")
+        if method not in ('hill_climbing', 'simulated_annealing'):
+            raise ValueError("Unknown local search method %s" % method)
+        seedGenerator = random.Random(seed)
+        seeds = [seedGenerator.randrange(2 ** 32) for r in range(restarts)]
+        startTime = time.perf_counter()
+        stats = {'restarts': 0, 'steps': 0, 'evaluations': 0}
+        history = []
+        best = None
+
+        def add_result(node, restartStats):
+            stats['restarts'] = stats['restarts'] + 1
+            stats['steps'] = stats['steps'] + restartStats['steps']
+            stats['evaluations'] = stats['evaluations'] + restartStats['evaluations']
+            if best is None or node.pathCost < best.pathCost:
+                elapsed = time.perf_counter() - startTime
+                history.append((elapsed, stats['steps'], node.pathCost))
+                if self.progressFunc is not None:
+                    self.progressFunc(elapsed, stats['steps'], node.pathCost, node.state)
+                return node
+            return best
+
+        # restarts do not report their own improvements, only the best state over all restarts is reported.
+        # Progress function may not be picklable either, restarts in processes could not call it
+        problem = copy.copy(self)
+        problem.progressFunc = None
+        if processes is None:
+            for s in seeds:
+                node, restartStats = _restart(problem, method, s, kwargs)
+                best = add_result(node, restartStats)
+                if self.__is_goal(best.state):
+                    break
+        else:
+            with ProcessPoolExecutor(processes) as executor:
+                futures = [executor.submit(_restart, problem, method, s, kwargs) for s in seeds]
+                for future in as_completed(futures):
+                    node, restartStats = future.result()
+                    best = add_result(node, restartStats)
+                    if self.__is_goal(best.state):
+                        for f in futures:
+                            f.cancel()
+                        break
+        self.stats = stats
+        self.history = history
+        self.bestState, self.bestValue = best.state, best.pathCost
+        return best
+
+    def __successors(self, state):
+        successors = []
+        for operator in self.operators:
+            successors.extend([n for n in operator.apply_operator(state) if n.is_legal()])
+        return successors
+
+    def __random_successor(self, state, randomGenerator):
+        if self.randomSuccessorFunc is not None:
+            return self.randomSuccessorFunc(state, randomGenerator)
+        successors = self.__successors(state)
+        if len(successors) == 0:
+            return None
+        return randomGenerator.choice(successors)
+
+    def __value(self, state):
+        self.stats['evaluations'] = self.stats['evaluations'] + 1
+        return self.objectiveFunc(state)
+
+    def __is_goal(self, state):
+        return self.goalTestFunc is not None and self.goalTestFunc(state)
+
+    def __reset(self):
+        """
+        Reset statistics and best state before a search
+        """
+        self.stats = {'steps': 0, 'evaluations': 0}
+        self.history = []
+        self.startTime = time.perf_counter()
+        self.bestState = None
+        self.bestValue = None
+
+    def __start(self, state, value=None):
+        """
+        Start search from state, returns its value
+        """
+        if value is None:
+            value = self.__value(state)
+        self.__update(0, state, value)
+        return value
+
+    def __update(self, step, state, value):
+        """
+        Keep state if it is the best state so far
+        """
+        if self.bestValue is not None and value >= self.bestValue:
+            return
+        self.bestState = state
+        self.bestValue = value
+        elapsed = time.perf_counter() - self.startTime
+        self.history.append((elapsed, step, value))
+        if self.progressFunc is not None:
+            self.progressFunc(elapsed, step, value, state)
+
+    def __result(self, step):
+        self.stats['steps'] = step
+        return SearchTreeNode(self.bestState, depth=step, pathCost=self.bestValue)
+
+
+class CoolingSchedule:
+    """
+    Class containing static functions that return temperature schedules for simulated annealing.
+    A schedule maps step number to temperature. Schedules are partials of module level functions, so they can be
+    pickled and given to random restarts run in worker processes
+    """
+
+    @staticmethod
+    def exponential(initialTemperature=100.0, alpha=0.995, minTemperature=1e-4):
+        """
+        T = initialTemperature * alpha ^ step, 0 after it drops below minTemperature
+        """
+        return functools.partial(_exponential_temperature, initialTemperature, alpha, minTemperature)
+
+    @staticmethod
+    def linear(initialTemperature=100.0, steps=10000):
+        """
+        T decreases linearly from initialTemperature to 0 in steps steps
+        """
+        return functools.partial(_linear_temperature, initialTemperature, steps)
+
+    @staticmethod
+    def logarithmic(c=1.0):
+        """
+        T = c / log(step + 2), slow cooling of the convergence proofs of simulated annealing
+        """
+        return functools.partial(_logarithmic_temperature, c)
+
+
+def _exponential_temperature(initialTemperature, alpha, minTemperature, step):
+    temperature = initialTemperature * alpha ** step
+    return temperature if temperature >= minTemperature else 0
+
+
+def _linear_temperature(initialTemperature, steps, step):
+    return max(0.0, initialTemperature * (1.0 - float(step) / steps))
+
+
+def _logarithmic_temperature(c, step):
+    return c / math.log(step + 2)
+
+
+def _restart(problem, method, seed, kwargs):
+    """
+    Run a local search method from a random state generated with seed, returns the best node and statistics
+    """
+    randomGenerator = random.Random(seed)
+    initialState = problem.randomStateFunc(randomGenerator)
+    node = getattr(problem, method)(seed=randomGenerator.randrange(2 ** 32), initialState=initialState, **kwargs)
+    return node, problem.stats
+
+
+def _weighted_sample(weights, k, randomGenerator):
+    """
+    Return k indices chosen randomly with probability proportional to their weights, without replacement
+    """
+    keys = [randomGenerator.random() ** (1.0 / w) for w in weights]
+    return sorted(range(len(weights)), key=lambda i: -keys[i])[:k]
@@ -16,6 +16,7 @@ General definition of a search problem and implementation
 of various search methods
 Goker 03.02.2011
 """
+import random
 import sys
 
 
@@ -23,8 +24,14 @@ class State:
     """
     Class for defining search space state. Subclass this class to define a
     specific state class for a problem
+    Instead of hashing the whole state in __hash__, subclasses can compute a hashValue when a state is created,
+    derived from the parent state's hashValue and the change made by the operator with a ZobristTable, and
+    return it from __hash__
     """
 
+    # subclasses may define __slots__ to store many small states compactly
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -50,6 +57,48 @@ class State:
         pass
 
 
+class ZobristTable:
+    """
+    Zobrist hashing: hash of a state made of (position, value) pairs is the xor of a random key for each pair.
+    Changing the value at a position changes the hash by two xors, so operators can compute the hash of a new
+    state from its parent's in constant time instead of hashing the whole state
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.keys = {}
+
+    def key(self, position, value):
+        """
+        Random key of a (position, value) pair, positions and values can be any hashable objects with a stable repr
+        """
+        k = self.keys.get((position, value))
+        if k is None:
+            # keys depend only on the pair, not on the order they are asked for, so all processes use the same keys
+            k = self.keys[(position, value)] = random.Random(repr((self.seed, position, value))).getrandbits(61)
+        return k
+
+    def hash_of(self, pairs):
+        """
+        Hash of a state given as (position, value) pairs
+        """
+        h = 0
+        for position, value in pairs:
+            h ^= self.key(position, value)
+        return h
+
+    def update(self, hashValue, position, oldValue, newValue):
+        """
+        Hash of a state after the value at position is changed from oldValue to newValue, oldValue or newValue can
+        be None for a pair that is added or removed
+        """
+        if oldValue is not None:
+            hashValue ^= self.key(position, oldValue)
+        if newValue is not None:
+            hashValue ^= self.key(position, newValue)
+        return hashValue
+
+
 class Operator:
     """
     Class for operator for a search problem.
@@ -90,6 +139,8 @@ class SearchTreeNode:
         self.pathCost = pathCost
         self.heuristicValue = heuristicValue
         self.f = f
+        # key of the state in generated states (its canonical form), set when a search creates the node
+        self.visitedKey = None
 
     def __repr__(self):
         if self.heuristicValue != -1:
@@ -106,32 +157,59 @@ class SearchProblem:
     operators, goal test and path cost function
     """
 
-    def __init__(self, initialState, operators, goalTestFunc, pathCostFunc=None, heuristicFunctions=None):
+    def __init__(self, initialState, operators, goalTestFunc, pathCostFunc=None, heuristicFunctions=None,
+                 canonicalizeFunc=None, progressFunc=None, progressInterval=1000):
         """
         Pass initial state which is the root node for search tree, operators that can be applied to states,
         goal test function and path cost function heuristicFunctions are a list of functions that give heuristic
         values for any state heuristic functions are assumed to be admissible. if multiple heuristic functions are
         given maximum of them are used for each state To ensure monotonicity of f cost, pathmax is used. (if f cost
         for a node is smaller than its parent, its parent's cost is used)
+        canonicalizeFunc maps a state to a canonical form shared by the states symmetric to it (states that are
+        reached with the same costs and reach the goal with the same costs). Repeated states are checked with
+        canonical forms, so only one of symmetric states is searched. Nodes keep the states themselves, so solution
+        paths are in the frame of the initial state
+        progressFunc is called with a copy of stats every progressInterval expanded nodes, searches can be run in
+        another thread and stopped with cancel
         """
         self.initialState = initialState
         self.operators = operators
         self.goalTestFunc = goalTestFunc
         self.pathCostFunc = pathCostFunc
         self.heuristicFunctions = heuristicFunctions
+        self.canonicalizeFunc = canonicalizeFunc
+        self.progressFunc = progressFunc
+        self.progressInterval = progressInterval
+        # counts of the last search: expanded nodes, generated legal states, states dropped as repeated and f cost
+        # of the last expanded node (f limit of the current iteration for IDA*)
+        self.stats = {}
+        self.cancelled = False
 
-    def general_search(self, queuingFunc, maxDepth=0):
+    def cancel(self):
+        """
+        Stop the running search, it returns None. cancelled is set back to False when a search starts
+        """
+        self.cancelled = True
+
+    def general_search(self, queuingFunc, maxDepth=0, reopen=False):
         """
         Search problem to find a solution, use queuingFunc to add new nodes to fringe
         Returns node that reached goal state
+        A state is generated only once unless reopen is True, then it is queued again when it is reached with a
+        cheaper path and the nodes of its more expensive paths are skipped. Only searches that order the fringe by
+        cost (uniform cost, greedy and A*) reopen states, for the others the first path to a state is kept
         """
         # fringe
         nodes = []
         # add initial state to queue
         nodes.append(SearchTreeNode(self.initialState))
-        # add initial state to generated states list
-        self.generatedStates = {}
-        self.generatedStates[self.initialState] = 1
+        nodes[0].visitedKey = self.__visited_key(self.initialState)
+        # add initial state to generated states list, generated states hold the cheapest path cost found to them
+        # (the path cost of the first path to them if states are not reopened)
+        self.generatedStates = generatedStates = {}
+        generatedStates[nodes[0].visitedKey] = 0
+        self.__reset_stats()
+        self.cancelled = False
 
         # update root node's heuristic value and f cost
         f, g, h = self.__get_node_cost_values(nodes[0])
@@ -141,13 +219,19 @@ class SearchProblem:
         while True:
             # if there are nodes to be expanded
             if len(nodes) != 0:
+                if self.cancelled:
+                    return None
                 # get next node from queue
                 node = nodes.pop(0)
+                # skip the node if a cheaper path to its state was found after it was queued
+                if reopen and node.pathCost > generatedStates.get(node.visitedKey, node.pathCost):
+                    continue
+                self.stats['f'] = node.f
 
                 if self.goalTestFunc(node.state):
                     return node
                 # add new nodes to queue
-                nodes = queuingFunc(nodes, self.__expand(node, maxDepth))
+                nodes = queuingFunc(nodes, self.__expand(node, maxDepth, reopen))
             else:  # if fringe is empty, search fails
                 return None
 
@@ -164,24 +248,43 @@ class SearchProblem:
         solution.insert(0, node)
         return solution
 
-    def __expand(self, node, depthLimit=0):
+    def __expand(self, node, depthLimit=0, reopen=False):
         """
-        Expand node and generate new child nodes
+        Expand node and generate new child nodes, with reopen states generated before are generated again if
+        they are reached with a cheaper path
         """
         nnodes = []
+        generatedStates = self.generatedStates
+        stats = self.stats
+        stats['expanded'] += 1
+        if self.progressFunc is not None and stats['expanded'] % self.progressInterval == 0:
+            self.progressFunc(dict(stats))
 
         # apply each operator to state in node
         for operator in self.operators:
             nstates = operator.apply_operator(node.state)
             for nstate in nstates:
                 # add node to expanded nodes list if it is a legal state and not generated before
-                if nstate.is_legal() and nstate not in self.generatedStates:
+                # or reached with a cheaper path now when states are reopened
+                if nstate.is_legal():
+                    stats['generated'] += 1
+                    key = nstate if self.canonicalizeFunc is None else self.canonicalizeFunc(nstate)
+                    # look each state up once, its hash is computed for every lookup
+                    cheapest = generatedStates.get(key)
+                    if cheapest is not None and (not reopen or cheapest <= node.pathCost):
+                        # path cost can only increase along a path, no need to compute it
+                        stats['repeated'] += 1
+                        continue
 
                     # create a node from the expanded state
                     nnode = SearchTreeNode(nstate, node, operator, node.depth + 1)
+                    nnode.visitedKey = key
 
                     # get pathCost and heuristic value for node
                     f, g, h = self.__get_node_cost_values(nnode)
+                    if cheapest is not None and cheapest <= g:
+                        stats['repeated'] += 1
+                        continue
                     nnode.pathCost = g
                     nnode.heuristicValue = h
                     nnode.f = f
@@ -189,9 +292,15 @@ class SearchProblem:
                     # if a depth limit is specified, check it
                     if depthLimit == 0 or nnode.depth < depthLimit:
                         nnodes.append(nnode)
-                        self.generatedStates[nstate] = 1
+                        generatedStates[key] = g
         return nnodes
 
+    def __visited_key(self, state):
+        return state if self.canonicalizeFunc is None else self.canonicalizeFunc(state)
+
+    def __reset_stats(self):
+        self.stats = {'expanded': 0, 'generated': 0, 'repeated': 0, 'f': 0}
+
     def __get_node_cost_values(self, node):
         # if heuristic functions are provided, use their maximum as h value
         h = -1
@@ -206,9 +315,10 @@ class SearchProblem:
 
         f = g
         if self.heuristicFunctions is not None:
-            for f in self.heuristicFunctions:
-                if f(node.state) > h:
-                    h = f(node.state)
+            for heuristicFunc in self.heuristicFunctions:
+                value = heuristicFunc(node.state)
+                if value > h:
+                    h = value
 
             # if f cost of node is smaller than parent's, use parent's f cost to ensure monotonicity
             if node.parent is not None:
@@ -223,7 +333,7 @@ class SearchProblem:
         return self.general_search(QueuingFunction.enqueue_at_end)
 
     def uniform_cost_search(self):
-        return self.general_search(QueuingFunction.sort_by_path_cost)
+        return self.general_search(QueuingFunction.sort_by_path_cost, reopen=True)
 
     def depth_first_search(self):
         return self.general_search(QueuingFunction.enqueue_at_front)
@@ -242,7 +352,7 @@ class SearchProblem:
         """
         for i in range(iterations):
             node = self.depth_limited_search(i + 1)
-            if node is not None:
+            if node is not None or self.cancelled:
                 return node
         return None
 
@@ -252,7 +362,7 @@ class SearchProblem:
         """
         if self.heuristicFunctions is None:
             raise AttributeError("Heuristic function(s) should be provided to use informed search methods")
-        return self.general_search(QueuingFunction.sort_by_h)
+        return self.general_search(QueuingFunction.sort_by_h, reopen=True)
 
     def a_star_search(self):
         """
@@ -260,7 +370,7 @@ class SearchProblem:
         """
         if self.heuristicFunctions is None:
             raise AttributeError("Heuristic function(s) should be provided to use informed search methods")
-        return self.general_search(QueuingFunction.sort_by_f)
+        return self.general_search(QueuingFunction.sort_by_f, reopen=True)
 
     def iterative_deepening_a_star_search(self):
         """
@@ -280,17 +390,24 @@ class SearchProblem:
         # nextf is actually defined as static in dfsContour
         # since python does not have static variables, we pass it to function as a reference
         nextf = sys.maxsize
+        # stats are counted over all iterations
+        self.__reset_stats()
+        self.cancelled = False
         while True:
             # look for solution with the current flimit
             # create dummy generated states to prevent errors in expand function
             self.generatedStates = {}
+            self.stats['f'] = flimit
             solution, flimit = self.__dfs_contour(nodes[0], flimit, [nextf])
             if solution is not None:
                 return solution
-            if flimit == sys.maxsize:
+            if flimit == sys.maxsize or self.cancelled:
                 return None
 
     def __dfs_contour(self, node, flimit, nextf):
+        if self.cancelled:
+            # unwind the recursion as if no nodes were left
+            return None, sys.maxsize
         if node.f > flimit:
             return None, node.f
         if self.goalTestFunc(node.state):
@@ -0,0 +1,26 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Tests of aiama.search and the scripts. Sources and scripts are put on the path the way the scripts are run
+(PYTHONPATH=../src:.), tests are run from the repository root with
+
+python -m unittest discover -t . -s tests
+"""
+
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _path in (os.path.join(_ROOT, 'src'), os.path.join(_ROOT, 'scripts')):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
@@ -0,0 +1,151 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Tests of CSP solvers: every solver finds the 92 solutions of 8 queens, and solution counts of random
+AllDifferent and linear constraint instances match enumeration of every assignment
+"""
+
+import itertools
+import random
+import unittest
+
+from aiama.search import CSP, AllDifferent, LinearConstraint
+from aiama.search import benchmark
+
+# keyword arguments of count_solutions for each backtracking search
+SEARCHES = [{}, {'dynamicOrdering': True}, {'backjumping': True}, {'maxNogoods': 100},
+            {'backjumping': True, 'maxNogoods': 100, 'dynamicOrdering': True}]
+
+# generic model and array model of aiama.search.arrays
+QUEENS_MODELS = ['queens', 'array_queens']
+
+
+def enumerate_solutions(csp):
+    """
+    Count the assignments of every variable that satisfy every constraint
+    """
+    count = 0
+    for values in itertools.product(*[csp.domains[v] for v in csp.varList]):
+        assignments = dict(zip(csp.varList, values))
+        if all([c.is_satisfied(assignments, csp.domains) for c in csp.constraints]):
+            count = count + 1
+    return count
+
+
+def random_domains(randomGenerator, variables, values):
+    return dict([((v,), tuple(sorted(randomGenerator.sample(range(values), randomGenerator.randint(1, values)))))
+                 for v in range(variables)])
+
+
+def random_all_different(seed):
+    """
+    A few AllDifferent constraints with random scopes, offsets and propagation types
+    """
+    randomGenerator = random.Random(seed)
+    variables = randomGenerator.randint(3, 6)
+    constraints = []
+    for i in range(randomGenerator.randint(1, 3)):
+        scope = randomGenerator.sample(range(variables), randomGenerator.randint(2, variables))
+        offsets = None
+        if randomGenerator.random() < 0.5:
+            offsets = dict([(v, randomGenerator.randint(-2, 2)) for v in scope])
+        constraints.append(AllDifferent(scope, offsets, randomGenerator.choice(['matching', 'bounds'])))
+    return CSP(random_domains(randomGenerator, variables, 6), constraints)
+
+
+def random_linear(seed):
+    """
+    A few linear equations and inequalities with random coefficients, with an AllDifferent constraint.
+    Constants are near the value of the sum at a random point of the domains, so most instances have solutions
+    """
+    randomGenerator = random.Random(seed)
+    variables = randomGenerator.randint(3, 5)
+    varsAndDomains = random_domains(randomGenerator, variables, 5)
+    point = dict([(v, randomGenerator.choice(varsAndDomains[(v,)])) for v in range(variables)])
+    constraints = []
+    for i in range(randomGenerator.randint(1, 3)):
+        scope = randomGenerator.sample(range(variables), randomGenerator.randint(1, variables))
+        coefficients = [randomGenerator.choice([-3, -2, -1, 1, 2, 3]) for v in scope]
+        relation = randomGenerator.choice(['==', '<=', '>='])
+        constant = sum([c * point[v] for v, c in zip(scope, coefficients)])
+        if relation != '==':
+            constant = constant + randomGenerator.randint(-3, 3)
+        constraints.append(LinearConstraint(scope, coefficients, relation, constant))
+    if randomGenerator.random() < 0.5:
+        constraints.append(AllDifferent(randomGenerator.sample(range(variables), 2)))
+    return CSP(varsAndDomains, constraints)
+
+
+class QueensTest(unittest.TestCase):
+
+    def test_every_search_finds_every_solution(self):
+        for model in QUEENS_MODELS:
+            for kwargs in SEARCHES:
+                with self.subTest(model=model, search=kwargs):
+                    csp = benchmark.GENERATORS[model](n=8)
+                    solutions = set(csp.solutions(asTuples=True, **kwargs))
+                    self.assertEqual(len(solutions), 92)
+                    self.assertEqual(csp.count_solutions(**kwargs), 92)
+
+    def test_parallel_search(self):
+        for model in QUEENS_MODELS:
+            with self.subTest(model=model):
+                csp = benchmark.GENERATORS[model](n=8)
+                self.assertEqual(csp.solve_parallel(mode='count', processes=2, maxNodes=50), 92)
+
+    def test_single_solution(self):
+        for model in QUEENS_MODELS:
+            for kwargs in SEARCHES + [{'symmetryBreaking': True}]:
+                with self.subTest(model=model, search=kwargs):
+                    csp = benchmark.GENERATORS[model](n=8)
+                    node = csp.solve(**kwargs)
+                    assignments = node.state.assignments
+                    self.assertEqual(len(assignments), 8)
+                    self.assertTrue(all([c.is_satisfied(assignments, csp.domains) for c in csp.constraints]))
+            with self.subTest(model=model, search='local'):
+                csp = benchmark.GENERATORS[model](n=8)
+                self.assertIsNotNone(csp.solve_local(maxSteps=10000, restarts=10, seed=0))
+
+    def test_symmetry_breaking(self):
+        for model in QUEENS_MODELS:
+            for kwargs in SEARCHES:
+                with self.subTest(model=model, search=kwargs):
+                    csp = benchmark.GENERATORS[model](n=8)
+                    self.assertEqual(csp.count_solutions(symmetryBreaking=True, **kwargs), 12)
+                    self.assertEqual(csp.count_solutions(symmetryBreaking=True, expand=True, **kwargs), 92)
+                    self.assertGreater(csp.stats['nodes'], 0)
+
+    def test_symmetry_breaking_solve_stats(self):
+        csp = benchmark.queens(8)
+        csp.solve(symmetryBreaking=True, dynamicOrdering=True)
+        self.assertGreater(csp.stats['nodes'], 0)
+
+
+class RandomInstancesTest(unittest.TestCase):
+
+    def check_counts(self, generator, seeds):
+        for seed in seeds:
+            expected = enumerate_solutions(generator(seed))
+            for kwargs in SEARCHES:
+                with self.subTest(seed=seed, search=kwargs):
+                    self.assertEqual(generator(seed).count_solutions(**kwargs), expected)
+
+    def test_all_different(self):
+        self.check_counts(random_all_different, range(40))
+
+    def test_linear(self):
+        self.check_counts(random_linear, range(40))
+
+
+if __name__ == '__main__':
+    unittest.main()
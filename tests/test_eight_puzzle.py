@@ -0,0 +1,62 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Tests of the 8 puzzle distance table: half of the 9! grids are solvable and the longest optimal solution
+is 31 moves. The table is built in a temporary directory
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from EightPuzzle import EightPuzzleState
+from EightPuzzleTable import GOAL_GRID, UNREACHABLE, build_table, distance, solve
+
+
+class DistanceTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.fileName = os.path.join(cls.directory, 'distances.npy')
+        cls.table = build_table(cls.fileName)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_states(self):
+        reachable = self.table[self.table != UNREACHABLE]
+        self.assertEqual(len(reachable), 181440)
+        self.assertEqual(int(reachable.max()), 31)
+        self.assertEqual(np.bincount(reachable).tolist()[:4], [1, 2, 4, 8])
+
+    def test_solve(self):
+        for grid, moves in (([8, 6, 7, 2, 5, 4, 3, 0, 1], 31), (GOAL_GRID, 0), ([1, 2, 3, 4, 5, 6, 7, 0, 8], 1)):
+            with self.subTest(grid=grid):
+                self.assertEqual(distance(grid, self.fileName), moves)
+                node = solve(EightPuzzleState(list(grid)), fileName=self.fileName)
+                self.assertEqual(node.depth, moves)
+                self.assertEqual(list(node.state.grid), GOAL_GRID)
+
+    def test_unsolvable(self):
+        grid = [2, 1, 3, 4, 5, 6, 7, 8, 0]
+        self.assertEqual(distance(grid, self.fileName), UNREACHABLE)
+        self.assertIsNone(solve(EightPuzzleState(grid), fileName=self.fileName))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see http://www.gnu.org/licenses/.
+"""
+Tests of the exact TSP solvers of the scripts: Held-Karp and branch and bound find the length of the shortest
+tour found by trying every tour
+"""
+
+import itertools
+import random
+import unittest
+
+from TravelingSalesmanProblem import TSP, distance_matrix
+from TSPBranchAndBound import TSPBranchAndBound
+from TSPHeldKarp import held_karp
+from TSPLocalSearch import heuristic_tour
+
+
+def tour_cost(tsp, tour):
+    return float(sum([tsp.distances[tour[i - 1], tour[i]] for i in range(len(tour))]))
+
+
+def shortest_tour_cost(tsp):
+    """
+    Length of the shortest tour, every tour starting at city 0 is tried
+    """
+    if tsp.cityCount < 2:
+        return 0.0
+    return min([tour_cost(tsp, (0,) + p) for p in itertools.permutations(range(1, tsp.cityCount))])
+
+
+def random_instances(maxCities=7, seeds=range(5)):
+    """
+    Random cities with euclidean distances, and with distances rounded to integers so that there are ties
+    """
+    for n in range(1, maxCities + 1):
+        for seed in seeds:
+            randomGenerator = random.Random(seed)
+            locations = [(randomGenerator.random(), randomGenerator.random()) for i in range(n)]
+            yield TSP(locations=locations)
+            tsp = TSP(locations=[(10 * x, 10 * y) for x, y in locations])
+            tsp.distances = distance_matrix(tsp.coordinates, 'EUC_2D')
+            yield tsp
+
+
+class ExactSolversTest(unittest.TestCase):
+
+    def test_held_karp(self):
+        for tsp in random_instances():
+            with self.subTest(cities=tsp.cityCount, locations=tsp.locations):
+                self.assertAlmostEqual(held_karp(tsp).pathCost, shortest_tour_cost(tsp))
+
+    def test_branch_and_bound(self):
+        for tsp in random_instances():
+            with self.subTest(cities=tsp.cityCount, locations=tsp.locations):
+                tour, cost = TSPBranchAndBound(tsp).solve()
+                self.assertEqual(sorted(tour), list(range(tsp.cityCount)))
+                self.assertAlmostEqual(cost, tour_cost(tsp, tour))
+                self.assertAlmostEqual(cost, shortest_tour_cost(tsp))
+
+    def test_heuristic_tour(self):
+        for tsp in random_instances():
+            with self.subTest(cities=tsp.cityCount, locations=tsp.locations):
+                tour, cost = heuristic_tour(tsp)
+                self.assertEqual(sorted(tour), list(range(tsp.cityCount)))
+                self.assertAlmostEqual(cost, tour_cost(tsp, tour))
+                self.assertGreaterEqual(cost, shortest_tour_cost(tsp) - 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()